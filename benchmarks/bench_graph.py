@@ -0,0 +1,224 @@
+# benchmarks/bench_graph.py
+r"""End-to-end throughput and latency benchmark of the support graph.
+
+Runs the compiled graph over a synthetic ticket corpus against the local LLM
+backend (no network) and writes a machine-readable JSON report:
+
+    python -m benchmarks.bench_graph --tickets 200 --concurrency 32 \
+        --latency lognormal:0.4:0.5 --approve-ratio 0.7 --output bench_results.json
+
+Embeddings default to the model-free ``hashing`` backend; pass
+``--embedding thenlper/gte-large`` to include real encoder cost.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import agent
+imported = time.perf_counter()
+agent.warmup()
+print(json.dumps({"import": imported - start, "warmup": time.perf_counter() - imported}))
+"""
+
+
+def configure_environment(args, workdir):
+    """Point the agent at the local backend and scratch files; must run before importing agent."""
+    os.environ.update({
+        "LLM_BACKEND": "local",
+        "LOCAL_LLM_LATENCY": args.latency,
+        "LOCAL_LLM_SEED": str(args.seed),
+        "EMBEDDING_MODEL": args.embedding,
+        "RETRIEVAL_MODE": args.retrieval_mode,
+        "INDEX_DIR": os.path.join(workdir, "index"),
+        "ESCALATION_FILE": os.path.join(workdir, "escalation_log.csv"),
+        "SEMANTIC_CACHE_ENABLED": "true" if args.semantic_cache else "false",
+        "SEMANTIC_CACHE_PATH": os.path.join(workdir, "semantic_cache.jsonl"),
+        "PROMPT_CACHE_ENABLED": "false" if args.no_prompt_cache else "true",
+        "PROMPT_CACHE_PATH": os.path.join(workdir, "prompt_cache.jsonl"),
+    })
+    if args.approve_ratio is not None:
+        os.environ["LOCAL_LLM_APPROVE_RATIO"] = str(args.approve_ratio)
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Callback handler recording the wall time of every graph node run."""
+
+    run_inline = True
+
+    def __init__(self):
+        """Create a timer with no samples."""
+        self.samples = defaultdict(list)
+        self._starts = {}
+        self._lock = threading.Lock()
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        """Start timing a node's own run."""
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node's own run, not the runnables nested inside it. With METRICS_ENABLED the
+        # node body is itself a runnable named after the node, running inside the node's run
+        if node and kwargs.get("name") == node:
+            with self._lock:
+                if parent_run_id not in self._starts:
+                    self._starts[run_id] = (node, time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        """Record the wall time of a finished node run."""
+        with self._lock:
+            entry = self._starts.pop(run_id, None)
+            if entry:
+                self.samples[entry[0]].append(time.perf_counter() - entry[1])
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        """Record the wall time of a failed node run."""
+        self.on_chain_end(None, run_id=run_id)
+
+
+def percentiles_ms(samples):
+    """Summarize durations in seconds as the count, mean and percentiles in milliseconds."""
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"count": len(samples), "mean_ms": float(values.mean()),
+            "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99)}
+
+
+def measure_startup():
+    """Import and warm up the agent in a fresh interpreter using the configured environment."""
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", STARTUP_SCRIPT],
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def peak_rss_mb():
+    """Return this process's peak resident set size in MiB."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def git_commit():
+    """Return the checked-out commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_tickets(tickets, concurrency, timer):
+    """Run the tickets through the graph; return their results and the wall time."""
+    from agent.batch import aprocess_tickets
+
+    results = [None] * len(tickets)
+    start = time.perf_counter()
+    async for index, result in aprocess_tickets(tickets, max_concurrency=concurrency, config={"callbacks": [timer]}):
+        results[index] = result
+    return results, time.perf_counter() - start
+
+
+def token_usage(snapshot):
+    """Prompt and completion tokens per node from the agent's metrics registry."""
+    usage = defaultdict(lambda: {"prompt": 0, "completion": 0})
+    for kind in ("prompt", "completion"):
+        for sample in snapshot["counters"].get(f"support_llm_{kind}_tokens_total", []):
+            usage[sample["labels"]["node"]][kind] += sample["value"]
+    return dict(sorted(usage.items()))
+
+
+def summarize(tickets, results, wall, timer):
+    """Build the report's throughput, latency, outcome, retry and classification sections."""
+    errors = [r for r in results if isinstance(r, BaseException)]
+    done = [r for r in results if not isinstance(r, BaseException)]
+    classified = [(t, r) for t, r in zip(tickets, results) if not isinstance(r, BaseException) and r.get("category")]
+    draft_calls = len(timer.samples.get("draft", []))
+    attempts = defaultdict(int)
+    for r in done:
+        attempts[str(r.get("attempt", 1))] += 1
+    return {
+        "wall_seconds": wall,
+        "tickets_per_second": len(tickets) / wall if wall else None,
+        "nodes": {node: percentiles_ms(samples) for node, samples in sorted(timer.samples.items())},
+        "outcomes": {
+            "approved": sum(1 for r in done if r.get("review_result") == "approved"),
+            "escalated": sum(1 for r in done if r.get("escalated")),
+            "cache_hits": sum(1 for r in done if r.get("cache_hit")),
+            "errors": len(errors),
+        },
+        "retries": {
+            "draft_calls": draft_calls,
+            "review_calls": len(timer.samples.get("review", [])),
+            "total": max(0, draft_calls - len(done)),
+            "per_ticket": max(0, draft_calls - len(done)) / len(done) if done else None,
+            "final_attempt_histogram": dict(sorted(attempts.items())),
+        },
+        "classification": {
+            "accuracy": (sum(1 for t, r in classified if r["category"] == t["expected_category"]) / len(classified)
+                         if classified else None),
+            "local_path_ratio": (sum(1 for _, r in classified if r.get("classification_path") == "local") / len(classified)
+                                 if classified else None),
+        },
+    }
+
+
+def main(argv=None):
+    """Run the benchmark and write its JSON report."""
+    parser = argparse.ArgumentParser(description="Benchmark the support graph against a simulated LLM backend.")
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", default="lognormal:0.4:0.5", help="simulated seconds per LLM call or distribution")
+    parser.add_argument("--approve-ratio", type=float, default=0.7, help="probability the reviewer approves a draft")
+    parser.add_argument("--embedding", default="hashing", help="EMBEDDING_MODEL to use")
+    parser.add_argument("--retrieval-mode", default="hybrid", choices=["hybrid", "dense", "lexical"])
+    parser.add_argument("--semantic-cache", action="store_true", help="enable the semantic response cache")
+    parser.add_argument("--no-prompt-cache", action="store_true", help="disable the prompt-level completion cache")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="support-bench-") as workdir:
+        configure_environment(args, workdir)
+        startup = measure_startup()
+
+        from agent import warmup
+        from agent.metrics import registry
+        from benchmarks.corpus import generate_tickets
+
+        warmup()
+        registry.reset()
+        tickets = generate_tickets(args.tickets, seed=args.seed)
+        timer = NodeTimer()
+        results, wall = asyncio.run(run_tickets(tickets, args.concurrency, timer))
+
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "startup_seconds": startup,
+            **summarize(tickets, results, wall, timer),
+            "tokens": token_usage(registry.snapshot()),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+# benchmarks/bench_index.py
+r"""Recall-vs-memory report for the FAISS index types and embedding models.
+
+Embeds the knowledge base (padded with distinct synthetic ticket text up to
+``--docs`` vectors), builds every index type over the same vectors and
+compares each against the exact float32 index on a held-out set of tickets:
+
+    python -m benchmarks.bench_index --embedding thenlper/gte-small --docs 5000 \
+        --output index_report.json
+
+Recall@k counts a returned neighbour as correct when its exact distance is
+within the true k-th nearest distance, so tied duplicates aren't penalized.
+Duplicate vectors are dropped before indexing all the same: with many exact
+copies any index finds "a" nearest neighbour and every type scores 1.0. The
+report's ``unique_vectors`` is the number actually indexed.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+
+def embed(embedding, texts, batch_size=64):
+    """Embed ``texts`` in batches; return the vectors and the seconds it took."""
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(texts), batch_size):
+        vectors.extend(embedding.embed_documents(texts[i:i + batch_size]))
+    return np.asarray(vectors, dtype=np.float32), time.perf_counter() - start
+
+
+def ticket_text(ticket):
+    """Join a ticket's subject and description."""
+    return f"{ticket['subject']} {ticket['description']}"
+
+
+def padding_texts(count, seed=0):
+    """Up to ``count`` distinct texts, each joining two different synthetic tickets.
+
+    The ticket templates only yield about a hundred distinct tickets, so
+    single tickets would pad the corpus with exact duplicates.
+    """
+    from benchmarks.corpus import generate_tickets
+
+    tickets = list(dict.fromkeys(ticket_text(t) for t in generate_tickets(1000, seed=seed)))
+    pairs = list(itertools.combinations(tickets, 2))
+    random.Random(seed).shuffle(pairs)
+    return [f"{first} {second}" for first, second in pairs[:count]]
+
+
+def unique_rows(vectors):
+    """``vectors`` without repeated rows, in their original order."""
+    _, first = np.unique(vectors, axis=0, return_index=True)
+    return vectors[np.sort(first)]
+
+
+def query_latency_ms(embedding, queries, samples=20):
+    """Return the mean milliseconds to embed one of the first ``samples`` queries."""
+    start = time.perf_counter()
+    for text in queries[:samples]:
+        embedding.embed_query(text)
+    return (time.perf_counter() - start) / min(samples, len(queries)) * 1000
+
+
+def recall_at_k(vectors, queries, found, k):
+    """Fraction of returned ids no farther than the exact k-th neighbour."""
+    # ||q||^2 + ||v||^2 - 2 q.v: a Q x N matrix, not a Q x N x D difference array. In float64,
+    # so the expansion's cancellation error stays below the tie tolerance
+    queries, vectors = queries.astype(np.float64), vectors.astype(np.float64)
+    exact = (queries ** 2).sum(1)[:, None] + (vectors ** 2).sum(1)[None, :] - 2 * queries @ vectors.T
+    kth = np.sort(exact, axis=1)[:, k - 1:k]
+    returned = np.take_along_axis(exact, np.maximum(found, 0), axis=1)
+    hits = (returned <= kth * (1 + 1e-5) + 1e-6) & (found >= 0)
+    return float(hits.mean())
+
+
+def report_index(index_type, vectors, queries, k, pq_m, pq_nbits):
+    """Build one index type over ``vectors`` and report its size, recall and speed."""
+    import faiss
+
+    from agent.vectorstore import make_index, pq_subquantizers
+
+    start = time.perf_counter()
+    index = make_index(vectors, index_type, pq_m, pq_nbits)
+    build_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    search_seconds = time.perf_counter() - start
+    size = int(faiss.serialize_index(index).nbytes)
+    entry = {
+        "index_type": index_type,
+        "bytes": size,
+        "bytes_per_vector": size / len(vectors),
+        "recall_at_k": recall_at_k(vectors, queries, found, k),
+        "build_seconds": build_seconds,
+        "search_ms_per_query": search_seconds / len(queries) * 1000,
+    }
+    if index_type == "pq":
+        entry["pq_m"] = pq_subquantizers(vectors.shape[1], pq_m)
+    return entry
+
+
+def main(argv=None):
+    """Run the comparison and write its JSON report."""
+    parser = argparse.ArgumentParser(description="Compare FAISS index types against the exact index.")
+    parser.add_argument("--embedding", default="hashing", help="EMBEDDING_MODEL to use")
+    parser.add_argument("--docs", type=int, default=2000, help="vectors to index (knowledge base + synthetic text)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--types", default="flat,fp16,int8,pq", help="comma-separated index types")
+    parser.add_argument("--pq-m", type=int, default=0, help="PQ sub-vectors (0: dim / 16)")
+    parser.add_argument("--pq-nbits", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    os.environ["EMBEDDING_MODEL"] = args.embedding
+    from agent.embeddings import get_embedding
+    from agent.nodes.retriever import get_category_docs
+    from agent.vectorstore import tag_documents
+    from benchmarks.corpus import generate_tickets
+
+    texts = [doc.page_content for doc in tag_documents(get_category_docs())]
+    texts += padding_texts(max(0, args.docs - len(texts)), seed=args.seed)
+    query_texts = [ticket_text(t) for t in generate_tickets(args.queries, seed=args.seed + 1)]
+
+    start = time.perf_counter()
+    embedding = get_embedding()
+    load_seconds = time.perf_counter() - start
+    vectors, embed_seconds = embed(embedding, texts)
+    vectors = unique_rows(vectors)
+    queries, _ = embed(embedding, query_texts)
+
+    report = {
+        "embedding": {
+            "model": args.embedding,
+            "dim": int(vectors.shape[1]),
+            "load_seconds": load_seconds,
+            "docs_per_second": len(texts) / embed_seconds if embed_seconds else None,
+            "query_ms": query_latency_ms(embedding, query_texts),
+        },
+        "docs": len(texts),
+        "unique_vectors": int(vectors.shape[0]),
+        "queries": len(query_texts),
+        "k": args.k,
+        "indexes": [report_index(t, vectors, queries, args.k, args.pq_m, args.pq_nbits)
+                    for t in args.types.split(",")],
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/corpus.py
+"""Synthetic support tickets across the four categories."""
+import random
+
+TEMPLATES = {
+    "billing": [
+        ("Double charged for {plan}", "I was billed twice this month for my {plan} subscription. Please check invoice {ref}."),
+        ("Payment failed", "My {card} card was declined when renewing the {plan} plan. How do I update my payment method?"),
+        ("Refund request", "I downgraded from the {plan} plan mid-cycle and expected a pro-rated refund on invoice {ref}."),
+        ("Discount code not applied", "The student discount code did not apply to my {plan} subscription at checkout."),
+    ],
+    "technical": [
+        ("App crashes on startup", "Every time I open the {device} app it closes immediately since version {version}."),
+        ("Sync not working", "Database sync has been stuck for hours on my {device}. Force Sync shows an error."),
+        ("API rate limit errors", "Our integration gets 429 responses after about {count} requests per hour."),
+        ("Slow performance", "The dashboard takes {count} seconds to load on {device} with large attachments."),
+    ],
+    "security": [
+        ("Can't log into my account", "I keep getting 'invalid credentials' on {device} even after resetting my password."),
+        ("Suspicious login alert", "I received an alert about a login from a new device I don't recognize, reference {ref}."),
+        ("2FA codes not arriving", "My two-factor authentication codes stopped arriving after I changed phones."),
+        ("Account locked", "My account was locked after {count} failed password attempts and I can't unlock it."),
+    ],
+    "general": [
+        ("How do I change my email?", "I want to update the contact email on my profile for the {plan} plan."),
+        ("Support hours", "What are your support hours and is phone support available in my country?"),
+        ("Feature request", "It would be great to have dark mode on {device}. Is it on the roadmap?"),
+        ("Team roles", "How do I give a new team member the Admin role on our {plan} account?"),
+    ],
+}
+
+FILLERS = {
+    "plan": ["Pro", "Team", "Enterprise", "Starter"],
+    "card": ["Visa", "MasterCard", "American Express"],
+    "ref": ["INV-1042", "INV-2291", "REF-77", "INV-3310"],
+    "device": ["iPhone", "Android", "Windows", "Mac", "Chrome"],
+    "version": ["2.0.3", "2.1.0", "1.9.8"],
+    "count": ["12", "30", "1000", "5"],
+}
+
+
+def generate_tickets(count, seed=0):
+    """Return ``count`` tickets cycling through the categories, each with its expected category."""
+    rng = random.Random(seed)
+    categories = list(TEMPLATES)
+    tickets = []
+    for i in range(count):
+        category = categories[i % len(categories)]
+        subject, description = rng.choice(TEMPLATES[category])
+        fill = {key: rng.choice(values) for key, values in FILLERS.items()}
+        tickets.append({
+            "subject": subject.format(**fill),
+            "description": description.format(**fill),
+            "expected_category": category,
+        })
+    return tickets
@@ -1,8 +1,11 @@
 """New LangGraph Agent.
 
-This module defines a custom graph.
+This module defines a custom graph. Importing it is cheap: the embedding
+model, indexes, LLM clients and escalation log load on first use or via
+``warmup()``.
 """
 
-from agent.graph import graph
+from agent.batch import aprocess_tickets, process_tickets
+from agent.graph import build_support_agent, graph, warmup
 
-__all__ = ["graph"]
+__all__ = ["graph", "build_support_agent", "warmup", "process_tickets", "aprocess_tickets"]
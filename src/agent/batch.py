@@ -0,0 +1,393 @@
+# agent/batch.py
+"""High-throughput entry points that keep many tickets in flight at once.
+
+Also the command line for reprocessing ticket backlogs::
+
+    python -m agent.batch tickets.jsonl --output results.jsonl --concurrency 32 --workers 4
+
+Tickets are streamed from JSONL or CSV (``subject``/``description`` fields or
+columns) and results are appended to the output as JSONL. A malformed or
+incomplete record gets an ``{"index", "error"}`` result like any failed
+ticket. The output doubles as the checkpoint: ``--resume`` skips every ticket
+that already has a successful result, so a crashed run doesn't pay for those
+LLM calls again. Escalations go to the escalation log (``ESCALATION_FILE``)
+and are flushed before the results that mention them.
+
+With a graph checkpointer (``CHECKPOINTER=sqlite``) each ticket also runs on
+its own checkpoint thread, named after the run, the ticket's index and a
+fingerprint of the input file and ticket. Every run records its id in the
+output as a ``{"run"}`` line, so a resumed run continues tickets that earlier
+runs of the same output left in flight or failed, from their last completed
+node. A fresh run never picks up another run's threads. A thread is deleted
+once its result has been written.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from agent.checkpoint import aresume_or_invoke, thread_config
+from agent.escalation_sink import get_escalation_sink
+from agent.graph import graph as support_graph
+from agent.graph import warmup
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_CHECKPOINT_EVERY = 50
+RESULT_FIELDS = ("category", "classification_path", "review_result", "attempt", "final_response")
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidTicketError(ValueError):
+    """A ticket record that can't be parsed or lacks the fields the graph needs."""
+
+
+def _ticket_input(ticket):
+    if isinstance(ticket, BaseException):
+        raise ticket  # Unparseable record from read_tickets
+    if not isinstance(ticket, dict):
+        raise InvalidTicketError(f"expected an object, got {type(ticket).__name__}")
+    missing = [field for field in ("subject", "description") if not isinstance(ticket.get(field), str)]
+    if missing:
+        raise InvalidTicketError(f"missing {' and '.join(missing)}")
+    return {"subject": ticket["subject"], "description": ticket["description"]}
+
+
+def _ticket_inputs(tickets):
+    """Positions and graph inputs of the valid tickets, and ``(index, error)`` of the invalid ones."""
+    positions, inputs, invalid = [], [], []
+    for index, ticket in enumerate(tickets):
+        try:
+            inputs.append(_ticket_input(ticket))
+        except Exception as exc:
+            invalid.append((index, exc))
+        else:
+            positions.append(index)
+    return positions, inputs, invalid
+
+
+def _run_configs(graph, config, count):
+    # A checkpointed graph needs a thread per run; these runs aren't resumed, so each gets a fresh one
+    if graph.checkpointer is None:
+        return config
+    batch_id = uuid.uuid4().hex
+    return [thread_config(config, f"{batch_id}:{index}") for index in range(count)]
+
+
+def _threads(configs):
+    return [config["configurable"]["thread_id"] for config in configs] if isinstance(configs, list) else []
+
+
+def process_tickets(tickets, max_concurrency=DEFAULT_MAX_CONCURRENCY, graph=None, config=None):
+    """Run tickets through the graph concurrently, yielding ``(index, result)`` as each completes.
+
+    ``index`` is the ticket's position in ``tickets``. A ticket that fails yields
+    its exception as the result instead of aborting the whole batch. ``config``
+    is passed to every run (e.g. callbacks). With a checkpointed graph each
+    ticket runs on a throwaway thread, deleted once the batch is done.
+    """
+    graph = graph or support_graph
+    positions, inputs, invalid = _ticket_inputs(tickets)
+    yield from invalid
+    configs = _run_configs(graph, {**(config or {}), "max_concurrency": max_concurrency}, len(inputs))
+    try:
+        for index, result in graph.batch_as_completed(inputs, config=configs, return_exceptions=True):
+            yield positions[index], result
+    finally:
+        # These threads are never resumed, so they go once the results are out
+        for thread in _threads(configs):
+            graph.checkpointer.delete_thread(thread)
+
+
+async def aprocess_tickets(tickets, max_concurrency=DEFAULT_MAX_CONCURRENCY, graph=None, config=None):
+    """Async variant of ``process_tickets`` driving the graph's native async nodes."""
+    graph = graph or support_graph
+    positions, inputs, invalid = _ticket_inputs(tickets)
+    for index, error in invalid:
+        yield index, error
+    configs = _run_configs(graph, {**(config or {}), "max_concurrency": max_concurrency}, len(inputs))
+    try:
+        async for index, result in graph.abatch_as_completed(inputs, config=configs, return_exceptions=True):
+            yield positions[index], result
+    finally:
+        for thread in _threads(configs):
+            await graph.checkpointer.adelete_thread(thread)
+
+
+async def astream_tickets(tickets, max_concurrency=DEFAULT_MAX_CONCURRENCY, graph=None, config=None,
+                         thread_id=None):
+    """Like ``aprocess_tickets`` for an iterable of ``(key, ticket)`` pairs that is consumed lazily.
+
+    At most ``max_concurrency`` tickets are read ahead, so arbitrarily large
+    inputs stream through in constant memory. Yields ``(key, result)``; an
+    invalid ticket yields its ``InvalidTicketError`` like any other failure.
+    With a checkpointed graph each ticket runs on the thread named by the async
+    ``thread_id(key, ticket)`` (by default a fresh one per run), and a ticket
+    whose thread was interrupted is resumed instead of restarted.
+    """
+    graph = graph or support_graph
+    if thread_id is None:
+        run_id = uuid.uuid4().hex
+
+        async def thread_id(key, ticket):
+            return f"{run_id}:{key}"
+
+    async def run(key, ticket):
+        # Validated inside the task, so a bad record fails alone instead of cancelling the others
+        ticket_input = _ticket_input(ticket)
+        if graph.checkpointer is None:
+            return await graph.ainvoke(ticket_input, config=config)
+        return await aresume_or_invoke(graph, ticket_input, thread_config(config, await thread_id(key, ticket)))
+
+    tickets = iter(tickets)
+    pending = {}
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < max_concurrency:
+                try:
+                    key, ticket = next(tickets)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[asyncio.ensure_future(run(key, ticket))] = key
+            if not pending:
+                return
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                key = pending.pop(task)
+                exc = task.exception()
+                yield key, exc if exc is not None else task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def read_tickets(path, fmt=None):
+    """Stream ``(index, ticket)`` from a JSONL or CSV file; ``index`` counts records from 0.
+
+    A JSONL line that isn't valid JSON yields an ``InvalidTicketError`` as its
+    ticket, so it fails as a single ticket instead of ending the stream.
+    """
+    fmt = fmt or ("csv" if Path(path).suffix.lower() == ".csv" else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for index, row in enumerate(csv.DictReader(f)):
+                yield index, {key.strip().lower(): value for key, value in row.items() if key}
+            return
+        index = 0
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                try:
+                    ticket = json.loads(line)
+                except ValueError as exc:
+                    ticket = InvalidTicketError(f"line {number}: {exc}")
+                yield index, ticket
+                index += 1
+
+
+def _output_records(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # Torn line from a crash
+    except FileNotFoundError:
+        return
+
+
+def completed_indices(path):
+    """Return the indices of tickets that already have a successful result in the output file."""
+    return {record["index"] for record in _output_records(path) if "index" in record and "error" not in record}
+
+
+def recorded_runs(path):
+    """Ids of the checkpointed runs that wrote to the output file, oldest first."""
+    return [record["run"] for record in _output_records(path) if "run" in record]
+
+
+def ticket_fingerprint(input_path, ticket):
+    """Hash of the input file's path and a ticket's fields, part of the ticket's checkpoint thread id."""
+    data = json.dumps([str(Path(input_path).resolve()), ticket], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+def result_record(index, ticket, result):
+    """Build the results-file record of a ticket's final state or error."""
+    record = {"index": index, "id": ticket.get("id") if isinstance(ticket, dict) else None}
+    if isinstance(result, BaseException):
+        record["error"] = f"{type(result).__name__}: {result}"
+    else:
+        record.update((field, result.get(field)) for field in RESULT_FIELDS)
+        record["escalated"] = bool(result.get("escalated"))
+        record["cache_hit"] = bool(result.get("cache_hit"))
+    return record
+
+
+class ResultWriter:
+    """Appends result lines in checkpoints of ``checkpoint_every`` tickets.
+
+    Each checkpoint flushes pending escalations first, then appends and fsyncs
+    the results under an exclusive lock so worker processes can share the file.
+    """
+
+    def __init__(self, path, checkpoint_every=DEFAULT_CHECKPOINT_EVERY, on_commit=None):
+        """Create a writer appending to ``path``; ``on_commit`` sees each checkpoint's records."""
+        self.path = Path(path)
+        self.checkpoint_every = checkpoint_every
+        self.on_commit = on_commit  # Called with the committed records
+        self._lines = []
+        self._records = []
+        self._escalated = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def add(self, record):
+        """Queue a record, committing once a checkpoint's worth is pending."""
+        self._lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        self._records.append(record)
+        self._escalated = self._escalated or bool(record.get("escalated"))
+        if len(self._lines) >= self.checkpoint_every:
+            self.commit()
+
+    def commit(self):
+        """Flush pending escalations, then append and fsync the pending records."""
+        if not self._lines:
+            return
+        if self._escalated:
+            get_escalation_sink().flush()
+        with open(self.path, "ab+") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            # Terminate a line torn by a crash so it can't swallow the next record
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write("".join(self._lines).encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        records = self._records
+        self._lines = []
+        self._records = []
+        self._escalated = False
+        if self.on_commit is not None:
+            self.on_commit(records)
+
+
+async def process_file(input_path, output_path, fmt=None, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                       checkpoint_every=DEFAULT_CHECKPOINT_EVERY, resume=False, worker=0, workers=1, graph=None):
+    """Stream one worker's share of a ticket file through the graph into the results file."""
+    graph = graph or support_graph
+    done = completed_indices(output_path) if resume else set()
+    # A resumed run may continue the threads of the earlier runs on this output, and only those
+    run_id = uuid.uuid4().hex
+    earlier_runs = recorded_runs(output_path) if resume else []
+    tickets = {}
+    threads = {}
+    counts = {"processed": 0, "escalated": 0, "failed": 0, "skipped": 0}
+
+    def pending():
+        for index, ticket in read_tickets(input_path, fmt):
+            if index % workers != worker:
+                continue
+            if index in done:
+                counts["skipped"] += 1
+                continue
+            tickets[index] = ticket
+            yield index, ticket
+
+    async def thread_id(index, ticket):
+        # The fingerprint keeps a thread from answering a different ticket at the same index
+        name = f"{index}:{ticket_fingerprint(input_path, ticket)}"
+        for run in reversed(earlier_runs):
+            if await graph.checkpointer.aget_tuple(thread_config(None, f"{run}:{name}")) is not None:
+                threads[index] = f"{run}:{name}"
+                return threads[index]
+        threads[index] = f"{run_id}:{name}"
+        return threads[index]
+
+    def forget(records):
+        # Written results no longer need their checkpoints; failed tickets keep theirs for --resume
+        for record in records:
+            thread = threads.pop(record.get("index"), None)
+            if thread is not None and "error" not in record:
+                graph.checkpointer.delete_thread(thread)
+
+    writer = ResultWriter(output_path, checkpoint_every, forget if graph.checkpointer is not None else None)
+    if graph.checkpointer is not None:
+        writer.add({"run": run_id})
+        writer.commit()
+    start = time.perf_counter()
+    try:
+        async for index, result in astream_tickets(pending(), max_concurrency, graph, thread_id=thread_id):
+            record = result_record(index, tickets.pop(index), result)
+            writer.add(record)
+            counts["processed"] += 1
+            counts["escalated"] += bool(record.get("escalated"))
+            counts["failed"] += "error" in record
+            if counts["processed"] % checkpoint_every == 0:
+                logger.info("worker %d: %d tickets (%d escalated, %d failed), %.1f tickets/s", worker,
+                            counts["processed"], counts["escalated"], counts["failed"],
+                            counts["processed"] / (time.perf_counter() - start))
+    finally:
+        writer.commit()
+    logger.info("worker %d finished: %d tickets (%d escalated, %d failed, %d skipped as done)", worker,
+                counts["processed"], counts["escalated"], counts["failed"], counts["skipped"])
+    return counts
+
+
+def _run_worker(args, worker, workers):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    warmup()
+    asyncio.run(process_file(args.input, args.output, args.format, args.concurrency, args.checkpoint_every,
+                             args.resume, worker, workers))
+    get_escalation_sink().close()
+
+
+def main(argv=None):
+    """Run the batch command line."""
+    parser = argparse.ArgumentParser(description="Process a JSONL or CSV file of tickets through the support graph.")
+    parser.add_argument("input", type=Path)
+    parser.add_argument("--output", type=Path, required=True, help="results JSONL, also the resume checkpoint")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (default: from the extension)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY, help="tickets in flight per worker")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    parser.add_argument("--checkpoint-every", type=int, default=DEFAULT_CHECKPOINT_EVERY,
+                        help="results per checkpoint; at most this many tickets per worker are redone after a crash")
+    parser.add_argument("--resume", action="store_true", help="skip tickets that already have a result")
+    args = parser.parse_args(argv)
+
+    if args.output.exists() and args.output.stat().st_size and not args.resume:
+        parser.error(f"{args.output} exists; pass --resume to continue it or choose another output")
+
+    if args.workers == 1:
+        _run_worker(args, 0, 1)
+        return
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_run_worker, args=(args, worker, args.workers), name=f"batch-worker-{worker}")
+                 for worker in range(args.workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    if any(process.exitcode for process in processes):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# agent/cache.py
+"""In-memory TTL cache and the append-only JSONL file behind the persistent caches."""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl`` seconds after being set."""
+
+    def __init__(self, maxsize=1024, ttl=300.0, clock=time.monotonic):
+        """Create a cache of up to ``maxsize`` entries; 0 disables it."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the live value of ``key``, else ``default``, counting a hit or miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, expires_at=None):
+        """Store ``value``, by default for ``ttl`` seconds; returns when it expires."""
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            if expires_at is None:
+                expires_at = self._clock() + self.ttl
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return expires_at
+
+    def items(self):
+        """Return ``(key, expires_at, value)`` of the entries not yet expired, least recently used first."""
+        now = self._clock()
+        with self._lock:
+            return [(key, expires_at, value) for key, (expires_at, value) in self._data.items() if expires_at > now]
+
+    def clear(self):
+        """Drop every entry."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        """Return the number of entries, including expired ones not yet evicted."""
+        return len(self._data)
+
+    def stats(self):
+        """Return the hit and miss counts and the current and maximum size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+
+class JsonlLog:
+    """Append-only JSONL file backing a persistent cache, compacted by rewriting it atomically."""
+
+    def __init__(self, path):
+        """Open the log at ``path``, creating its directory."""
+        self.path = Path(path)
+        # Appends open the file directly, so its directory must exist before the first one
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def read(self, decode=None):
+        """Return the file's records in order, each passed through ``decode``; None when there is no file."""
+        records = []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        if decode is not None:
+                            record = decode(record)
+                    except (ValueError, KeyError):
+                        continue  # Skip a torn trailing line
+                    records.append(record)
+        except FileNotFoundError:
+            return None
+        return records
+
+    def append(self, record):
+        """Append one record as a JSON line."""
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def rewrite(self, records):
+        """Atomically replace the file's contents with ``records``."""
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        with self._lock:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+            os.replace(tmp, self.path)
@@ -0,0 +1,102 @@
+# agent/checkpoint.py
+"""Checkpointers for the support graph.
+
+With a checkpointer, ``build_support_agent()`` saves each ticket's state after
+every node under the run's ``thread_id``. A ticket interrupted by a worker
+restart can then continue from its last completed node, so classification,
+retrieval and drafts that already finished aren't paid for again. Nodes only
+return the keys they change, so each checkpoint stores just that delta.
+
+``CHECKPOINTER`` selects the saver:
+
+- ``"none"`` (default): no checkpoints;
+- ``"memory"``: in-process, mainly for tests;
+- ``"sqlite"``: a SQLite database at ``CHECKPOINT_PATH`` in WAL mode, which
+  the worker processes on a host can share.
+"""
+import asyncio
+import sqlite3
+from functools import cache
+from pathlib import Path
+
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from agent.config import CHECKPOINT_PATH, CHECKPOINTER
+
+CHECKPOINTERS = ("none", "memory", "sqlite")
+
+
+class SqliteCheckpointer(SqliteSaver):
+    """``SqliteSaver`` usable from both ``invoke`` and ``ainvoke``.
+
+    langgraph's ``SqliteSaver`` is sync-only. Here its async methods run the
+    sync ones in a worker thread, so batch workers don't need a separate
+    aiosqlite connection per event loop.
+    """
+
+    @classmethod
+    def from_path(cls, path):
+        """Open a checkpointer on the SQLite database at ``path``, creating its directory."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # The saver serializes access with its own lock; the timeout covers other processes' writes
+        return cls(sqlite3.connect(path, check_same_thread=False, timeout=30))
+
+    async def aget_tuple(self, config):
+        """Get a checkpoint tuple in a worker thread."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        """List checkpoints in a worker thread."""
+        checkpoints = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for checkpoint in checkpoints:
+            yield checkpoint
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        """Save a checkpoint in a worker thread."""
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        """Save a node's pending writes in a worker thread."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        """Delete a thread's checkpoints and writes in a worker thread."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+@cache
+def get_checkpointer(kind=CHECKPOINTER, path=CHECKPOINT_PATH):
+    """Return the process-wide checkpointer of ``kind``, or None for "none"."""
+    if kind == "none":
+        return None
+    if kind == "memory":
+        return InMemorySaver()
+    if kind == "sqlite":
+        return SqliteCheckpointer.from_path(path)
+    raise ValueError(f"Unknown checkpointer {kind!r}; expected one of {', '.join(CHECKPOINTERS)}")
+
+
+def thread_config(config, thread_id):
+    """``config`` with the checkpoint ``thread_id`` a run's state is saved under."""
+    config = dict(config or {})
+    config["configurable"] = {**config.get("configurable", {}), "thread_id": str(thread_id)}
+    return config
+
+
+async def aresume_or_invoke(graph, input, config):
+    """Run ``input`` on the config's thread, or finish the thread's run if one was interrupted.
+
+    A thread whose run already completed returns its final state without
+    running again. Only use it with thread ids that belong to a single ticket.
+    """
+    if graph.checkpointer is None:
+        return await graph.ainvoke(input, config)
+    snapshot = await graph.aget_state(config)
+    if snapshot.next:
+        return await graph.ainvoke(None, config)
+    if snapshot.values:
+        return snapshot.values
+    return await graph.ainvoke(input, config)
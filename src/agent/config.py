@@ -1,8 +1,175 @@
 # config.py
+"""Settings of the support agent, read from the environment and ``.env``."""
 import os
+from pathlib import Path
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Repository checkout the package runs from; shipped data is found relative to it, not the CWD
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY")
+
+# LLM clients. LLM_BACKEND=local swaps in a deterministic, network-free stand-in.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openrouter")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "openai/gpt-3.5-turbo")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "20"))
+
+# Model cascade: the model above is each role's cheap "fast" tier; the "strong" tier is
+# only used for retry drafts and low-confidence classifications
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", "openai/gpt-4o")
+LLM_STRONG_TIMEOUT = float(os.getenv("LLM_STRONG_TIMEOUT", "90"))
+MODEL_CASCADE_ENABLED = os.getenv("MODEL_CASCADE_ENABLED", "true").lower() == "true"
+# Local classifier margins below this skip the fast LLM and ask the strong tier
+CLASSIFIER_STRONG_MARGIN = float(os.getenv("CLASSIFIER_STRONG_MARGIN", "0.01"))
+# Seconds per ticket (0 = unlimited); once spent, nodes stay on the fast tier
+TICKET_LATENCY_BUDGET = float(os.getenv("TICKET_LATENCY_BUDGET", "0"))
+
+def _llm_role_settings(role, prompt_cache):
+    # Each node role can override the defaults, e.g. REVIEWER_MODEL, CLASSIFIER_TIMEOUT or DRAFTER_STRONG_MODEL
+    prefix = role.upper()
+    return {
+        "model": os.getenv(f"{prefix}_MODEL", LLM_MODEL),
+        "timeout": float(os.getenv(f"{prefix}_TIMEOUT", LLM_TIMEOUT)),
+        "strong_model": os.getenv(f"{prefix}_STRONG_MODEL", LLM_STRONG_MODEL),
+        "strong_timeout": float(os.getenv(f"{prefix}_STRONG_TIMEOUT", LLM_STRONG_TIMEOUT)),
+        "pool_size": int(os.getenv(f"{prefix}_POOL_SIZE", LLM_POOL_SIZE)),
+        "prompt_cache": os.getenv(f"{prefix}_PROMPT_CACHE", str(prompt_cache)).lower() == "true",
+    }
+
+# Classification and review are effectively deterministic in their prompt, so their
+# completions are cached by default; drafting is creative and isn't
+LLM_ROLES = {role: _llm_role_settings(role, prompt_cache)
+             for role, prompt_cache in (("classifier", True), ("drafter", False), ("reviewer", True))}
+
+# Shared limiter under every LLM request (0 = no budget). Concurrency adapts between
+# LLM_MIN_CONCURRENCY and LLM_MAX_CONCURRENCY: halved on 429/503, grown on success.
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "true").lower() == "true"
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "256"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_THROTTLE_RETRIES = int(os.getenv("LLM_THROTTLE_RETRIES", "6"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+
+# Prompt-level completion cache for the roles with "prompt_cache" set (<ROLE>_PROMPT_CACHE),
+# persisted as JSONL. LLM_SINGLE_FLIGHT makes concurrent identical prompts share one call.
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+PROMPT_CACHE_PATH = Path(os.getenv("PROMPT_CACHE_PATH", PROJECT_ROOT / "data" / "prompt_cache.jsonl"))
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "10000"))
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "604800"))
+LLM_SINGLE_FLIGHT = os.getenv("LLM_SINGLE_FLIGHT", "true").lower() == "true"
+
+# Local backend behaviour: LOCAL_LLM_LATENCY is seconds per call or a distribution
+# ("uniform:0.1:0.5", "normal:0.3:0.1", "lognormal:0.3:0.5", "exp:0.3"); an unset
+# LOCAL_LLM_APPROVE_RATIO approves drafts of 50+ words
+LOCAL_LLM_LATENCY = os.getenv("LOCAL_LLM_LATENCY", "0")
+LOCAL_LLM_APPROVE_RATIO = float(os.environ["LOCAL_LLM_APPROVE_RATIO"]) if os.getenv("LOCAL_LLM_APPROVE_RATIO") else None
+LOCAL_LLM_SEED = int(os.getenv("LOCAL_LLM_SEED", "0"))
+
+# Knowledge base articles: one sub-directory per category, one Markdown/text file per
+# article. KNOWLEDGE_BASE_POLL_INTERVAL > 0 watches it and hot-swaps an incrementally
+# updated index into the running process.
+KNOWLEDGE_BASE_DIR = Path(os.getenv("KNOWLEDGE_BASE_DIR", PROJECT_ROOT / "data" / "knowledge_base"))
+KNOWLEDGE_BASE_POLL_INTERVAL = float(os.getenv("KNOWLEDGE_BASE_POLL_INTERVAL", "0"))
+
+# Knowledge base index artifact. Any sentence-transformers model works, e.g.
+# thenlper/gte-small (384-dim) or thenlper/gte-base (768-dim) for a lighter worker;
+# "hashing" selects model-free feature-hashing embeddings (offline tests and benchmarks)
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "thenlper/gte-large")
+INDEX_DIR = Path(os.getenv("INDEX_DIR", "data/index"))
+# Vector storage: "flat" (exact float32), "fp16", "int8" (scalar quantized) or "pq"
+# (product quantized, INDEX_PQ_M bytes per vector at 8 bits; 0 picks dim / 16)
+INDEX_TYPE = os.getenv("INDEX_TYPE", "flat")
+INDEX_PQ_M = int(os.getenv("INDEX_PQ_M", "0"))
+INDEX_PQ_NBITS = int(os.getenv("INDEX_PQ_NBITS", "8"))
+
+# Shared embedding server (python -m agent.embedding_server): one process holds the model
+# and micro-batches embedding requests from every worker on the host. Workers use it when
+# EMBEDDING_SERVER_SOCKET is set and embed in-process while it's unreachable, trying it
+# again after EMBEDDING_SERVER_RETRY_INTERVAL seconds.
+EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")
+EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "10"))
+EMBEDDING_SERVER_RETRY_INTERVAL = float(os.getenv("EMBEDDING_SERVER_RETRY_INTERVAL", "30"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "5"))
+
+# Retrieval caches (query embeddings and top-k results)
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "300"))
+
+# RETRIEVAL_MODE=hybrid fuses BM25 and dense rankings with reciprocal rank fusion;
+# "dense" is vector search only, "lexical" skips query embedding entirely
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Documents fetched per ranking (dense and BM25, before fusion). Only the top few hits
+# per category are kept, so retrieval cost stays flat as the knowledge base grows.
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "48"))
+
+# Rank the knowledge base in a branch parallel to classification (its query is known
+# up front), so retrieval only has to pick the category's hits once classify returns
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+
+# Local nearest-centroid classifier; falls back to the LLM when the margin
+# between the two best categories is below FAST_CLASSIFIER_MARGIN
+FAST_CLASSIFIER_ENABLED = os.getenv("FAST_CLASSIFIER_ENABLED", "true").lower() == "true"
+FAST_CLASSIFIER_MARGIN = float(os.getenv("FAST_CLASSIFIER_MARGIN", "0.03"))
+
+# Opt-in semantic cache of approved responses for near-duplicate tickets.
+# SEMANTIC_CACHE_MODE=return answers from the cache, "seed" sends the cached answer to the reviewer.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_MODE = os.getenv("SEMANTIC_CACHE_MODE", "return")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "10000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_PATH = Path(os.getenv("SEMANTIC_CACHE_PATH", PROJECT_ROOT / "data" / "semantic_cache.jsonl"))
+
+# Prompt assembly: retrieved passages are deduplicated and packed, best first, into
+# DRAFTER_CONTEXT_TOKENS; ticket text, drafts and feedback are clipped to PROMPT_FIELD_TOKENS
+DRAFTER_CONTEXT_TOKENS = int(os.getenv("DRAFTER_CONTEXT_TOKENS", "600"))
+PROMPT_FIELD_TOKENS = int(os.getenv("PROMPT_FIELD_TOKENS", "800"))
+
+# Rule-based pre-review that rejects drafts breaking hard rules without an LLM call
+PRE_REVIEW_ENABLED = os.getenv("PRE_REVIEW_ENABLED", "true").lower() == "true"
+PRE_REVIEW_MIN_WORDS = int(os.getenv("PRE_REVIEW_MIN_WORDS", "50"))
+
+# Drafter token streaming: drafts are generated with llm.stream, so their tokens reach
+# graph.stream(..., stream_mode="messages") as they're produced. With the pre-review on,
+# the partial draft is checked every DRAFT_STREAM_CHECK_CHARS characters and generation
+# stops as soon as it breaks a hard rule, sending the ticket straight to its retry
+DRAFT_STREAMING = os.getenv("DRAFT_STREAMING", "false").lower() == "true"
+DRAFT_STREAM_CHECK_CHARS = int(os.getenv("DRAFT_STREAM_CHECK_CHARS", "80"))
+
+# Graph checkpointing: "sqlite" saves every ticket's state after each node to
+# CHECKPOINT_PATH so a restarted batch run resumes in-flight tickets from their last
+# completed node; "memory" keeps checkpoints in-process and "none" disables them.
+CHECKPOINTER = os.getenv("CHECKPOINTER", "none")
+CHECKPOINT_PATH = Path(os.getenv("CHECKPOINT_PATH", "data/checkpoints.sqlite"))
+
+# Escalation log sink: rows are written in batches by a background thread.
+# ESCALATION_FSYNC=batch fsyncs every batch, "none" leaves it to the OS.
+ESCALATION_FILE = Path(os.getenv("ESCALATION_FILE", "data/escalation_log.csv"))
+ESCALATION_BATCH_SIZE = int(os.getenv("ESCALATION_BATCH_SIZE", "50"))
+ESCALATION_FLUSH_INTERVAL = float(os.getenv("ESCALATION_FLUSH_INTERVAL", "1.0"))
+ESCALATION_QUEUE_SIZE = int(os.getenv("ESCALATION_QUEUE_SIZE", "10000"))
+ESCALATION_FSYNC = os.getenv("ESCALATION_FSYNC", "none")
+ESCALATION_MAX_BYTES = int(os.getenv("ESCALATION_MAX_BYTES", str(10 * 1024 * 1024)))
+ESCALATION_BACKUP_COUNT = int(os.getenv("ESCALATION_BACKUP_COUNT", "5"))
+ESCALATION_SHARD_PER_PROCESS = os.getenv("ESCALATION_SHARD_PER_PROCESS", "false").lower() == "true"
+
+# Per-node metrics. METRICS_PORT serves /metrics (OpenMetrics text) and
+# /metrics.json from warmup(); unset keeps the registry in-process only.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ["METRICS_PORT"]) if os.getenv("METRICS_PORT") else None
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
@@ -0,0 +1,326 @@
+# agent/embedding_server.py
+"""Shared embedding server for the worker processes on one host.
+
+Every worker that embeds in-process holds its own copy of the encoder and
+runs one forward pass per query. ``python -m agent.embedding_server`` instead
+loads ``EMBEDDING_MODEL`` once and serves it over a Unix socket. Requests
+arriving from all workers within ``EMBEDDING_BATCH_WAIT_MS`` of each other
+(up to ``EMBEDDING_BATCH_SIZE`` texts) are embedded in a single forward pass
+by :class:`MicroBatcher`. The index itself needs no server: workers
+memory-map the same artifact, so its pages are already shared.
+
+With ``EMBEDDING_SERVER_SOCKET`` set, ``agent.embeddings.get_embedding()``
+returns an :class:`EmbeddingClient`. It is a drop-in ``Embeddings`` that falls
+back to the in-process model while the server is unreachable or serves a
+different model.
+
+Messages are length-prefixed frames. A request is a JSON object. The server
+answers ``{"op": "info"}`` with its model name, and ``{"op": "embed",
+"texts": [...]}`` with a ``{"rows", "dim"}`` header followed by a frame of
+float32 vectors.
+"""
+import argparse
+import json
+import logging
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from agent.config import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_WAIT_MS,
+    EMBEDDING_MODEL,
+    EMBEDDING_SERVER_RETRY_INTERVAL,
+    EMBEDDING_SERVER_SOCKET,
+    EMBEDDING_SERVER_TIMEOUT,
+)
+from agent.metrics import registry
+
+_LENGTH = struct.Struct(">I")
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingServerError(RuntimeError):
+    """The embedding server answered with an error or doesn't serve the expected model."""
+
+
+def _send_frame(sock, data):
+    sock.sendall(_LENGTH.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("embedding server connection closed")
+        buffer += chunk
+    return bytes(buffer)
+
+
+def _recv_frame(sock):
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+def _send_json(sock, message):
+    _send_frame(sock, json.dumps(message).encode("utf-8"))
+
+
+def _recv_json(sock):
+    return json.loads(_recv_frame(sock))
+
+
+class MicroBatcher:
+    """Embed texts submitted from many threads in shared ``embed_documents`` calls.
+
+    A batch is flushed once it holds ``max_batch`` texts or ``max_wait``
+    seconds after its first request arrived, whichever comes first. A single
+    request larger than ``max_batch`` is embedded on its own.
+    """
+
+    def __init__(self, embed_documents, max_batch=64, max_wait=0.005):
+        """Start the batching thread in front of ``embed_documents``."""
+        self.embed_documents = embed_documents
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.texts = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """Queue ``texts``; the future resolves to their vectors as a float32 array."""
+        future = Future()
+        self._queue.put((list(texts), future))
+        return future
+
+    def embed(self, texts):
+        """Embed ``texts`` as part of a batch, blocking until it's done."""
+        return self.submit(texts).result()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+                size += len(item[0])
+            self._flush(batch)
+
+    def _flush(self, batch):
+        texts = [text for texts, _ in batch for text in texts]
+        try:
+            vectors = np.asarray(self.embed_documents(texts), dtype=np.float32).reshape(len(texts), -1)
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        self.batches += 1
+        self.texts += len(texts)
+        registry.observe("support_embedding_batch_size", len(texts))
+        offset = 0
+        for request, future in batch:
+            future.set_result(vectors[offset:offset + len(request)])
+            offset += len(request)
+
+    def close(self):
+        """Flush what is queued and stop the batching thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = _recv_json(self.request)
+            except (ConnectionError, OSError):
+                return  # The worker hung up
+            if request.get("op") == "info":
+                _send_json(self.request, {"model": self.server.model})
+                continue
+            try:
+                vectors = self.server.batcher.embed(request["texts"])
+            except Exception as exc:
+                logger.exception("Embedding %d texts failed", len(request.get("texts", ())))
+                _send_json(self.request, {"error": f"{type(exc).__name__}: {exc}"})
+                continue
+            _send_json(self.request, {"rows": vectors.shape[0], "dim": vectors.shape[1]})
+            _send_frame(self.request, vectors.tobytes())
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serve ``embedding`` on the Unix socket at ``path``, one thread per worker connection."""
+
+    daemon_threads = True
+
+    def __init__(self, path, embedding, model=EMBEDDING_MODEL, max_batch=EMBEDDING_BATCH_SIZE,
+                 max_wait=EMBEDDING_BATCH_WAIT_MS / 1000):
+        """Bind the socket at ``path``, replacing one left by a dead server."""
+        self.path = Path(path)
+        self.model = model
+        _remove_stale_socket(self.path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.batcher = MicroBatcher(embedding.embed_documents, max_batch, max_wait)
+        super().__init__(str(self.path), _EmbeddingRequestHandler)
+
+    def server_close(self):
+        """Stop the server and its batcher and remove the socket."""
+        super().server_close()
+        self.batcher.close()
+        self.path.unlink(missing_ok=True)
+
+
+def _remove_stale_socket(path):
+    if not path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(str(path))
+        except OSError:
+            path.unlink()  # Left behind by a server that didn't shut down cleanly
+            return
+    raise RuntimeError(f"An embedding server is already listening on {path}")
+
+
+class EmbeddingClient(Embeddings):
+    """``Embeddings`` backed by the shared server, embedding in-process while it's unavailable.
+
+    ``fallback`` returns the in-process model and is only called when needed.
+    Each thread keeps its own connection. After a failure the server is left
+    alone for ``retry_interval`` seconds.
+    """
+
+    def __init__(self, path, fallback, model=EMBEDDING_MODEL, timeout=EMBEDDING_SERVER_TIMEOUT,
+                 retry_interval=EMBEDDING_SERVER_RETRY_INTERVAL, clock=time.monotonic):
+        """Create a client of the server at ``path``; it connects on first use."""
+        self.path = str(path)
+        self.fallback = fallback
+        self.model = model
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._clock = clock
+        self._retry_at = 0.0
+        self._local = threading.local()
+
+    def embed_documents(self, texts):
+        """Embed ``texts`` on the server, or in-process when it's unavailable."""
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self._remote(texts)
+        if vectors is None:
+            return self.fallback().embed_documents(texts)
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        """Embed a query on the server, or in-process when it's unavailable."""
+        vectors = self._remote([text])
+        if vectors is None:
+            return self.fallback().embed_query(text)
+        return vectors[0].tolist()
+
+    def _remote(self, texts):
+        if self._clock() < self._retry_at:
+            registry.inc("support_embedding_requests", path="local")
+            return None
+        try:
+            conn = self._connection()
+            _send_json(conn, {"op": "embed", "texts": texts})
+            header = _recv_json(conn)
+            if "error" in header:
+                raise EmbeddingServerError(header["error"])
+            data = _recv_frame(conn)
+            vectors = np.frombuffer(data, dtype=np.float32).reshape(header["rows"], header["dim"])
+        except (OSError, ValueError, KeyError, EmbeddingServerError) as exc:
+            self._disconnect()
+            self._retry_at = self._clock() + self.retry_interval
+            logger.warning("Embedding server at %s unavailable (%s); embedding in-process for %.0fs",
+                           self.path, exc, self.retry_interval)
+            registry.inc("support_embedding_requests", path="local")
+            return None
+        registry.inc("support_embedding_requests", path="server")
+        return vectors
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            return conn
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.settimeout(self.timeout)
+            conn.connect(self.path)
+            # Vectors from another model would silently mismatch the index
+            _send_json(conn, {"op": "info"})
+            served = _recv_json(conn).get("model")
+            if served != self.model:
+                raise EmbeddingServerError(f"server embeds with {served}, expected {self.model}")
+        except BaseException:
+            conn.close()
+            raise
+        self._local.conn = conn
+        return conn
+
+    def _disconnect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def main(argv=None) -> None:
+    """Load the embedding model once and serve it to the workers on this host."""
+    parser = argparse.ArgumentParser(description="Serve EMBEDDING_MODEL to local workers over a Unix socket.")
+    parser.add_argument("--socket", type=Path, default=EMBEDDING_SERVER_SOCKET or None,
+                        help="socket path (default: EMBEDDING_SERVER_SOCKET)")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="most texts per forward pass")
+    parser.add_argument("--batch-wait-ms", type=float, default=EMBEDDING_BATCH_WAIT_MS,
+                        help="how long a request waits for others to share its forward pass")
+    args = parser.parse_args(argv)
+    if args.socket is None:
+        parser.error("pass --socket or set EMBEDDING_SERVER_SOCKET")
+
+    from agent.embeddings import get_local_embedding
+    from agent.metrics import get_metrics_server
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    embedding = get_local_embedding()
+    embedding.embed_query("warmup")
+    get_metrics_server()
+    max_wait = args.batch_wait_ms / 1000
+    with EmbeddingServer(args.socket, embedding, EMBEDDING_MODEL, args.batch_size, max_wait) as server:
+        logger.info("Serving %s on %s", EMBEDDING_MODEL, args.socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# agent/embeddings.py
+"""Embedding models: the in-process model, or a client of the shared embedding server."""
+import re
+import zlib
+from functools import cache
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from agent.config import EMBEDDING_MODEL, EMBEDDING_SERVER_SOCKET
+
+# EMBEDDING_MODEL value selecting the model-free HashingEmbeddings
+HASHING_MODEL = "hashing"
+
+
+class HashingEmbeddings(Embeddings):
+    """Model-free bag-of-words embeddings (feature hashing) for offline tests and benchmarks."""
+
+    def __init__(self, size=256):
+        """Create embeddings of ``size`` dimensions."""
+        self.size = size
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(token.encode("utf-8")) % self.size] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        """Embed each text as its normalized hashed token counts."""
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        """Embed a query as its normalized hashed token counts."""
+        return self._embed(text)
+
+
+@cache
+def get_local_embedding():
+    """Return the in-process embedding model, loading it on first use."""
+    if EMBEDDING_MODEL == HASHING_MODEL:
+        return HashingEmbeddings()
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL)
+
+
+@cache
+def get_embedding():
+    """Return the shared embedding model: a client of the embedding server when one is configured."""
+    if EMBEDDING_SERVER_SOCKET:
+        from agent.embedding_server import EmbeddingClient
+
+        return EmbeddingClient(EMBEDDING_SERVER_SOCKET, fallback=get_local_embedding)
+    return get_local_embedding()
@@ -0,0 +1,171 @@
+# agent/escalation_sink.py
+"""Non-blocking, batched CSV sink for escalated tickets.
+
+Rows are queued by the escalation node and written by a background thread in
+batches, flushed when ``batch_size`` rows are pending or every
+``flush_interval`` seconds. Appends take an exclusive ``flock`` so several
+worker processes can share one file; where ``fcntl`` is unavailable (or with
+``shard_per_process``) each process writes its own shard file instead. Files
+are rotated once they exceed ``max_bytes``.
+"""
+import atexit
+import csv
+import io
+import os
+import queue
+import threading
+import time
+from functools import cache
+from pathlib import Path
+
+from agent.config import (
+    ESCALATION_BACKUP_COUNT,
+    ESCALATION_BATCH_SIZE,
+    ESCALATION_FILE,
+    ESCALATION_FLUSH_INTERVAL,
+    ESCALATION_FSYNC,
+    ESCALATION_MAX_BYTES,
+    ESCALATION_QUEUE_SIZE,
+    ESCALATION_SHARD_PER_PROCESS,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+HEADER = ["Subject", "Description", "Draft", "Feedback", "Escalation_Reason"]
+
+_FLUSH = object()
+_STOP = object()
+
+
+class EscalationSink:
+    """CSV escalation log written by a background thread in batches.
+
+    Rows are flushed every ``batch_size`` rows or ``flush_interval`` seconds.
+    Appends hold an exclusive lock so worker processes can share the file,
+    which is rotated once it reaches ``max_bytes``. Rows that can't be written
+    are counted in ``dropped`` instead of failing the ticket.
+    """
+
+    def __init__(self, path, batch_size=50, flush_interval=1.0, queue_size=10000, fsync=False,
+                 max_bytes=10 * 1024 * 1024, backup_count=5, shard_per_process=False):
+        """Start the writer thread for the log at ``path``, or a per-process shard of it."""
+        path = Path(path)
+        if shard_per_process or fcntl is None:
+            path = path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="escalation-sink", daemon=True)
+        self._thread.start()
+
+    def write(self, row, block=True, timeout=None):
+        """Queue a row for writing; raises ``queue.Full`` when non-blocking and the queue is full."""
+        self._queue.put(list(row), block=block, timeout=timeout)
+
+    def flush(self, timeout=None):
+        """Block until every row queued so far has been written."""
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """Write what is queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, list):
+                pending.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(pending) < self.batch_size:
+                    continue
+
+            if pending:
+                self._write_batch(pending)
+                pending = []
+            deadline = None
+            if isinstance(item, tuple) and item[0] is _FLUSH:
+                item[1].set()
+            elif item is _STOP:
+                return
+
+    def _write_batch(self, rows):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._open_locked() as f:
+                f.seek(0, os.SEEK_END)  # Another process may have appended while we waited
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                if f.tell() == 0:
+                    writer.writerow(HEADER)
+                writer.writerows(rows)
+                f.write(buffer.getvalue())
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+                if self.max_bytes and f.tell() >= self.max_bytes:
+                    self._rotate()
+        except OSError:
+            # Never take the worker down over the escalation log
+            self.dropped += len(rows)
+
+    def _open_locked(self):
+        """Open the log for appending under an exclusive lock, following rotations by other processes."""
+        while True:
+            f = open(self.path, "a", newline="", encoding="utf-8")
+            if fcntl is None:
+                return f
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino:
+                    return f
+            except FileNotFoundError:
+                pass
+            f.close()  # Rotated while we waited for the lock; reopen the new file
+
+    def _rotate(self):
+        """Shift ``log.csv`` to ``log.csv.1`` (and older backups up by one); called under the lock."""
+        for i in range(self.backup_count - 1, 0, -1):
+            src = self.path.with_name(f"{self.path.name}.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            os.truncate(self.path, 0)
+
+
+@cache
+def get_escalation_sink():
+    """Return the process-wide escalation sink, starting its writer thread on first use."""
+    sink = EscalationSink(
+        ESCALATION_FILE,
+        batch_size=ESCALATION_BATCH_SIZE,
+        flush_interval=ESCALATION_FLUSH_INTERVAL,
+        queue_size=ESCALATION_QUEUE_SIZE,
+        fsync=ESCALATION_FSYNC == "batch",
+        max_bytes=ESCALATION_MAX_BYTES,
+        backup_count=ESCALATION_BACKUP_COUNT,
+        shard_per_process=ESCALATION_SHARD_PER_PROCESS,
+    )
+    atexit.register(sink.close)
+    return sink
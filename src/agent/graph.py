@@ -1,62 +1,150 @@
 # agent/graph.py
-from langgraph.graph import StateGraph, END
-from langchain.schema import BaseMessage
-from typing import TypedDict, List, Union
+"""The support ticket graph: classify, retrieve, draft, review, then respond or escalate."""
+from typing import Dict, List, TypedDict
 
-from .nodes.classifier import classify_ticket
-from .nodes.retriever import retrieve_context
-from .nodes.drafter import generate_draft
-from .nodes.reviewer import review_draft
-from .nodes.escalation import log_escalation
+from langchain_core.runnables import RunnableLambda
+from langgraph.graph import END, START, StateGraph
 
-RETRY_LIMIT = 2
+from .checkpoint import get_checkpointer
+from .config import (
+    CHECKPOINTER,
+    FAST_CLASSIFIER_ENABLED,
+    LLM_ROLES,
+    METRICS_ENABLED,
+    MODEL_CASCADE_ENABLED,
+    SEMANTIC_CACHE_ENABLED,
+    SPECULATIVE_RETRIEVAL,
+)
+from .embeddings import get_embedding
+from .escalation_sink import get_escalation_sink
+from .llm import MODEL_TIERS, get_llm
+from .metrics import get_metrics_server, instrument_node
+from .nodes.classifier import aclassify_ticket, classify_ticket, get_category_centroids
+from .nodes.drafter import agenerate_draft, generate_draft
+from .nodes.escalation import alog_escalation, log_escalation
+from .nodes.response_cache import (
+    acheck_response_cache,
+    check_response_cache,
+    remember_response,
+    route_after_cache,
+)
+from .nodes.retriever import (
+    aprefetch_context,
+    aretrieve_context,
+    get_knowledge_base_watcher,
+    get_vector_store,
+    prefetch_context,
+    retrieve_context,
+)
+from .nodes.reviewer import areview_draft, review_draft
+from .semantic_cache import get_semantic_cache
+
+RETRY_LIMIT = 2  # Drafts per ticket before it is escalated
 
 class SupportState(TypedDict):
+    """State of one ticket as it moves through the graph."""
+
     subject: str
     description: str
     category: str
+    classification_path: str  # "local" (embedding fast path) or "llm"
+    classification_margin: float  # local classifier's top-1 minus top-2 similarity
+    candidate_context: Dict[str, List[str]] | None  # top prefetched hits per category, cleared once retrieved
     context: List[str]
     draft: str
+    draft_aborted: bool  # streamed draft stopped early by a partial-draft rule
     review_result: str
     review_feedback: str
+    review_violations: List[str]  # hard rules broken, when rejected by the pre-review
     attempt: int
     final_response: str
+    escalated: bool
+    cache_hit: bool  # answered or seeded from the semantic response cache
+    deadline: float  # epoch seconds when the ticket's latency budget runs out
 
 def finalize_response(state):
-    return {**state, "final_response": state["draft"]}
+    """Respond with the approved draft."""
+    return {"final_response": state["draft"]}
+
+def finalize_and_cache(state):
+    """Respond with the approved draft and remember it in the semantic cache."""
+    result = finalize_response(state)
+    remember_response({**state, **result})
+    return result
+
+def warmup():
+    """Eagerly load the lazily initialized resources so the first ticket doesn't pay for them."""
+    get_embedding()
+    get_vector_store()
+    if FAST_CLASSIFIER_ENABLED:
+        get_category_centroids()
+    for role in LLM_ROLES:
+        for tier in MODEL_TIERS if MODEL_CASCADE_ENABLED else ("fast",):
+            get_llm(role, tier)
+    get_escalation_sink()
+    if SEMANTIC_CACHE_ENABLED:
+        get_semantic_cache()
+    get_metrics_server()
+    get_knowledge_base_watcher()
+
+def route_after_review(state):
+    """Route an approved draft to finalize, a rejected one to another draft or escalation."""
+    # The reviewer already advanced "attempt" past a rejected draft; routers never write state
+    if state.get("review_result") == "approved":
+        return "finalize"
+    if state.get("attempt", 1) > RETRY_LIMIT:
+        return "escalate"
+    return "draft"
 
-def build_support_agent():
+def build_support_agent(semantic_cache=SEMANTIC_CACHE_ENABLED, instrument=METRICS_ENABLED,
+                        speculative_retrieval=SPECULATIVE_RETRIEVAL, checkpointer=CHECKPOINTER):
+    """Build and compile the support graph.
+
+    ``checkpointer`` is a kind from ``agent.checkpoint`` ("none", "memory" or
+    "sqlite") or a langgraph checkpointer instance; with one, every run needs a
+    ``thread_id`` in its config.
+    """
     builder = StateGraph(SupportState)
 
-    # Add all nodes
-    builder.add_node("classify", classify_ticket)
-    builder.add_node("retrieve", retrieve_context)
-    builder.add_node("draft", generate_draft)
-    builder.add_node("review", review_draft)
-    builder.add_node("escalate", log_escalation)
-    builder.add_node("finalize", finalize_response)
+    def node(name, func, afunc=None):
+        # Instrumented nodes record wall time, tokens and routes in agent.metrics
+        if instrument:
+            return instrument_node(name, func, afunc)
+        return RunnableLambda(func, afunc=afunc) if afunc else func
+
+    # Add all nodes; each has a native async variant used by ainvoke/abatch
+    builder.add_node("classify", node("classify", classify_ticket, aclassify_ticket))
+    builder.add_node("retrieve", node("retrieve", retrieve_context, aretrieve_context))
+    builder.add_node("draft", node("draft", generate_draft, agenerate_draft))
+    builder.add_node("review", node("review", review_draft, areview_draft))
+    builder.add_node("escalate", node("escalate", log_escalation, alog_escalation))
+    builder.add_node("finalize", node("finalize", finalize_and_cache if semantic_cache else finalize_response))
+
+    # With speculative retrieval the knowledge base is searched while the ticket is classified
+    first = ["classify"]
+    if speculative_retrieval:
+        builder.add_node("prefetch", node("prefetch", prefetch_context, aprefetch_context))
+        first.append("prefetch")
 
     # Set entry point
-    builder.set_entry_point("classify")
+    if semantic_cache:
+        # Near-duplicates of approved tickets skip straight to the answer (or the reviewer)
+        def route_from_cache(state):
+            route = route_after_cache(state)
+            return first if route == "classify" else route
 
-    # Add sequential edges
-    builder.add_edge("classify", "retrieve")
+        builder.add_node("cache_lookup", node("cache_lookup", check_response_cache, acheck_response_cache))
+        builder.set_entry_point("cache_lookup")
+        builder.add_conditional_edges("cache_lookup", route_from_cache, [*first, "retrieve", END])
+    else:
+        for name in first:
+            builder.add_edge(START, name)
+
+    # Add sequential edges; retrieve waits for both branches when prefetching
+    builder.add_edge(first if speculative_retrieval else "classify", "retrieve")
     builder.add_edge("retrieve", "draft")
     builder.add_edge("draft", "review")
 
-    # Define routing logic after review
-    def route_after_review(state):
-        current_attempt = state.get("attempt", 1)
-        
-        if state.get("review_result") == "approved":
-            return "finalize"
-        elif current_attempt >= RETRY_LIMIT:
-            return "escalate"
-        else:
-            # Increment attempt counter and retry
-            state["attempt"] = current_attempt + 1
-            return "draft"
-
     # Add conditional edges with explicit mapping
     builder.add_conditional_edges(
         "review",
@@ -68,6 +156,8 @@ def build_support_agent():
     builder.add_edge("finalize", END)
     builder.add_edge("escalate", END)
 
-    return builder.compile()
+    if isinstance(checkpointer, str):
+        checkpointer = get_checkpointer(checkpointer)
+    return builder.compile(checkpointer=checkpointer)
 
 graph = build_support_agent()
\ No newline at end of file
@@ -0,0 +1,109 @@
+# agent/knowledge_base.py
+"""Knowledge base articles loaded from a directory of document files.
+
+The directory has one sub-directory per category and one Markdown or text
+file per article::
+
+    data/knowledge_base/billing/02-refunds-and-credits.md
+
+A leading ``# Title`` line names the article and every following paragraph
+(blank-line separated) is one retrievable document. Documents carry their
+source file and article title in their metadata. Editing one paragraph
+therefore changes exactly one document's content hash, and the incremental
+indexer (``agent.vectorstore.update_index``) only re-embeds that document.
+"""
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from agent.config import KNOWLEDGE_BASE_DIR
+
+ARTICLE_SUFFIXES = (".md", ".txt")
+
+logger = logging.getLogger(__name__)
+
+
+def _articles(directory: Path):
+    for category_dir in sorted(p for p in directory.iterdir() if p.is_dir() and not p.name.startswith(".")):
+        for path in sorted(category_dir.iterdir()):
+            if path.suffix.lower() in ARTICLE_SUFFIXES and not path.name.startswith("."):
+                yield category_dir.name, path
+
+
+def read_article(path: Path) -> Tuple[str, List[str]]:
+    """Return the article's title and its paragraphs, each joined onto one line."""
+    text = Path(path).read_text(encoding="utf-8")
+    title = Path(path).stem
+    paragraphs = []
+    for block in text.replace("\r\n", "\n").split("\n\n"):
+        lines = [line.strip() for line in block.splitlines() if line.strip()]
+        if lines and lines[0].startswith("# ") and not paragraphs:
+            title = lines.pop(0)[2:].strip()
+        if lines:
+            paragraphs.append(" ".join(lines))
+    return title, paragraphs
+
+
+def load_knowledge_base(directory: Path = KNOWLEDGE_BASE_DIR) -> Dict[str, List[Document]]:
+    """Read every article under ``directory`` into per-category documents; empty if it doesn't exist."""
+    directory = Path(directory)
+    category_docs = {}
+    if not directory.is_dir():
+        logger.warning("Knowledge base directory %s not found", directory)
+        return category_docs
+    for category, path in _articles(directory):
+        title, paragraphs = read_article(path)
+        source = path.relative_to(directory).as_posix()
+        category_docs.setdefault(category, []).extend(
+            Document(page_content=paragraph, metadata={"source": source, "title": title})
+            for paragraph in paragraphs
+        )
+    return category_docs
+
+
+def fingerprint(directory: Path = KNOWLEDGE_BASE_DIR) -> tuple:
+    """Cheap change marker for the articles: their paths, sizes and modification times."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return ()
+    return tuple((path.relative_to(directory).as_posix(), stat.st_size, stat.st_mtime_ns)
+                 for _, path in _articles(directory) for stat in (path.stat(),))
+
+
+class KnowledgeBaseWatcher:
+    """Poll the knowledge base directory from a daemon thread and call ``on_change`` when it changes."""
+
+    def __init__(self, directory, interval, on_change):
+        """Start polling ``directory`` every ``interval`` seconds."""
+        self.directory = Path(directory)
+        self.interval = interval
+        self.on_change = on_change
+        self._fingerprint = fingerprint(self.directory)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="knowledge-base-watcher", daemon=True)
+        self._thread.start()
+
+    def check(self):
+        """Call ``on_change`` if the articles changed since the last check; return whether they did."""
+        current = fingerprint(self.directory)
+        if current == self._fingerprint:
+            return False
+        self.on_change()
+        # Only after a successful reload, so a failed one is retried on the next poll
+        self._fingerprint = current
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Knowledge base reload failed; still serving the previous index")
+
+    def stop(self):
+        """Stop polling and wait for the thread to exit."""
+        self._stop.set()
+        self._thread.join()
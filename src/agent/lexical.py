@@ -0,0 +1,100 @@
+# agent/lexical.py
+"""BM25 keyword index over the knowledge base, and reciprocal rank fusion.
+
+Dense embeddings blur exact tokens such as versions ("2.1.0"), acronyms
+("SAML"), file names ("error.log") or phone numbers ("1-800-SUPPORT"). The
+inverted index keeps them as terms (along with their alphanumeric parts), so
+a ticket quoting one ranks the matching document first. Postings are stored
+as flat NumPy arrays, so scoring a query is a gather plus one ``bincount``.
+"""
+import re
+from typing import List, Sequence
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-_/][a-z0-9]+)*")
+PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text) -> List[str]:
+    """Lowercased terms; compound tokens like "error.log" also yield their parts."""
+    terms = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        terms.append(token)
+        parts = PART_RE.findall(token)
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+class BM25Index:
+    """Okapi BM25 index over a fixed list of documents.
+
+    Postings are kept in CSR arrays, so scoring a query touches only the
+    postings of its terms and needs no per-document Python loop.
+    """
+
+    def __init__(self, documents, k1=1.2, b=0.75):
+        """Index ``documents`` with term-frequency saturation ``k1`` and length normalization ``b``."""
+        self.documents = list(documents)
+        self.k1 = k1
+        self.b = b
+
+        postings = {}
+        doc_lengths = np.zeros(len(self.documents), dtype=np.float32)
+        for doc_id, doc in enumerate(self.documents):
+            terms = tokenize(doc.page_content)
+            doc_lengths[doc_id] = len(terms)
+            for term in terms:
+                counts = postings.setdefault(term, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        # CSR layout: the postings of term t are doc_ids/term_freqs[indptr[t]:indptr[t + 1]]
+        self.vocabulary = {term: term_id for term_id, term in enumerate(postings)}
+        self.indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+        self.indptr[1:] = np.cumsum([len(counts) for counts in postings.values()])
+        self.doc_ids = np.fromiter((d for counts in postings.values() for d in counts),
+                                   dtype=np.int32, count=int(self.indptr[-1]))
+        self.term_freqs = np.fromiter((tf for counts in postings.values() for tf in counts.values()),
+                                      dtype=np.float32, count=int(self.indptr[-1]))
+
+        doc_freqs = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log1p((len(self.documents) - doc_freqs + 0.5) / (doc_freqs + 0.5))
+        average = doc_lengths.mean() if len(self.documents) else 1.0
+        # Per-document part of the BM25 denominator, precomputed once
+        self._length_norm = k1 * (1 - b + b * doc_lengths / max(average, 1e-9))
+
+    def __len__(self):
+        """Return the number of indexed documents."""
+        return len(self.documents)
+
+    def scores(self, query) -> np.ndarray:
+        """BM25 score of every document for ``query``."""
+        term_ids = [self.vocabulary[t] for t in set(tokenize(query)) if t in self.vocabulary]
+        if not term_ids:
+            return np.zeros(len(self.documents), dtype=np.float32)
+        starts, ends = self.indptr[term_ids], self.indptr[np.add(term_ids, 1)]
+        spans = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+        docs = self.doc_ids[spans]
+        tf = self.term_freqs[spans]
+        idf = np.repeat(self.idf[term_ids], ends - starts)
+        weights = idf * tf * (self.k1 + 1) / (tf + self._length_norm[docs])
+        return np.bincount(docs, weights=weights, minlength=len(self.documents)).astype(np.float32)
+
+    def rank(self, query, matched_only=True) -> List[int]:
+        """Document positions by descending score; ties keep knowledge base order."""
+        scores = self.scores(query)
+        order = np.argsort(-scores, kind="stable")
+        if matched_only:
+            order = order[scores[order] > 0]
+        return order.tolist()
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence], k=60) -> list:
+    """Fuse ranked lists of hashable items by summing 1 / (k + rank) across lists."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.__getitem__, reverse=True)
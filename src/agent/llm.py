@@ -0,0 +1,175 @@
+# agent/llm.py
+"""Shared LLM clients, one long-lived connection pool per node role.
+
+Chat models are created once per (role, tier) and reuse their HTTP keep-alive
+connections across tickets. Async clients are bound to the event loop they
+were created on, so async callers get one model per (loop, role, tier). Every
+client's requests pass through the process-wide limiter in agent.rate_limit.
+
+Each role has a cheap "fast" model tier and a "strong" one; :func:`model_tier`
+picks the strong tier only when a node asks for it and the ticket's latency
+budget isn't spent.
+"""
+import asyncio
+import threading
+import time
+import weakref
+from functools import cache
+
+from agent.config import (
+    LLM_BACKEND,
+    LLM_MAX_RETRIES,
+    LLM_RATE_LIMIT_ENABLED,
+    LLM_ROLES,
+    LOCAL_LLM_APPROVE_RATIO,
+    LOCAL_LLM_LATENCY,
+    LOCAL_LLM_SEED,
+    MODEL_CASCADE_ENABLED,
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    TICKET_LATENCY_BUDGET,
+)
+from agent.metrics import TokenUsageHandler
+
+_loop_llms = weakref.WeakKeyDictionary()
+_loop_llms_lock = threading.Lock()
+
+MODEL_TIERS = ("fast", "strong")
+
+
+def tier_settings(role, tier="fast"):
+    """Return the role's settings with ``model`` and ``timeout`` taken from the given tier."""
+    settings = LLM_ROLES[role]
+    if tier == "strong":
+        return {**settings, "model": settings["strong_model"], "timeout": settings["strong_timeout"]}
+    return settings
+
+
+def ticket_deadline(now=None):
+    """Wall-clock time at which a ticket starting now runs out of latency budget, or None."""
+    if TICKET_LATENCY_BUDGET <= 0:
+        return None
+    return (time.time() if now is None else now) + TICKET_LATENCY_BUDGET
+
+
+def model_tier(state, escalate):
+    """"strong" when a node wants to escalate and the ticket has budget left, "fast" otherwise."""
+    if not escalate or not MODEL_CASCADE_ENABLED:
+        return "fast"
+    deadline = state.get("deadline")
+    if deadline is not None and time.time() >= deadline:
+        return "fast"
+    return "strong"
+
+
+def _limits(settings):
+    import httpx
+
+    return httpx.Limits(max_connections=settings["pool_size"],
+                        max_keepalive_connections=settings["pool_size"])
+
+
+def _retries():
+    # With the shared limiter, retries (and their backoff) happen in its transport
+    return 0 if LLM_RATE_LIMIT_ENABLED else LLM_MAX_RETRIES
+
+
+def _transport(settings):
+    import httpx
+
+    transport = httpx.HTTPTransport(limits=_limits(settings))
+    if not LLM_RATE_LIMIT_ENABLED:
+        return transport
+    from agent.rate_limit import RateLimitedTransport, get_rate_limiter
+
+    return RateLimitedTransport(transport, get_rate_limiter())
+
+
+def _async_transport(settings):
+    import httpx
+
+    transport = httpx.AsyncHTTPTransport(limits=_limits(settings))
+    if not LLM_RATE_LIMIT_ENABLED:
+        return transport
+    from agent.rate_limit import AsyncRateLimitedTransport, get_rate_limiter
+
+    return AsyncRateLimitedTransport(transport, get_rate_limiter())
+
+
+@cache
+def _sync_client(role, tier):
+    import httpx
+    import openai
+
+    settings = tier_settings(role, tier)
+    return openai.OpenAI(
+        api_key=OPENROUTER_API_KEY,
+        base_url=OPENROUTER_BASE_URL,
+        timeout=settings["timeout"],
+        max_retries=_retries(),
+        http_client=httpx.Client(transport=_transport(settings), timeout=settings["timeout"]),
+    )
+
+
+def _async_client(role, tier):
+    import httpx
+    import openai
+
+    settings = tier_settings(role, tier)
+    return openai.AsyncOpenAI(
+        api_key=OPENROUTER_API_KEY,
+        base_url=OPENROUTER_BASE_URL,
+        timeout=settings["timeout"],
+        max_retries=_retries(),
+        http_client=httpx.AsyncClient(transport=_async_transport(settings), timeout=settings["timeout"]),
+    )
+
+
+def _chat_model(role, tier, async_client=None):
+    from langchain_community.chat_models import ChatOpenAI
+
+    settings = tier_settings(role, tier)
+    kwargs = {"async_client": async_client.chat.completions} if async_client else {}
+    return ChatOpenAI(client=_sync_client(role, tier).chat.completions,
+                      openai_api_base=OPENROUTER_BASE_URL,
+                      openai_api_key=OPENROUTER_API_KEY,
+                      model_name=settings["model"],
+                      request_timeout=settings["timeout"],
+                      max_retries=_retries(),
+                      callbacks=[TokenUsageHandler(role, tier)],
+                      **kwargs)
+
+
+@cache
+def _sync_llm(role, tier):
+    return _chat_model(role, tier)
+
+
+@cache
+def _local_llm(role, tier):
+    from agent.local_llm import LocalChatModel
+
+    return LocalChatModel(role=role, latency=LOCAL_LLM_LATENCY,
+                          approve_ratio=LOCAL_LLM_APPROVE_RATIO, seed=LOCAL_LLM_SEED,
+                          callbacks=[TokenUsageHandler(role, tier)])
+
+
+def get_llm(role, tier="fast"):
+    """Return the shared chat model for a node role ("classifier", "drafter" or "reviewer") and model tier."""
+    if role not in LLM_ROLES:
+        raise ValueError(f"Unknown LLM role: {role!r}")
+    if tier not in MODEL_TIERS:
+        raise ValueError(f"Unknown model tier: {tier!r}")
+    if LLM_BACKEND == "local":
+        return _local_llm(role, tier)
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return _sync_llm(role, tier)
+
+    with _loop_llms_lock:
+        llms = _loop_llms.setdefault(loop, {})
+        if (role, tier) not in llms:
+            llms[role, tier] = _chat_model(role, tier, async_client=_async_client(role, tier))
+        return llms[role, tier]
@@ -0,0 +1,147 @@
+# agent/local_llm.py
+"""Deterministic, network-free stand-in for the OpenRouter chat models.
+
+Selected with ``LLM_BACKEND=local``. Each role answers the node's prompt with
+a plausible reply derived only from the prompt text, which makes graph runs
+reproducible in tests and benchmarks. Benchmarks can add simulated network
+latency drawn from a distribution and force a reviewer approve ratio.
+"""
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Union
+
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from pydantic import PrivateAttr
+
+CATEGORY_KEYWORDS = {
+    "billing": ("bill", "charge", "invoice", "refund", "payment", "subscription", "price", "plan", "discount", "receipt"),
+    "technical": ("crash", "bug", "error", "install", "update", "slow", "sync", "api", "app", "browser", "version"),
+    "security": ("password", "login", "log in", "2fa", "locked", "suspicious", "hacked", "breach", "access", "sso"),
+}
+
+
+def _field(prompt, name):
+    """Return the last ``name: value`` line of a prompt."""
+    matches = re.findall(rf"^{name}:[ \t]*(.*)$", prompt, flags=re.MULTILINE)
+    return matches[-1].strip() if matches else ""
+
+
+def _passages(prompt):
+    """Knowledge base passages listed as ``[n] text`` lines in the prompt's context section."""
+    section = prompt.split("## KNOWLEDGE BASE CONTEXT:", 1)[-1].split("\n## ", 1)[0]
+    return [line.split("] ", 1)[1] for line in section.splitlines() if re.match(r"^\[\d+\] ", line)]
+
+
+def parse_latency(spec):
+    """Turn a latency spec into a sampler taking a ``random.Random``.
+
+    Accepts seconds (``"0.2"``) or ``uniform:low:high``, ``normal:mean:stddev``,
+    ``lognormal:median:sigma`` and ``exp:mean``.
+    """
+    if isinstance(spec, (int, float)):
+        return lambda rng: float(spec)
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        return lambda rng: float(kind)
+    args = [float(p) for p in params.split(":")]
+    samplers = {
+        "uniform": lambda rng: rng.uniform(*args),
+        "normal": lambda rng: max(0.0, rng.gauss(*args)),
+        "lognormal": lambda rng: args[0] * rng.lognormvariate(0.0, args[1]),
+        "exp": lambda rng: rng.expovariate(1.0 / args[0]),
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {spec!r}")
+    return samplers[kind]
+
+
+def classify_text(text):
+    """Pick the category whose keywords occur most often in ``text``, else "general"."""
+    text = text.lower()
+    scores = {cat: sum(text.count(word) for word in words) for cat, words in CATEGORY_KEYWORDS.items()}
+    best = max(scores, key=scores.get)
+    return best if scores[best] > 0 else "general"
+
+
+class LocalChatModel(SimpleChatModel):
+    """Chat model that fakes the classifier, drafter and reviewer without any network calls."""
+
+    role: str
+    latency: Union[float, str] = 0.0
+    approve_ratio: float | None = None
+    seed: int = 0
+
+    _rng: random.Random = PrivateAttr()
+    _rng_lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _sample_latency = PrivateAttr()
+
+    def model_post_init(self, __context):
+        """Seed the role's random generator and parse the latency distribution."""
+        self._rng = random.Random(f"{self.seed}:{self.role}")
+        self._sample_latency = parse_latency(self.latency)
+
+    @property
+    def _llm_type(self):
+        return "local"
+
+    def _draw(self):
+        """Return (simulated latency, uniform draw for the approve ratio)."""
+        with self._rng_lock:
+            return self._sample_latency(self._rng), self._rng.random()
+
+    def _respond(self, prompt, draw):
+        if self.role == "classifier":
+            return classify_text(f"{_field(prompt, 'Subject')} {_field(prompt, 'Description')}")
+        if self.role == "reviewer":
+            draft = prompt.split("Draft Response:", 1)[-1].split("## YOUR REVIEW:", 1)[0]
+            if self.approve_ratio is not None:
+                approved = draw < self.approve_ratio
+            else:
+                approved = len(draft.split()) >= 50
+            if approved:
+                return "APPROVED\nThe response is specific, actionable and addresses the ticket."
+            return "REJECTED\nThe response does not give specific, actionable steps for this ticket."
+        return self._draft(prompt)
+
+    def _draft(self, prompt):
+        subject = _field(prompt, "Subject")
+        category = _field(prompt, "Category") or "general"
+        context = " ".join(_passages(prompt))
+        return (
+            f"Thank you for contacting us about \"{subject}\". I understand how frustrating this {category} issue is, "
+            f"and I'm happy to help. According to our documentation: {context} "
+            "Please follow these steps: first, review the relevant settings in your account dashboard; second, "
+            "apply the change described above; third, let us know the exact error message or reference number "
+            "if the problem continues, so that we can investigate further and resolve it quickly for you."
+        )
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, draw = self._draw()
+        if latency:
+            time.sleep(latency)
+        return self._respond(messages[-1].content, draw)
+
+    async def _acall(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, draw = self._draw()
+        if latency:
+            await asyncio.sleep(latency)
+        return self._respond(messages[-1].content, draw)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, draw = self._draw()
+        if latency:
+            time.sleep(latency)  # Time to first token
+        for token in re.findall(r"\S+\s*", self._respond(messages[-1].content, draw)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        latency, draw = self._draw()
+        if latency:
+            await asyncio.sleep(latency)
+        for token in re.findall(r"\S+\s*", self._respond(messages[-1].content, draw)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,353 @@
+# agent/metrics.py
+"""In-process metrics for the support graph, exportable without LangSmith.
+
+``build_support_agent()`` wraps every node with :func:`instrument_node`,
+which records the node's wall time and outcome, and the terminal nodes also
+record each ticket's route and final attempt. :class:`TokenUsageHandler`
+attributes LLM prompt/completion tokens to the node that made the call. The
+registry renders as OpenMetrics text (scrapeable by Prometheus) or as a JSON
+snapshot, and :func:`get_metrics_server` serves both over HTTP.
+"""
+import contextvars
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+from functools import cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables import RunnableLambda
+
+from agent.config import METRICS_HOST, METRICS_PORT
+from agent.tokens import count_tokens
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ATTEMPT_BUCKETS = (1, 2, 3, 4, 5)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TERMINAL_NODES = ("finalize", "escalate")
+
+
+class Metric(NamedTuple):
+    """Declaration of a metric: its type, help text and, for histograms, bucket bounds."""
+
+    kind: str  # "counter" or "histogram"
+    help: str
+    buckets: Tuple[float, ...] | None = None
+
+
+METRICS = {
+    "support_node_duration_seconds": Metric("histogram", "Wall time of each graph node run.", DURATION_BUCKETS),
+    "support_node_runs": Metric("counter", "Graph node runs by outcome."),
+    "support_llm_calls": Metric("counter", "LLM calls by node, role, model tier and outcome."),
+    "support_llm_prompt_tokens": Metric("counter", "Prompt tokens sent to the LLM."),
+    "support_llm_completion_tokens": Metric("counter", "Completion tokens generated by the LLM."),
+    "support_llm_retries": Metric("counter", "LLM HTTP requests retried, by reason (throttled or error)."),
+    "support_llm_coalesced": Metric("counter", "LLM calls answered by an identical call already in flight, by role."),
+    "support_draft_aborts": Metric("counter", "Streamed drafts stopped early by a partial-draft rule, by rule."),
+    "support_cache_requests": Metric("counter", "Cache lookups by cache and result."),
+    "support_embedding_requests": Metric("counter", "Embedding requests by path (shared server or in-process)."),
+    "support_embedding_batch_size": Metric("histogram", "Texts per embedding server forward pass.", BATCH_BUCKETS),
+    "support_classifications": Metric("counter", "Tickets classified, by path."),
+    "support_ticket_routes": Metric("counter", "Tickets that ended on each route."),
+    "support_ticket_attempts": Metric("histogram", "Draft attempts per ticket when it ended.", ATTEMPT_BUCKETS),
+}
+
+_current_node = contextvars.ContextVar("support_node", default=None)
+
+
+def current_node():
+    """Name of the graph node running in this context, if any."""
+    return _current_node.get()
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _number(value):
+    if isinstance(value, int):
+        return str(value)
+    return "+Inf" if value == math.inf else repr(float(value))
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size):
+        self.counts = [0] * (size + 1)  # One per bucket plus +Inf, not cumulative
+        self.sum = 0.0
+        self.count = 0
+
+
+def _cumulative(buckets, counts):
+    total = 0
+    for bound, count in zip((*buckets, math.inf), counts):
+        total += count
+        yield bound, total
+
+
+class MetricsRegistry:
+    """Thread-safe in-process counters and histograms of the metrics declared in ``METRICS``.
+
+    Samples are keyed by metric name and labels. Collectors add counters that
+    are read only at export time, such as cache hit counts.
+    """
+
+    def __init__(self):
+        """Create an empty registry."""
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+
+    def inc(self, name, value=1, **labels):
+        """Add ``value`` to the counter ``name`` with ``labels``."""
+        key = (name, _key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record ``value`` in the histogram ``name`` with ``labels``."""
+        buckets = METRICS[name].buckets
+        key = (name, _key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(buckets))
+            histogram.counts[bisect_left(buckets, value)] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    def add_collector(self, collector):
+        """Register a callable yielding ``(counter_name, labels, value)`` samples read at export time."""
+        self._collectors.append(collector)
+
+    def reset(self):
+        """Drop every recorded sample; collectors are kept."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def record_node(self, node, seconds, result, state=None):
+        """Record one node run from its input ``state`` and the update it returned (None when it raised)."""
+        self.observe("support_node_duration_seconds", seconds, node=node)
+        self.inc("support_node_runs", node=node, status="error" if result is None else "ok")
+        if result is None:
+            return
+        if node == "cache_lookup":
+            hit = bool(result.get("cache_hit"))
+            self.inc("support_cache_requests", cache="response", result="hit" if hit else "miss")
+            if hit and result.get("final_response"):
+                self._record_route("cache", result.get("attempt", 1))
+        elif node == "classify" and result.get("classification_path"):
+            self.inc("support_classifications", path=result["classification_path"])
+        elif node in TERMINAL_NODES:
+            attempt = (state or {}).get("attempt", 1)
+            # Escalated tickets arrive with "attempt" already advanced past their last rejected draft
+            self._record_route(node, max(attempt - 1, 1) if node == "escalate" else attempt)
+
+    def _record_route(self, route, attempt):
+        self.inc("support_ticket_routes", route=route)
+        self.observe("support_ticket_attempts", attempt, route=route)
+
+    def record_llm_call(self, node, role, prompt_tokens, completion_tokens, status="ok", tier="fast"):
+        """Record one LLM call and its prompt and completion tokens."""
+        node = node or "none"
+        self.inc("support_llm_calls", node=node, role=role, tier=tier, status=status)
+        if prompt_tokens:
+            self.inc("support_llm_prompt_tokens", prompt_tokens, node=node, role=role, tier=tier)
+        if completion_tokens:
+            self.inc("support_llm_completion_tokens", completion_tokens, node=node, role=role, tier=tier)
+
+    def _collect(self):
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                key = (name, _key(labels))
+                counters[key] = counters.get(key, 0) + value
+        return counters, histograms
+
+    def snapshot(self):
+        """Return every metric as JSON-serializable data."""
+        counters, histograms = self._collect()
+        data = {"counters": {}, "histograms": {}}
+        for (name, labels), value in sorted(counters.items()):
+            data["counters"].setdefault(f"{name}_total", []).append({"labels": dict(labels), "value": value})
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            buckets = {_number(bound): value for bound, value in _cumulative(METRICS[name].buckets, counts)}
+            data["histograms"].setdefault(name, []).append(
+                {"labels": dict(labels), "count": count, "sum": total, "buckets": buckets})
+        return data
+
+    def to_json(self, **kwargs):
+        """Return the snapshot as a JSON string."""
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def to_openmetrics(self):
+        """Render the registry in the OpenMetrics text exposition format."""
+        counters, histograms = self._collect()
+        lines = []
+        for name, metric in METRICS.items():
+            if metric.kind == "counter":
+                samples = sorted((labels, value) for (metric_name, labels), value in counters.items()
+                                 if metric_name == name)
+            else:
+                samples = sorted((labels, value) for (metric_name, labels), value in histograms.items()
+                                 if metric_name == name)
+            if not samples:
+                continue
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.append(f"# HELP {name} {metric.help}")
+            for labels, value in samples:
+                if metric.kind == "counter":
+                    lines.append(f"{name}_total{_labels_text(labels)} {_number(value)}")
+                    continue
+                counts, total, count = value
+                for bound, cumulative in _cumulative(metric.buckets, counts):
+                    le = "+Inf" if bound == math.inf else repr(float(bound))
+                    lines.append(f"{name}_bucket{_labels_text((*labels, ('le', le)))} {cumulative}")
+                lines.append(f"{name}_sum{_labels_text(labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels_text(labels)} {count}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def instrument_node(name, func, afunc=None):
+    """Wrap a graph node so each run is timed and recorded under ``name``."""
+
+    def run(state):
+        token = _current_node.set(name)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = func(state)
+            return result
+        finally:
+            _current_node.reset(token)
+            registry.record_node(name, time.perf_counter() - start, result, state)
+
+    if afunc is None:
+        return RunnableLambda(run, name=name)
+
+    async def arun(state):
+        token = _current_node.set(name)
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await afunc(state)
+            return result
+        finally:
+            _current_node.reset(token)
+            registry.record_node(name, time.perf_counter() - start, result, state)
+
+    return RunnableLambda(run, afunc=arun, name=name)
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """Count the tokens of every call made by a chat model and attribute them to the running node.
+
+    Uses the provider's reported usage when there is one, tiktoken otherwise.
+    """
+
+    run_inline = True
+
+    def __init__(self, role, tier="fast"):
+        """Attribute the calls of the ``role`` model of ``tier``."""
+        self.role = role
+        self.tier = tier
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        """Count the prompt tokens of a chat model call."""
+        tokens = sum(count_tokens(message.content) for batch in messages for message in batch
+                     if isinstance(message.content, str))
+        with self._lock:
+            self._runs[run_id] = (current_node(), tokens)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        """Count the prompt tokens of an LLM call."""
+        with self._lock:
+            self._runs[run_id] = (current_node(), sum(count_tokens(prompt) for prompt in prompts))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        """Record a finished call with its reported or counted tokens."""
+        with self._lock:
+            node, prompt_tokens = self._runs.pop(run_id, (current_node(), 0))
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if "completion_tokens" in usage:
+            completion_tokens = usage["completion_tokens"]
+        else:
+            completion_tokens = sum(count_tokens(g.text) for generations in response.generations for g in generations)
+        registry.record_llm_call(node, self.role, usage.get("prompt_tokens", prompt_tokens), completion_tokens,
+                                 tier=self.tier)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        """Record a failed call, or an aborted stream with the tokens it produced."""
+        with self._lock:
+            node, prompt_tokens = self._runs.pop(run_id, (current_node(), 0))
+        if isinstance(error, GeneratorExit):
+            # A stream closed by its consumer, e.g. a draft stopped early; count what was generated
+            response = kwargs.get("response")
+            completion_tokens = sum(count_tokens(g.text) for generations in response.generations
+                                    for g in generations if g.text) if response else 0
+            registry.record_llm_call(node, self.role, prompt_tokens, completion_tokens, status="aborted",
+                                     tier=self.tier)
+            return
+        registry.record_llm_call(node, self.role, prompt_tokens, 0, status="error", tier=self.tier)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            body, content_type = registry.to_openmetrics(), OPENMETRICS_CONTENT_TYPE
+        elif path == "/metrics.json":
+            body, content_type = registry.to_json(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Don't write a line to stderr for every scrape
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serve ``/metrics`` and ``/metrics.json`` from a daemon thread; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
+
+
+@cache
+def get_metrics_server():
+    """Start the process-wide metrics endpoint on METRICS_PORT, or return None when it isn't set."""
+    if METRICS_PORT is None:
+        return None
+    return start_metrics_server(METRICS_PORT, METRICS_HOST)
@@ -1,8 +1,47 @@
 # agent/nodes/classifier.py
-from langchain.chat_models import ChatOpenAI
-from agent.config import OPENROUTER_API_KEY
-
-def classify_ticket(state):
+"""Classify node: assign a ticket its knowledge base category."""
+import asyncio
+import threading
+
+import numpy as np
+
+from agent.config import (
+    CLASSIFIER_STRONG_MARGIN,
+    FAST_CLASSIFIER_ENABLED,
+    FAST_CLASSIFIER_MARGIN,
+)
+from agent.embeddings import get_embedding
+from agent.llm import get_llm, model_tier, ticket_deadline
+from agent.nodes.retriever import embed_query, get_vector_store
+from agent.prompt_cache import apredict, predict
+
+# Small labeled set that complements the knowledge base documents when building
+# the category centroids used by the local fast path.
+LABELED_TICKETS = {
+    "billing": [
+        "Double charged for subscription. I was billed twice this month for the same service.",
+        "My payment failed and I need to update my credit card.",
+        "Can I get a refund for the unused months of my annual plan?",
+    ],
+    "technical": [
+        "App keeps crashing on startup. Every time I open the mobile app, it immediately closes.",
+        "Sync is stuck and the dashboard shows an error message.",
+        "The API returns errors after updating to the latest version.",
+    ],
+    "security": [
+        "Can't log into my account. I keep getting 'invalid credentials' when accessing my dashboard.",
+        "I received a 2FA code I didn't request, is my account compromised?",
+        "My account is locked after too many password attempts.",
+    ],
+    "general": [
+        "How do I change my email address? I want to update my contact information in my profile.",
+        "What are your support hours and how can I contact you?",
+        "Do you have tutorials for getting started with a new team account?",
+    ],
+}
+
+def build_prompt(state):
+    """Build the LLM classification prompt for a ticket."""
     system_prompt = """You are an expert support ticket classifier with deep knowledge of customer service operations. Your role is to accurately categorize incoming support tickets based on their content and intent.
 
 ## CLASSIFICATION CATEGORIES:
@@ -55,12 +94,79 @@ Category:"""
         subject=state['subject'],
         description=state['description']
     )
-    
-    llm = ChatOpenAI(openai_api_base="https://openrouter.ai/api/v1",
-                     openai_api_key=OPENROUTER_API_KEY,
-                     model_name="openai/gpt-3.5-turbo")
-    response = llm.predict(prompt)
-    category = response.lower().strip()
-    
-    
-    return {**state, "category": category, "attempt": 1}
\ No newline at end of file
+    return prompt
+
+_centroids = None
+_centroids_lock = threading.Lock()
+
+def get_category_centroids():
+    """Return the normalized mean embedding per category, from the indexed documents plus LABELED_TICKETS."""
+    global _centroids
+    store = get_vector_store()
+    with _centroids_lock:
+        # Recompute whenever the vector store has been reloaded
+        if _centroids is None or _centroids[0] is not store:
+            vectors = store.index.reconstruct_n(0, store.index.ntotal)
+            labels = [store.docstore.search(store.index_to_docstore_id[i]).metadata["category"]
+                      for i in range(store.index.ntotal)]
+            examples = [(cat, text) for cat, texts in LABELED_TICKETS.items() for text in texts]
+            example_vectors = get_embedding().embed_documents([text for _, text in examples])
+            vectors = np.vstack([vectors, np.asarray(example_vectors, dtype=np.float32)])
+            labels = np.array(labels + [cat for cat, _ in examples])
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+            categories = sorted(set(labels))
+            matrix = np.vstack([vectors[labels == cat].mean(axis=0) for cat in categories])
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+            _centroids = (store, categories, matrix)
+        return _centroids[1], _centroids[2]
+
+def classify_locally(state):
+    """Nearest-centroid classification; returns (category, margin between the top two categories)."""
+    categories, matrix = get_category_centroids()
+    # Same query text as the retriever, so its embedding cache serves the retrieve node too
+    vector = np.asarray(embed_query(f"{state['subject']} {state['description']}"), dtype=np.float32)
+    scores = matrix @ (vector / np.linalg.norm(vector))
+    top, runner_up = np.argsort(scores)[::-1][:2]
+    return categories[top], float(scores[top] - scores[runner_up])
+
+def _fast_path(state):
+    """Return the local (category, margin), or (None, None) when the fast path is disabled."""
+    if not FAST_CLASSIFIER_ENABLED:
+        return None, None
+    return classify_locally(state)
+
+def _classification(state, category, path, margin):
+    # Only the classifier's own keys: it may run in parallel with the prefetch branch
+    result = {"category": category.lower().strip(), "attempt": 1, "classification_path": path}
+    if margin is not None:
+        result["classification_margin"] = margin
+    # The ticket's latency budget starts with classification unless the caller set a deadline
+    deadline = state.get("deadline") or ticket_deadline()
+    if deadline is not None:
+        result["deadline"] = deadline
+    return result
+
+def _llm_tier(state, margin):
+    # Tickets the local classifier can barely separate go to the strong model
+    return model_tier(state, margin is not None and margin < CLASSIFIER_STRONG_MARGIN)
+
+def classify_ticket(state):
+    """Classify locally when the margin is clear, otherwise ask the LLM."""
+    category, margin = _fast_path(state)
+    if category is not None and margin >= FAST_CLASSIFIER_MARGIN:
+        return _classification(state, category, "local", margin)
+
+    tier = _llm_tier(state, margin)
+    response = predict(get_llm("classifier", tier), build_prompt(state), "classifier", tier)
+    return _classification(state, response, "llm", margin)
+
+async def aclassify_ticket(state):
+    """Async variant of :func:`classify_ticket`."""
+    category, margin = await asyncio.to_thread(_fast_path, state)
+    if category is not None and margin >= FAST_CLASSIFIER_MARGIN:
+        return _classification(state, category, "local", margin)
+
+    tier = _llm_tier(state, margin)
+    response = await apredict(get_llm("classifier", tier), build_prompt(state), "classifier", tier)
+    return _classification(state, response, "llm", margin)
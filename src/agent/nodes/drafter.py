@@ -1,114 +1,146 @@
 # agent/nodes/drafter.py
-from langchain.chat_models import ChatOpenAI
-from agent.config import OPENROUTER_API_KEY
-
-def generate_draft(state):
-    # Check if this is a retry attempt
-    current_attempt = state.get("attempt", 1)
-    
-    if current_attempt == 1:
-        # First attempt - generate initial response
-        system_prompt = """You are an expert customer support agent. Your job is to provide helpful, specific, and actionable responses to customer tickets.
+"""Draft node: write a response to the ticket from the retrieved context."""
+from agent.config import (
+    DRAFT_STREAM_CHECK_CHARS,
+    DRAFT_STREAMING,
+    DRAFTER_CONTEXT_TOKENS,
+    PRE_REVIEW_ENABLED,
+    PROMPT_FIELD_TOKENS,
+)
+from agent.llm import get_llm, model_tier
+from agent.metrics import registry
+from agent.prompt_cache import apredict, predict
+from agent.prompts import clip, format_context
+from agent.review_rules import check_partial_draft
+
+# Identical for every ticket and attempt, so it forms a cacheable prompt prefix;
+# everything ticket-specific follows it
+INSTRUCTIONS = """You are an expert customer support agent. Your job is to provide helpful, specific, and actionable responses to customer tickets.
 
 ## RESPONSE REQUIREMENTS:
 
 ### 1. ALWAYS provide specific, actionable help:
 - Give step-by-step instructions when possible
-- Include relevant context from the knowledge base
+- Use the relevant knowledge base context
 - Be professional and empathetic
 - Address the specific issue mentioned
 
 ### 2. For vague or unclear tickets:
-- Politely ask for more specific information
-- Provide general guidance based on the category
-- Suggest common solutions for that ticket type
-- Ask clarifying questions to better assist
+- Provide general guidance and common solutions for the category
+- Politely ask clarifying questions
 
 ### 3. Response structure:
 - Acknowledge the issue
 - Provide specific help or ask for clarification
-- Include relevant context from knowledge base
 - End with next steps or offer further assistance
 
 ### 4. Quality standards:
 - Minimum 50 words for substantive responses
 - No generic acknowledgments
-- Must be helpful and actionable
 - Professional customer service tone
 
-## TICKET CONTEXT:
-Category: {category}
-Knowledge Base Context: {context}
-
-## CUSTOMER TICKET:
-Subject: {subject}
-Description: {description}
-
-## YOUR RESPONSE:"""
-    else:
+### 5. Retries:
+- When reviewer feedback on a previous attempt is given, address ALL issues it mentions
+- Fix any compliance or safety issues and be more specific than the previous attempt
+"""
+
+def build_prompt(state):
+    """Build the drafting prompt, static instructions first so they form a cacheable prefix."""
+    sections = [
+        INSTRUCTIONS,
+        f"## KNOWLEDGE BASE CONTEXT:\n{format_context(state.get('context') or [], DRAFTER_CONTEXT_TOKENS)}\n",
+        "## CUSTOMER TICKET:\n"
+        f"Category: {state['category']}\n"
+        f"Subject: {clip(state['subject'], PROMPT_FIELD_TOKENS)}\n"
+        f"Description: {clip(state['description'], PROMPT_FIELD_TOKENS)}\n",
+    ]
+    if state.get("attempt", 1) > 1:
         # Retry attempt - use reviewer feedback to improve
-        system_prompt = """You are an expert customer support agent. This is a RETRY attempt to improve a previously rejected response.
-
-## PREVIOUS ATTEMPT FEEDBACK:
-{review_feedback}
-
-## IMPROVEMENT REQUIREMENTS:
-- Address ALL issues mentioned in the reviewer feedback
-- Ensure the response meets quality standards
-- Be more specific and helpful than the previous attempt
-- Fix any compliance or safety issues identified
-
-## RESPONSE REQUIREMENTS:
-
-### 1. ALWAYS provide specific, actionable help:
-- Give step-by-step instructions when possible
-- Include relevant context from the knowledge base
-- Be professional and empathetic
-- Address the specific issue mentioned
-
-### 2. Response structure:
-- Acknowledge the issue
-- Provide specific help or ask for clarification
-- Include relevant context from knowledge base
-- End with next steps or offer further assistance
-
-### 3. Quality standards:
-- Minimum 50 words for substantive responses
-- No generic acknowledgments
-- Must be helpful and actionable
-- Professional customer service tone
-
-## TICKET CONTEXT:
-Category: {category}
-Knowledge Base Context: {context}
-
-## CUSTOMER TICKET:
-Subject: {subject}
-Description: {description}
-
-## YOUR IMPROVED RESPONSE:"""
-
-    # Format the prompt based on attempt number
-    if current_attempt == 1:
-        prompt = system_prompt.format(
-            category=state['category'],
-            context=state['context'],
-            subject=state['subject'],
-            description=state['description']
-        )
+        feedback = state.get("review_feedback") or "No specific feedback provided"
+        sections.append(f"## PREVIOUS ATTEMPT FEEDBACK:\n{clip(feedback, PROMPT_FIELD_TOKENS)}\n")
+        sections.append("## YOUR IMPROVED RESPONSE:")
     else:
-        prompt = system_prompt.format(
-            review_feedback=state.get('review_feedback', 'No specific feedback provided'),
-            category=state['category'],
-            context=state['context'],
-            subject=state['subject'],
-            description=state['description']
-        )
-    
-    llm = ChatOpenAI(openai_api_base="https://openrouter.ai/api/v1",
-                     openai_api_key=OPENROUTER_API_KEY,
-                     model_name="openai/gpt-3.5-turbo")
-    draft = llm.predict(prompt)
-    
-    # Increment attempt counter for next iteration
-    return {**state, "draft": draft, "attempt": current_attempt}
\ No newline at end of file
+        sections.append("## YOUR RESPONSE:")
+    return "\n".join(sections)
+
+def _seeded(state):
+    # A semantic cache hit in "seed" mode already supplies the first draft
+    return state.get("cache_hit") and state.get("attempt", 1) == 1 and state.get("draft")
+
+def _tier(state):
+    # First drafts use the fast model; retries after a rejection escalate to the strong one
+    return model_tier(state, state.get("attempt", 1) > 1)
+
+class _PartialDraft:
+    """Accumulates streamed draft tokens and runs the partial-draft rules every ``DRAFT_STREAM_CHECK_CHARS``."""
+
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+        self.checked = 0
+
+    def add(self, token):
+        """Append a token; return True when the draft so far already breaks a hard rule."""
+        self.parts.append(token)
+        self.size += len(token)
+        if not PRE_REVIEW_ENABLED or self.size - self.checked < DRAFT_STREAM_CHECK_CHARS:
+            return False
+        self.checked = self.size
+        violations = check_partial_draft(self.text)
+        if violations:
+            registry.inc("support_draft_aborts", rule=violations[0].rule)
+        return bool(violations)
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+def _stream_draft(llm, prompt):
+    """Stream the draft, closing the stream (and the generation) once it breaks a hard rule.
+
+    Returns ``(draft, aborted)``; an aborted draft is cut off where the violation was found.
+    """
+    draft = _PartialDraft()
+    stream = llm.stream(prompt)
+    try:
+        for chunk in stream:
+            if draft.add(chunk.content):
+                return draft.text, True
+    finally:
+        stream.close()
+    return draft.text, False
+
+async def _astream_draft(llm, prompt):
+    draft = _PartialDraft()
+    stream = llm.astream(prompt)
+    try:
+        async for chunk in stream:
+            if draft.add(chunk.content):
+                return draft.text, True
+    finally:
+        await stream.aclose()
+    return draft.text, False
+
+def _drafted(state, draft, aborted=False):
+    # draft_aborted tells the reviewer the draft is cut off, so only the partial-draft rules apply
+    return {"draft": draft, "draft_aborted": aborted, "attempt": state.get("attempt", 1)}
+
+def generate_draft(state):
+    """Draft a response, unless the semantic cache already seeded one."""
+    if _seeded(state):
+        return {}
+    tier = _tier(state)
+    llm = get_llm("drafter", tier)
+    if DRAFT_STREAMING:
+        return _drafted(state, *_stream_draft(llm, build_prompt(state)))
+    return _drafted(state, predict(llm, build_prompt(state), "drafter", tier))
+
+async def agenerate_draft(state):
+    """Async variant of :func:`generate_draft`."""
+    if _seeded(state):
+        return {}
+    tier = _tier(state)
+    llm = get_llm("drafter", tier)
+    if DRAFT_STREAMING:
+        return _drafted(state, *await _astream_draft(llm, build_prompt(state)))
+    return _drafted(state, await apredict(llm, build_prompt(state), "drafter", tier))
@@ -1,34 +1,44 @@
 # agent/nodes/escalation.py
-import csv
-from pathlib import Path
+"""Escalation node: hand a ticket with no approved draft to a human."""
+import asyncio
+import queue
 
-ESCALATION_FILE = Path("data/escalation_log.csv")
+from agent.escalation_sink import get_escalation_sink
 
-ESCALATION_FILE.parent.mkdir(parents=True, exist_ok=True)
-if not ESCALATION_FILE.exists():
-    with open(ESCALATION_FILE, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["Subject", "Description", "Draft", "Feedback", "Escalation_Reason"])
 
-def log_escalation(state):
-    # Determine escalation reason
-    current_attempt = state.get("attempt", 1)
+def _escalation(state):
+    # Determine escalation reason; the reviewer already advanced "attempt" past the last rejected draft
+    current_attempt = max(state.get("attempt", 1) - 1, 1)
     escalation_reason = f"Max attempts ({current_attempt}) reached without approval"
-    
-    # Log the escalation
-    with open(ESCALATION_FILE, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            state['subject'],
-            state['description'],
-            state.get('draft', 'N/A'),
-            state.get('review_feedback', 'N/A'),
-            escalation_reason
-        ])
-    
+
+    row = [
+        state['subject'],
+        state['description'],
+        state.get('draft', 'N/A'),
+        state.get('review_feedback', 'N/A'),
+        escalation_reason
+    ]
+
     # Update state to indicate escalation and provide final response
-    return {
-        **state, 
+    result = {
         "escalated": True,
         "final_response": f"Ticket requires human review. Escalated after {current_attempt} attempts. Reason: {escalation_reason}"
     }
+    return row, result
+
+def log_escalation(state):
+    """Queue the ticket for the escalation log and respond that it needs human review."""
+    row, result = _escalation(state)
+    # Queued for the background writer; only blocks if the sink's queue is full
+    get_escalation_sink().write(row)
+    return result
+
+async def alog_escalation(state):
+    """Async variant of :func:`log_escalation`; never blocks the event loop on a full queue."""
+    row, result = _escalation(state)
+    sink = get_escalation_sink()
+    try:
+        sink.write(row, block=False)
+    except queue.Full:
+        await asyncio.to_thread(sink.write, row)
+    return result
@@ -0,0 +1,42 @@
+# agent/nodes/response_cache.py
+"""Semantic response cache lookup, routing and storage for the graph."""
+import asyncio
+
+from langgraph.graph import END
+
+from agent.config import SEMANTIC_CACHE_MODE
+from agent.nodes.retriever import embed_query, get_kb_version
+from agent.semantic_cache import get_semantic_cache
+
+
+def _ticket_vector(state):
+    # Same query text as the retriever, so its embedding cache is shared
+    return embed_query(f"{state['subject']} {state['description']}")
+
+def check_response_cache(state):
+    """Look for an approved response to a near-duplicate ticket."""
+    entry = get_semantic_cache().lookup(_ticket_vector(state), get_kb_version())
+    if entry is None:
+        return {"cache_hit": False}
+
+    if SEMANTIC_CACHE_MODE == "seed":
+        # Hand the cached answer to the reviewer as the first draft
+        return {"cache_hit": True, "category": entry["category"], "draft": entry["response"], "attempt": 1}
+    return {"cache_hit": True, "category": entry["category"], "final_response": entry["response"]}
+
+async def acheck_response_cache(state):
+    """Async variant of :func:`check_response_cache`."""
+    return await asyncio.to_thread(check_response_cache, state)
+
+def route_after_cache(state):
+    """Route a miss to classification and a hit to the end, or to retrieval in "seed" mode."""
+    if not state.get("cache_hit"):
+        return "classify"
+    return "retrieve" if SEMANTIC_CACHE_MODE == "seed" else END
+
+def remember_response(state):
+    """Store a freshly approved response so near-duplicate tickets can reuse it."""
+    if state.get("cache_hit"):
+        return
+    get_semantic_cache().add(_ticket_vector(state), state["final_response"], get_kb_version(),
+                             category=state["category"], subject=state["subject"])
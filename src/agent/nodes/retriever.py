@@ -1,152 +1,319 @@
 # agent/nodes/retriever.py
-from langchain.vectorstores import FAISS
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.docstore.document import Document
-from agent.config import OPENROUTER_API_KEY
-import os
-
-embedding = HuggingFaceEmbeddings(model_name="thenlper/gte-large")
-
-# Expanded knowledge base with comprehensive documentation for the four original categories
-CATEGORY_DOCS = {
-    "billing": [
-        # Payment Processing
-        Document(page_content="Billing occurs monthly on the same date you first subscribed. Invoices are automatically sent via email 3 days before the charge date."),
-        Document(page_content="We accept Visa, MasterCard, American Express, and PayPal for payments. Cryptocurrency payments are available for enterprise accounts."),
-        Document(page_content="You can update your payment method under Account Settings > Billing. Changes take effect immediately for future charges."),
-        Document(page_content="Failed payments will automatically retry after 3 days, then 7 days, then 14 days before account suspension."),
-        Document(page_content="Payment failures result in email notifications to both primary and billing contact emails if different."),
-        
-        # Refunds and Credits
-        Document(page_content="Refunds can only be issued with supervisor approval within 30 days of payment. Partial refunds are available for unused service time."),
-        Document(page_content="Service credits are automatically applied for documented downtime exceeding 99.5% uptime SLA commitment."),
-        Document(page_content="Pro-rated refunds are available when downgrading plans mid-cycle. The difference is credited to your account."),
-        Document(page_content="Subscription cancellation takes effect at the end of the current billing period. No partial refunds for cancellations."),
-        
-        # Pricing and Plans
-        Document(page_content="Discount codes must be applied before checkout is completed. Codes cannot be applied retroactively to existing subscriptions."),
-        Document(page_content="Student discounts of 50% are available with valid .edu email verification. Academic institution bulk pricing available."),
-        Document(page_content="Annual subscriptions receive 2 months free compared to monthly billing. Enterprise plans include custom pricing."),
-        Document(page_content="Plan upgrades are immediate with pro-rated billing. Downgrades take effect at the next billing cycle."),
-        
-        # Account Management
-        Document(page_content="Billing statements can be downloaded as PDF from your account dashboard. Statements include detailed usage metrics."),
-        Document(page_content="Tax invoices are generated automatically for business accounts. VAT/GST calculations are applied based on billing address."),
-        Document(page_content="Account managers are assigned to enterprise customers for billing support. Quarterly business reviews included in enterprise plans."),
-        Document(page_content="Self-service billing options include payment method updates, invoice downloads, and subscription plan changes through the dashboard.")
-    ],
-    
-    "technical": [
-        # Application Issues
-        Document(page_content="For technical issues, first try clearing your app cache or reinstalling the application. This resolves 80% of reported issues."),
-        Document(page_content="Version 2.1.0 fixed most known bugs from 2.0, including memory leaks and sync failures. Always update to the latest version."),
-        Document(page_content="Mobile login failures are often resolved by updating the app, clearing cache, or checking device date/time settings."),
-        Document(page_content="If the system crashes, check the log file in your install directory at /logs/error.log for specific error messages."),
-        Document(page_content="Database sync issues can be resolved by going to Settings > Sync > Force Sync. This may take 5-10 minutes for large datasets."),
-        
-        # Platform Compatibility
-        Document(page_content="Some features like bulk export and advanced analytics are only available on the desktop version of the app."),
-        Document(page_content="Minimum system requirements: Windows 10, macOS 10.14, or Linux Ubuntu 18.04+. 4GB RAM and 2GB storage required."),
-        Document(page_content="Browser compatibility: Chrome 90+, Firefox 88+, Safari 14+, Edge 90+. Internet Explorer is not supported."),
-        Document(page_content="Mobile apps require iOS 13+ or Android 8.0+. Tablet optimization available for iPad and Android tablets 10+ inches."),
-        
-        # Performance and Optimization
-        Document(page_content="Slow performance is often caused by large file attachments. Consider using cloud storage links instead of direct uploads."),
-        Document(page_content="API rate limits are 1000 requests per hour for standard accounts, 5000 for premium accounts. Enterprise has custom limits."),
-        Document(page_content="Offline mode stores up to 30 days of data locally. Sync automatically resumes when internet connection is restored."),
-        Document(page_content="Network connectivity issues can be diagnosed using the built-in connection test in Settings > Diagnostics > Network Test."),
-        
-        # Integration Support
-        Document(page_content="Third-party integrations support Zapier, Microsoft Power Automate, and direct API connections. Webhooks available for real-time updates."),
-        Document(page_content="SSO integration supports SAML 2.0, OAuth 2.0, and LDAP. Azure AD and Google Workspace are pre-configured options."),
-        Document(page_content="Data export formats include CSV, JSON, XML, and PDF. Bulk exports are processed within 24 hours and sent via email link."),
-        Document(page_content="Backup and restore functionality available in Settings > Data Management. Automated backups run daily for premium accounts.")
-    ],
-    
-    "security": [
-        # Authentication and Access
-        Document(page_content="Security protocols include mandatory 2FA and AES-256 encryption-at-rest for all user data. TLS 1.3 for data in transit."),
-        Document(page_content="Do not share login credentials or recovery tokens with anyone. Each user should have their own account for audit trail purposes."),
-        Document(page_content="All admin access is logged and reviewed weekly. Failed login attempts trigger automatic security alerts after 5 attempts."),
-        Document(page_content="Session timeout is 8 hours for regular users, 4 hours for admin accounts. Sessions can be extended but require re-authentication."),
-        Document(page_content="Account lockout occurs after 10 failed login attempts. Unlocking requires email verification or admin override."),
-        
-        # Data Protection and Compliance
-        Document(page_content="We comply with GDPR, CCPA, and SOC 2 Type II standards. Annual security audits performed by third-party firms."),
-        Document(page_content="Data retention policy: Active data indefinitely, deleted data purged after 90 days. Legal hold overrides standard retention."),
-        Document(page_content="Personal data requests (access, deletion, portability) are processed within 30 days as required by privacy regulations."),
-        Document(page_content="Data centers are ISO 27001 certified with 24/7 physical security, biometric access, and redundant power/cooling systems."),
-        
-        # Account Security
-        Document(page_content="Security questions can be reset via the verified email address. Backup codes are provided for accounts with 2FA enabled."),
-        Document(page_content="Password requirements: minimum 12 characters with uppercase, lowercase, numbers, and symbols. Dictionary words prohibited."),
-        Document(page_content="Suspicious activity monitoring includes login location tracking, device fingerprinting, and behavioral analysis."),
-        Document(page_content="Security incidents are reported to affected users within 72 hours. Incident response team available 24/7 for critical issues."),
-        
-        # Security Features
-        Document(page_content="Bug bounty program rewards security researchers for responsible disclosure. Rewards range from $100 to $10,000."),
-        Document(page_content="Regular penetration testing is performed quarterly. Vulnerability assessments include both automated and manual testing."),
-        Document(page_content="IP whitelisting available for enterprise accounts. VPN access can be configured for secure remote connections."),
-        Document(page_content="Audit logs are available for all user actions and can be exported for compliance purposes. Logs retained for 7 years.")
-    ],
-    
-    "general": [
-        # Support Information
-        Document(page_content="We are always happy to help with account issues, preferences, feedback, or any questions about our service."),
-        Document(page_content="Support hours are Monday–Friday, 9 AM to 6 PM PST. Emergency support available 24/7 for enterprise customers."),
-        Document(page_content="Use our in-app chat to reach a support agent instantly during business hours. Average response time is under 2 minutes."),
-        Document(page_content="You can access comprehensive tutorials and guides in the Help Center at help.ourcompany.com with video walkthroughs."),
-        Document(page_content="Email support available at support@ourcompany.com with 24-hour response time guarantee for all inquiries."),
-        
-        # Team and Training
-        Document(page_content="Our support team is trained to handle both product and account queries. Level 2 technical specialists available for complex issues."),
-        Document(page_content="All support agents receive monthly training on new features and common issues. Customer satisfaction ratings averaged 4.8/5 last quarter."),
-        Document(page_content="Escalation to product managers available for feature requests. Development roadmap is updated quarterly based on user feedback."),
-        
-        # Resources and Self-Help
-        Document(page_content="Video tutorials cover basic setup, advanced features, and troubleshooting. New user onboarding includes guided product tours."),
-        Document(page_content="Community forum allows users to share tips and solutions. Most active community members receive special recognition badges."),
-        Document(page_content="Knowledge base includes searchable articles, FAQ sections, and step-by-step guides with screenshots for visual learners."),
-        Document(page_content="Status page at status.ourcompany.com provides real-time service health updates and scheduled maintenance notifications."),
-        
-        # Communication Channels
-        Document(page_content="Phone support available for premium customers at 1-800-SUPPORT. International toll-free numbers available in 12 countries."),
-        Document(page_content="Social media support on Twitter @OurCompanyHelp and Facebook. Public issues are addressed within 4 hours during business days."),
-        Document(page_content="Live webinars hosted monthly covering new features and best practices. Recordings available in the Help Center."),
-        Document(page_content="User feedback is collected through in-app surveys, support interactions, and quarterly user research studies."),
-        
-        # Account and Profile Management  
-        Document(page_content="Account profile can be updated in User Settings including name, email, phone, and profile picture. Changes sync across all devices."),
-        Document(page_content="Team accounts support role-based permissions: Owner, Admin, Member, and Viewer. Custom roles available for enterprise plans."),
-        Document(page_content="Data export includes all user-generated content, settings, and activity logs. Export processing takes 1-3 business days."),
-        Document(page_content="Language settings support 15 languages including English, Spanish, French, German, Japanese, and Mandarin Chinese.")
-    ]
-}
-
-# Create FAISS databases for each category
-FAISS_DB = {
-    cat: FAISS.from_documents(docs, embedding)
-    for cat, docs in CATEGORY_DOCS.items()
-}
+"""Retrieve node: knowledge base context for a ticket from dense (FAISS) and lexical (BM25) search."""
+import asyncio
+import logging
+import threading
+import weakref
+from concurrent.futures import Future
+from functools import cache
+
+import numpy as np
+
+from agent.cache import TTLCache
+from agent.config import (
+    BM25_B,
+    BM25_K1,
+    EMBEDDING_MODEL,
+    KNOWLEDGE_BASE_DIR,
+    KNOWLEDGE_BASE_POLL_INTERVAL,
+    RETRIEVAL_CACHE_SIZE,
+    RETRIEVAL_CACHE_TTL,
+    RETRIEVAL_FETCH_K,
+    RETRIEVAL_MODE,
+    RRF_K,
+)
+from agent.embeddings import get_embedding
+from agent.knowledge_base import KnowledgeBaseWatcher, load_knowledge_base
+from agent.lexical import BM25Index, reciprocal_rank_fusion
+from agent.metrics import registry
+from agent.vectorstore import documents_hash, load_or_build_index, tag_documents
+
+logger = logging.getLogger(__name__)
+
+# Documents the drafter gets from the ticket's category, plus extra general ones
+CONTEXT_K = 3
+GENERAL_CONTEXT_K = 1
+
+# Knowledge base articles, read from KNOWLEDGE_BASE_DIR on first use; replaced by reload_knowledge_base()
+_category_docs = None
+_category_docs_lock = threading.Lock()
+_vector_store = None
+_vector_store_lock = threading.Lock()
+# Held for a whole reload so only one index update runs at a time
+_reload_lock = threading.Lock()
+_kb_version = None
+_lexical_index = None
+
+# Incidents produce bursts of near-identical tickets, so cache both the query
+# vectors and the selected context. Both are cleared whenever the index is reloaded.
+_embedding_cache = TTLCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL)
+_context_cache = TTLCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL)
+# Query embeddings being computed right now, so concurrent callers (the classifier
+# and the prefetch branch of the same ticket) wait for one encoder pass
+_pending_embeddings = {}
+_pending_embeddings_lock = threading.Lock()
+
+def get_category_docs():
+    """Return the knowledge base documents by category, reading KNOWLEDGE_BASE_DIR on first use."""
+    global _category_docs
+    if _category_docs is None:
+        with _category_docs_lock:
+            if _category_docs is None:
+                category_docs = load_knowledge_base(KNOWLEDGE_BASE_DIR)
+                if not category_docs:
+                    # The articles aren't package data, so an installed package needs to be pointed at them
+                    raise ValueError(f"No knowledge base articles found in {KNOWLEDGE_BASE_DIR}; "
+                                     "set KNOWLEDGE_BASE_DIR to the directory holding them")
+                _category_docs = category_docs
+    return _category_docs
+
+def get_vector_store():
+    """Return the combined FAISS store for all categories, loading the persisted artifact on first use."""
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = load_or_build_index(get_category_docs(), get_embedding())
+    return _vector_store
+
+def get_lexical_index():
+    """Return the BM25 index over the knowledge base, building it on first use."""
+    global _lexical_index
+    if _lexical_index is None:
+        with _vector_store_lock:
+            if _lexical_index is None:
+                _lexical_index = BM25Index(tag_documents(get_category_docs()), k1=BM25_K1, b=BM25_B)
+    return _lexical_index
+
+def reload_vector_store():
+    """Reload (rebuilding if stale) the index artifact and invalidate the retrieval caches."""
+    global _vector_store, _kb_version, _lexical_index
+    with _vector_store_lock:
+        _vector_store = load_or_build_index(get_category_docs(), get_embedding())
+        _kb_version = None
+        _lexical_index = None
+        _embedding_cache.clear()
+        _context_cache.clear()
+    return _vector_store
+
+def reload_knowledge_base(directory=None):
+    """Re-read the knowledge base articles, update the index incrementally and hot-swap it in.
+
+    The update runs while retrievals keep using the current index; the swap is a
+    reference assignment, so in-flight calls finish on the store they started with.
+    """
+    global _category_docs, _vector_store, _kb_version, _lexical_index
+    with _reload_lock:
+        category_docs = load_knowledge_base(directory or KNOWLEDGE_BASE_DIR)
+        store = load_or_build_index(category_docs, get_embedding())
+        lexical_index = BM25Index(tag_documents(category_docs), k1=BM25_K1, b=BM25_B)
+        kb_version = documents_hash(category_docs, EMBEDDING_MODEL)
+        with _vector_store_lock:
+            _category_docs, _vector_store, _lexical_index, _kb_version = (
+                category_docs, store, lexical_index, kb_version)
+        # Context cache keys carry the version, so this only frees memory
+        _context_cache.clear()
+    logger.info("Knowledge base reloaded: %d documents, version %s", store.index.ntotal, kb_version[:12])
+    return store
+
+@cache
+def get_knowledge_base_watcher():
+    """Start polling KNOWLEDGE_BASE_DIR for edits, or return None when KNOWLEDGE_BASE_POLL_INTERVAL isn't set."""
+    if KNOWLEDGE_BASE_POLL_INTERVAL <= 0:
+        return None
+    return KnowledgeBaseWatcher(KNOWLEDGE_BASE_DIR, KNOWLEDGE_BASE_POLL_INTERVAL, reload_knowledge_base)
+
+def get_kb_version():
+    """Return the content hash identifying the knowledge base and embedding model in use."""
+    global _kb_version
+    if _kb_version is None:
+        _kb_version = documents_hash(get_category_docs(), EMBEDDING_MODEL)
+    return _kb_version
+
+def retrieval_cache_stats():
+    """Return the hit/miss counters of the query embedding and context caches."""
+    return {"embedding": _embedding_cache.stats(), "context": _context_cache.stats()}
+
+def _cache_metrics():
+    for name, stats in retrieval_cache_stats().items():
+        yield "support_cache_requests", {"cache": name, "result": "hit"}, stats["hits"]
+        yield "support_cache_requests", {"cache": name, "result": "miss"}, stats["misses"]
+
+registry.add_collector(_cache_metrics)
+
+def normalize_query(text):
+    """Lowercase a query and collapse its whitespace, the key of the retrieval caches."""
+    return " ".join(text.lower().split())
+
+def embed_query(query):
+    """Embed a ticket query, reusing the vector of an identical recent query."""
+    key = normalize_query(query)
+    vector = _embedding_cache.get(key)
+    if vector is not None:
+        return vector
+
+    with _pending_embeddings_lock:
+        pending = _pending_embeddings.get(key)
+        if pending is None:
+            pending = _pending_embeddings[key] = Future()
+            leader = True
+        else:
+            leader = False
+    if not leader:
+        return pending.result()
+
+    try:
+        vector = get_embedding().embed_query(query)
+        _embedding_cache.set(key, vector)
+        pending.set_result(vector)
+        return vector
+    except BaseException as exc:
+        pending.set_exception(exc)
+        raise
+    finally:
+        with _pending_embeddings_lock:
+            del _pending_embeddings[key]
+
+# Index positions of each category's documents, per loaded store
+_category_positions = weakref.WeakKeyDictionary()
+
+def category_positions(store):
+    """Return the index positions of the documents of each category in ``store``."""
+    positions = _category_positions.get(store)
+    if positions is None:
+        grouped = {}
+        for position, doc_id in store.index_to_docstore_id.items():
+            grouped.setdefault(store.docstore.search(doc_id).metadata["category"], []).append(position)
+        positions = _category_positions[store] = {
+            category: np.asarray(ids, dtype=np.int64) for category, ids in grouped.items()}
+    return positions
+
+def dense_ranking(vector, fetch_k=RETRIEVAL_FETCH_K, category=None):
+    """(category, text) of the ``fetch_k`` documents nearest to a query vector, best first.
+
+    With ``category`` only that category's documents are compared, so a small
+    category isn't crowded out of the fetched hits by the others.
+    """
+    store = get_vector_store()
+    query = np.asarray([vector], dtype=np.float32)
+    if category is None:
+        _, found = store.index.search(query, min(fetch_k, store.index.ntotal))
+        found = [int(i) for i in found[0] if i >= 0]
+    else:
+        # Decoded vectors score the same as the index's own search, for every index type
+        positions = category_positions(store).get(category, np.empty(0, dtype=np.int64))
+        distances = ((store.index.reconstruct_batch(positions) - query) ** 2).sum(axis=1)
+        found = positions[np.argsort(distances, kind="stable")[:fetch_k]].tolist()
+    docs = [store.docstore.search(store.index_to_docstore_id[i]) for i in found]
+    return [(doc.metadata["category"], doc.page_content) for doc in docs]
+
+def lexical_ranking(query, matched_only=True, fetch_k=RETRIEVAL_FETCH_K, category=None):
+    """(category, text) of the top ``fetch_k`` documents by BM25 score.
+
+    Only documents sharing a term with the query unless ``matched_only=False``,
+    and only ``category``'s documents when it is given.
+    """
+    index = get_lexical_index()
+    docs = index.documents
+    ranked = (docs[i] for i in index.rank(query, matched_only))
+    if category is not None:
+        ranked = (doc for doc in ranked if doc.metadata["category"] == category)
+    return [(doc.metadata["category"], doc.page_content) for _, doc in zip(range(fetch_k), ranked)]
+
+def rank_documents(query, mode=None, category=None, fetch_k=RETRIEVAL_FETCH_K):
+    """Return the best ``fetch_k`` knowledge base documents (optionally of one category) for a ticket query."""
+    mode = mode or RETRIEVAL_MODE
+    if mode == "lexical":
+        # Degraded mode: no embedding, unmatched documents keep knowledge base order
+        return lexical_ranking(query, matched_only=False, fetch_k=fetch_k, category=category)
+    dense = dense_ranking(embed_query(query), fetch_k, category)
+    if mode == "dense":
+        return dense
+    fused = reciprocal_rank_fusion([dense, lexical_ranking(query, fetch_k=fetch_k, category=category)], k=RRF_K)
+    return fused[:fetch_k]
+
+def group_by_category(ranked, per_category=CONTEXT_K):
+    """Return the best ``per_category`` texts of each category in a ranking."""
+    by_category = {}
+    for category, text in ranked:
+        hits = by_category.setdefault(category, [])
+        if len(hits) < per_category:
+            hits.append(text)
+    return by_category
+
+def search_categories(vector, fetch_k=RETRIEVAL_FETCH_K):
+    """Rank the knowledge base against a query vector once and group the hits by category."""
+    return group_by_category(dense_ranking(vector, fetch_k))
+
+def _context_category(category):
+    # Fallback to general if category not found
+    return category if category in get_category_docs() else "general"
+
+def select_context(by_category, category, k=CONTEXT_K, general_k=GENERAL_CONTEXT_K):
+    """Pick the top documents for the category plus extra general context."""
+    category = _context_category(category)
+    context_docs = list(by_category.get(category, [])[:k])
+
+    # Also add general category context if not already general
+    if category != "general":
+        context_docs.extend(by_category.get("general", [])[:general_k])
+    return context_docs
+
+def complete_context(by_category, query, category):
+    """Top up ``by_category`` for a ticket of ``category`` with searches restricted to it.
+
+    The shared ranking is bounded, so a category with few or poorly matching
+    documents can fall short of the context a search of that category would give.
+    """
+    category = _context_category(category)
+    wanted = {category: CONTEXT_K, "general": GENERAL_CONTEXT_K}
+    short = [name for name, k in wanted.items()
+             if len(by_category.get(name, [])) < min(k, len(get_category_docs().get(name, [])))]
+    if not short:
+        return by_category
+    by_category = dict(by_category)
+    for name in short:
+        by_category[name] = [text for _, text in rank_documents(query, category=name, fetch_k=wanted[name])]
+    return by_category
+
+def prefetch_context(state):
+    """Rank the knowledge base for every category before the ticket's category is known."""
+    query = f"{state['subject']} {state['description']}"
+    key = (normalize_query(query), None, get_kb_version())
+    by_category = _context_cache.get(key)
+    if by_category is None:
+        # Only the top hits of each category; retrieve searches the category itself if they fall short
+        by_category = group_by_category(rank_documents(query))
+        _context_cache.set(key, by_category)
+    # Only this branch's key: it runs in parallel with the classifier
+    return {"candidate_context": by_category}
+
+async def aprefetch_context(state):
+    """Async variant of :func:`prefetch_context`."""
+    return await asyncio.to_thread(prefetch_context, state)
 
 def retrieve_context(state):
-    """Retrieve relevant context documents based on ticket category and content"""
+    """Retrieve relevant context documents based on ticket category and content."""
     category = state["category"].lower()
     query = f"{state['subject']} {state['description']}"
-    
-    # Get retriever for the category, fallback to general if category not found
-    retriever = FAISS_DB.get(category, FAISS_DB["general"]).as_retriever(
-        search_type="similarity", 
-        k=3  # Increased from 2 to 3 for better context
-    )
-    
-    results = retriever.invoke(query)
-    context_docs = [doc.page_content for doc in results]
-    
-    # Also search general category for additional context if not already general
-    if category != "general":
-        general_retriever = FAISS_DB["general"].as_retriever(search_type="similarity", k=1)
-        general_results = general_retriever.invoke(query)
-        context_docs.extend([doc.page_content for doc in general_results])
-    
-    return {**state, "context": context_docs}
\ No newline at end of file
+
+    if state.get("candidate_context") is not None:
+        # Prefetched alongside classification; only the category selection is left. The other
+        # categories' hits are dropped so they don't ride along in every later checkpoint
+        by_category = complete_context(state["candidate_context"], query, category)
+        return {"context": select_context(by_category, category), "candidate_context": None}
+
+    key = (normalize_query(query), category, get_kb_version())
+    context_docs = _context_cache.get(key)
+    if context_docs is None:
+        # Rank once; the single ranking serves both the category and general context
+        by_category = complete_context(group_by_category(rank_documents(query)), query, category)
+        context_docs = select_context(by_category, category)
+        _context_cache.set(key, context_docs)
+
+    return {"context": list(context_docs)}
+
+async def aretrieve_context(state):
+    """Async variant of :func:`retrieve_context`."""
+    # Embedding, FAISS and BM25 scoring are CPU-bound; keep them off the event loop
+    return await asyncio.to_thread(retrieve_context, state)
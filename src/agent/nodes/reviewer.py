@@ -1,9 +1,17 @@
 # agent/nodes/reviewer.py
-from langchain.chat_models import ChatOpenAI
-from agent.config import OPENROUTER_API_KEY
+"""Review node: approve or reject a draft, checking the hard rules before the LLM."""
+import logging
 
-def review_draft(state):
-    system_prompt = """You are a STRICT quality assurance reviewer for a customer support team. Your job is to ensure ONLY high-quality, helpful, and compliant responses are approved.
+from agent.config import PRE_REVIEW_ENABLED, PROMPT_FIELD_TOKENS
+from agent.llm import get_llm
+from agent.prompt_cache import apredict, predict
+from agent.prompts import clip
+from agent.review_rules import check_draft, check_partial_draft, format_feedback
+
+logger = logging.getLogger(__name__)
+
+# Static rubric, sent as the cacheable prefix of every review prompt
+RUBRIC = """You are a STRICT quality assurance reviewer for a customer support team. Your job is to ensure ONLY high-quality, helpful, and compliant responses are approved.
 
 ## REVIEW CRITERIA - ALL MUST PASS:
 
@@ -63,27 +71,55 @@ APPROVED
 REJECTED
 [Detailed explanation of which specific criteria failed and why]
 ```
+"""
+
+def build_prompt(state):
+    """Build the review prompt, the static rubric first so it forms a cacheable prefix."""
+    return (
+        f"{RUBRIC}\n"
+        "## TICKET TO REVIEW:\n"
+        f"Subject: {clip(state['subject'], PROMPT_FIELD_TOKENS)}\n"
+        f"Description: {clip(state['description'], PROMPT_FIELD_TOKENS)}\n"
+        f"Category: {state['category']}\n"
+        f"Draft Response: {clip(state['draft'], PROMPT_FIELD_TOKENS)}\n\n"
+        "## YOUR REVIEW:"
+    )
 
-## TICKET TO REVIEW:
-Subject: {subject}
-Description: {description}
-Category: {category}
-Draft Response: {draft}
-
-## YOUR REVIEW:"""
+def _pre_review(state):
+    """Reject drafts that break a hard rule without spending an LLM call on them."""
+    if state.get("draft_aborted"):
+        # Streaming stopped the draft mid-sentence, so its length isn't held against it
+        violations = check_partial_draft(state["draft"])
+    elif PRE_REVIEW_ENABLED:
+        violations = check_draft(state["draft"])
+    else:
+        return None
+    if not violations:
+        return None
+    result = _review_result(state, format_feedback(violations))
+    return {**result, "review_violations": [v.rule for v in violations]}
 
-    prompt = system_prompt.format(
-        subject=state['subject'],
-        description=state['description'],
-        category=state['category'],
-        draft=state['draft']
-    )
-    
-    llm = ChatOpenAI(openai_api_base="https://openrouter.ai/api/v1",
-                     openai_api_key=OPENROUTER_API_KEY,
-                     model_name="openai/gpt-3.5-turbo")
-    feedback = llm.predict(prompt)
-    
+def review_draft(state):
+    """Review a draft: the hard rules first, then the LLM."""
+    result = _pre_review(state)
+    if result is not None:
+        return result
+
+    llm = get_llm("reviewer")
+    feedback = predict(llm, build_prompt(state), "reviewer")
+    return _review_result(state, feedback)
+
+async def areview_draft(state):
+    """Async variant of :func:`review_draft`."""
+    result = _pre_review(state)
+    if result is not None:
+        return result
+
+    llm = get_llm("reviewer")
+    feedback = await apredict(llm, build_prompt(state), "reviewer")
+    return _review_result(state, feedback)
+
+def _review_result(state, feedback):
     # More robust parsing of the response
     feedback_lower = feedback.lower().strip()
     
@@ -103,12 +139,12 @@ Draft Response: {draft}
             result = "rejected"
             feedback = f"REJECTED\nUnclear review response. Defaulting to rejected for safety.\n\nOriginal feedback: {feedback}"
     
-    print(f"Review Result: {result}")
-    print(f"Feedback: {feedback}")
+    logger.info("Review result: %s", result)
+    logger.debug("Review feedback: %s", feedback)
     
     # Increment attempt counter if rejected
     current_attempt = state.get("attempt", 1)
     if result == "rejected":
         current_attempt += 1
     
-    return {**state, "review_result": result, "review_feedback": feedback, "attempt": current_attempt}
\ No newline at end of file
+    return {"review_result": result, "review_feedback": feedback, "attempt": current_attempt, "review_violations": []}
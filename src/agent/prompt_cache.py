@@ -0,0 +1,203 @@
+# agent/prompt_cache.py
+"""Prompt-level completion cache and single-flight for LLM calls.
+
+Classification and review are effectively deterministic functions of their
+prompt, so the same ticket resubmitted, or a draft reviewed again after a
+client retry, doesn't need another upstream call. :func:`predict` and
+:func:`apredict` wrap ``llm.predict``:
+
+- concurrent calls with an identical prompt share one upstream request;
+- for roles with ``prompt_cache`` set (classifier and reviewer by default,
+  ``<ROLE>_PROMPT_CACHE`` overrides), completions are kept in a bounded LRU
+  keyed by a hash of the backend, model, role and prompt. The cache is backed
+  by an append-only JSONL file (:class:`agent.cache.JsonlLog`) that is
+  compacted on load.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from functools import cache
+
+from agent.cache import JsonlLog, TTLCache
+from agent.config import (
+    LLM_BACKEND,
+    LLM_ROLES,
+    LLM_SINGLE_FLIGHT,
+    PROMPT_CACHE_ENABLED,
+    PROMPT_CACHE_PATH,
+    PROMPT_CACHE_SIZE,
+    PROMPT_CACHE_TTL,
+)
+from agent.metrics import registry
+
+
+class PromptCache(TTLCache):
+    """``TTLCache`` of prompt key -> completion, persisted to an optional JSONL file.
+
+    Entries expire ``ttl`` seconds after being added, by wall-clock time, so
+    they keep their age across restarts.
+    """
+
+    def __init__(self, path=None, maxsize=10000, ttl=604800.0, clock=time.time):
+        """Create a cache, loading the live entries of the file at ``path`` if given."""
+        super().__init__(maxsize, ttl, clock)
+        self.log = JsonlLog(path) if path else None
+        if self.log is not None:
+            self._load()
+
+    def set(self, key, completion):
+        """Store ``completion`` under ``key`` and append it to the file."""
+        expires_at = super().set(key, completion)
+        if expires_at is not None and self.log is not None:
+            self.log.append({"key": key, "completion": completion, "created_at": expires_at - self.ttl})
+
+    def clear(self):
+        """Drop every entry, also from the file."""
+        super().clear()
+        if self.log is not None:
+            self.log.rewrite([])
+
+    def _load(self):
+        records = self.log.read(lambda record: (record["key"], record["created_at"] + self.ttl, record["completion"]))
+        if records is None:
+            return
+        now = self._clock()
+        for key, expires_at, completion in records:
+            if expires_at > now:
+                super().set(key, completion, expires_at)
+        self.log.rewrite({"key": key, "completion": completion, "created_at": expires_at - self.ttl}
+                         for key, expires_at, completion in self.items())
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into the first one, from threads and event loops alike."""
+
+    def __init__(self):
+        """Create a single-flight group with no calls in progress."""
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """Return ``(future, leader)``; the leader must ``finish`` the future, the others wait on it."""
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                return future, False
+            future = self._pending[key] = Future()
+            return future, True
+
+    def finish(self, key, future, result=None, error=None):
+        """Resolve the leader's future with ``result`` or ``error`` and forget ``key``."""
+        with self._lock:
+            del self._pending[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+
+def _leader_cancelled(future):
+    # The waiter should take over the call rather than fail with the leader
+    return future.done() and isinstance(future.exception(), asyncio.CancelledError)
+
+
+_flights = SingleFlight()
+
+
+def prompt_key(role, prompt, tier="fast"):
+    """Hash the backend, model, role and prompt into a cache key."""
+    model = LLM_ROLES[role]["strong_model" if tier == "strong" else "model"]
+    return hashlib.sha256(f"{LLM_BACKEND}\0{model}\0{role}\0{prompt}".encode()).hexdigest()
+
+
+def _cache_for(role):
+    if not PROMPT_CACHE_ENABLED or not LLM_ROLES[role].get("prompt_cache"):
+        return None
+    return get_prompt_cache()
+
+
+def predict(llm, prompt, role, tier="fast"):
+    """``llm.predict(prompt)``, reusing a cached or in-flight completion of the same prompt."""
+    cache = _cache_for(role)
+    key = prompt_key(role, prompt, tier)
+    if cache is not None:
+        completion = cache.get(key)
+        if completion is not None:
+            return completion
+    if not LLM_SINGLE_FLIGHT:
+        return _store(cache, key, llm.predict(prompt))
+
+    while True:
+        future, leader = _flights.join(key)
+        if leader:
+            break
+        try:
+            completion = future.result()
+        except asyncio.CancelledError:
+            continue
+        registry.inc("support_llm_coalesced", role=role)
+        return completion
+    try:
+        completion = _store(cache, key, llm.predict(prompt))
+    except BaseException as exc:
+        _flights.finish(key, future, error=exc)
+        raise
+    _flights.finish(key, future, completion)
+    return completion
+
+
+async def apredict(llm, prompt, role, tier="fast"):
+    """Async variant of :func:`predict`."""
+    cache = _cache_for(role)
+    key = prompt_key(role, prompt, tier)
+    if cache is not None:
+        completion = cache.get(key)
+        if completion is not None:
+            return completion
+    if not LLM_SINGLE_FLIGHT:
+        return _store(cache, key, await llm.apredict(prompt))
+
+    while True:
+        future, leader = _flights.join(key)
+        if leader:
+            break
+        try:
+            # Shielded: a cancelled waiter must not cancel the shared call
+            completion = await asyncio.shield(asyncio.wrap_future(future))
+        except asyncio.CancelledError:
+            if _leader_cancelled(future):
+                continue
+            raise
+        registry.inc("support_llm_coalesced", role=role)
+        return completion
+    try:
+        completion = _store(cache, key, await llm.apredict(prompt))
+    except BaseException as exc:
+        _flights.finish(key, future, error=exc)
+        raise
+    _flights.finish(key, future, completion)
+    return completion
+
+
+def _store(cache, key, completion):
+    if cache is not None:
+        cache.set(key, completion)
+    return completion
+
+
+@cache
+def get_prompt_cache():
+    """Return the process-wide prompt cache, loading its backing file on first use."""
+    return PromptCache(PROMPT_CACHE_PATH, PROMPT_CACHE_SIZE, PROMPT_CACHE_TTL)
+
+
+def _cache_metrics():
+    if get_prompt_cache.cache_info().currsize:
+        stats = get_prompt_cache().stats()
+        yield "support_cache_requests", {"cache": "prompt", "result": "hit"}, stats["hits"]
+        yield "support_cache_requests", {"cache": "prompt", "result": "miss"}, stats["misses"]
+
+
+registry.add_collector(_cache_metrics)
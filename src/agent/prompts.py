@@ -0,0 +1,58 @@
+# agent/prompts.py
+"""Prompt assembly under token budgets.
+
+Node prompts are a static instruction block followed by the ticket-specific
+sections, so every prompt a node sends starts with the same prefix and
+provider-side prompt caching can reuse it across tickets and attempts.
+Retrieved passages are deduplicated and packed, best first, into a token
+budget, and free text (ticket descriptions, drafts, reviewer feedback) is
+clipped to a per-field budget. Tokens are counted with :mod:`agent.tokens`.
+"""
+from typing import List, Sequence
+
+from agent.tokens import count_tokens, truncate_tokens
+
+PASSAGE_OVERHEAD = 3  # "[n] " and the line break
+MIN_PASSAGE_TOKENS = 16  # Don't bother with a truncated tail shorter than this
+TRUNCATED = " [...]"
+
+
+def pack_passages(passages: Sequence[str], max_tokens) -> List[str]:
+    """Deduplicated passages, in the given (ranked) order, that fit in ``max_tokens``.
+
+    A passage repeating, or contained in, an earlier one is dropped. The first
+    passage that doesn't fit is cut to the remaining budget.
+    """
+    packed = []
+    seen = []
+    remaining = max_tokens
+    for passage in passages:
+        passage = " ".join(str(passage).split())
+        key = passage.lower()
+        if not passage or any(key in earlier for earlier in seen):
+            continue
+        seen.append(key)
+        tokens = count_tokens(passage) + PASSAGE_OVERHEAD
+        if tokens <= remaining:
+            packed.append(passage)
+            remaining -= tokens
+            continue
+        if remaining - PASSAGE_OVERHEAD >= MIN_PASSAGE_TOKENS:
+            packed.append(truncate_tokens(passage, remaining - PASSAGE_OVERHEAD) + TRUNCATED)
+        break
+    return packed
+
+
+def format_context(passages: Sequence[str], max_tokens) -> str:
+    """Numbered passage lines within the budget, one per line."""
+    packed = pack_passages(passages, max_tokens)
+    if not packed:
+        return "(no matching knowledge base articles)"
+    return "\n".join(f"[{number}] {passage}" for number, passage in enumerate(packed, start=1))
+
+
+def clip(text, max_tokens) -> str:
+    """``text`` cut to ``max_tokens`` tokens, marked when something was removed."""
+    text = (text or "").strip()
+    clipped = truncate_tokens(text, max_tokens)
+    return text if clipped == text else clipped.rstrip() + TRUNCATED
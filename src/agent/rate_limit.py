@@ -0,0 +1,317 @@
+# agent/rate_limit.py
+"""Shared rate limiting for every LLM HTTP request.
+
+One process-wide :class:`RateLimiter` sits under the OpenAI clients of all
+node roles, as an httpx transport, so the classifier, drafter and reviewer
+draw on the same budget:
+
+- token buckets cap requests and (estimated) tokens per minute;
+- an AIMD limit on in-flight requests halves on throttling (429/503) and
+  grows by about one request per window of successes;
+- throttled or failed requests are retried with jittered exponential
+  backoff, and a ``Retry-After`` pauses every caller, not just the one that
+  was throttled, so the next requests don't stampede the provider.
+"""
+import asyncio
+import itertools
+import json
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from functools import cache
+
+import httpx
+
+from agent.config import (
+    LLM_COMPLETION_TOKENS_ESTIMATE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_MIN_CONCURRENCY,
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+    LLM_THROTTLE_RETRIES,
+    LLM_TOKENS_PER_MINUTE,
+)
+from agent.metrics import registry
+from agent.tokens import count_tokens
+
+THROTTLE_STATUSES = frozenset({429, 503})
+RETRY_STATUSES = frozenset({500, 502, 504})
+
+
+class TokenBucket:
+    """Reservation-style token bucket: callers take tokens now and sleep off any debt."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        """Create a full bucket refilled at ``rate`` tokens per second."""
+        self.rate = rate  # Tokens per second
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take ``amount`` tokens and return how many seconds to wait before using them."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= min(amount, self.capacity)  # A single oversized request still gets through
+            return max(0.0, -self._tokens / self.rate)
+
+
+class AdaptiveConcurrency:
+    """Additive-increase/multiplicative-decrease limit on in-flight requests, usable from threads and event loops."""
+
+    def __init__(self, initial, minimum=1, maximum=64, decrease=0.5, cooldown=1.0, clock=time.monotonic):
+        """Start at ``initial`` slots, kept between ``minimum`` and ``maximum``."""
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self._clock = clock
+        self._last_decrease = float("-inf")
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _try_acquire(self, waiter):
+        with self._lock:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            self._waiters.append(waiter)
+            return False
+
+    def acquire(self):
+        """Take a slot, blocking the thread until one is free."""
+        while True:
+            event = threading.Event()
+            if self._try_acquire(event.set):
+                return
+            event.wait()
+
+    async def aacquire(self):
+        """Take a slot, waiting without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            future = loop.create_future()
+
+            def wake(future=future):
+                loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+            if self._try_acquire(wake):
+                return
+            try:
+                await future
+            except asyncio.CancelledError:
+                with self._lock:
+                    try:
+                        self._waiters.remove(wake)
+                        woken = False
+                    except ValueError:
+                        woken = True
+                if woken:
+                    self._wake()  # Pass on the wakeup this waiter consumed
+                raise
+
+    def release(self, outcome="ok"):
+        """Free a slot and adapt the limit: "ok" grows it, "throttled" shrinks it, "error" leaves it."""
+        with self._lock:
+            self.in_flight -= 1
+            if outcome == "ok":
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == "throttled":
+                now = self._clock()
+                # One decrease per cooldown: a burst of 429s is a single congestion signal
+                if now - self._last_decrease >= self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+        self._wake()
+
+    def _wake(self):
+        with self._lock:
+            waiters = [self._waiters.popleft()
+                       for _ in range(min(len(self._waiters), max(0, int(self.limit) - self.in_flight)))]
+        for wake in waiters:
+            wake()
+
+
+class RateLimiter:
+    """Request and token budgets plus adaptive concurrency for one LLM provider.
+
+    Callers take a concurrency slot, sleep off ``delay()``, send the request
+    and report it to ``finish()``, which releases the slot and decides whether
+    and when to retry.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, max_concurrency=64, min_concurrency=1,
+                 max_retries=2, throttle_retries=6, base_delay=0.5, max_delay=30.0, clock=time.monotonic):
+        """Create a limiter; a budget of 0 requests or tokens per minute is unlimited."""
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute, clock) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute, clock) if tokens_per_minute else None
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency, max_concurrency, clock=clock)
+        self.max_retries = max_retries
+        self.throttle_retries = throttle_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._clock = clock
+        self._paused_until = 0.0
+
+    def delay(self, tokens):
+        """Return the seconds to wait before a request of ``tokens`` fits the budgets."""
+        wait = max(0.0, self._paused_until - self._clock())
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def pause(self, seconds):
+        """Hold back every caller for ``seconds`` (the provider's Retry-After)."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def backoff(self, attempt, retry_after=None):
+        """Return the jittered delay before retry number ``attempt`` (0-based)."""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def finish(self, attempt, response=None, error=None):
+        """Release the request's slot; return the delay before retrying it, or None if it is done."""
+        outcome = _outcome(response, error)
+        self.concurrency.release(outcome)
+        retries = self.throttle_retries if outcome == "throttled" else self.max_retries
+        if outcome == "ok" or attempt >= retries:
+            return None
+        retry_after = retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            self.pause(retry_after)
+        registry.inc("support_llm_retries", reason=outcome)
+        return self.backoff(attempt, retry_after)
+
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header given in seconds or as an HTTP date."""
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(request):
+    """Estimate the prompt tokens plus the completion budget of a chat completion request."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return LLM_COMPLETION_TOKENS_ESTIMATE
+    prompt = sum(count_tokens(m.get("content")) for m in body.get("messages", [])
+                 if isinstance(m.get("content"), str))
+    return prompt + (body.get("max_tokens") or LLM_COMPLETION_TOKENS_ESTIMATE)
+
+
+def _outcome(response=None, error=None):
+    if error is not None:
+        return "error"
+    if response.status_code in THROTTLE_STATUSES:
+        return "throttled"
+    return "error" if response.status_code in RETRY_STATUSES else "ok"
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport sending every request through a :class:`RateLimiter`, retrying it as told."""
+
+    def __init__(self, transport, limiter):
+        """Wrap ``transport`` with ``limiter``."""
+        self._transport = transport
+        self.limiter = limiter
+
+    def handle_request(self, request):
+        """Send ``request`` within the limiter's budgets, retrying failures it allows."""
+        tokens = estimate_tokens(request)
+        for attempt in itertools.count():
+            self.limiter.concurrency.acquire()
+            response = error = None
+            try:
+                time.sleep(self.limiter.delay(tokens))
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as exc:
+                error = exc
+            except BaseException:
+                self.limiter.concurrency.release("error")
+                raise
+            delay = self.limiter.finish(attempt, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    def close(self):
+        """Close the wrapped transport."""
+        self._transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async variant of :class:`RateLimitedTransport`."""
+
+    def __init__(self, transport, limiter):
+        """Wrap ``transport`` with ``limiter``."""
+        self._transport = transport
+        self.limiter = limiter
+
+    async def handle_async_request(self, request):
+        """Send ``request`` within the limiter's budgets, retrying failures it allows."""
+        tokens = estimate_tokens(request)
+        for attempt in itertools.count():
+            await self.limiter.concurrency.aacquire()
+            response = error = None
+            try:
+                await asyncio.sleep(self.limiter.delay(tokens))
+                response = await self._transport.handle_async_request(request)
+            except httpx.TransportError as exc:
+                error = exc
+            except BaseException:
+                self.limiter.concurrency.release("error")
+                raise
+            delay = self.limiter.finish(attempt, response, error)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        """Close the wrapped transport."""
+        await self._transport.aclose()
+
+
+@cache
+def get_rate_limiter():
+    """Return the limiter shared by every LLM client in this process."""
+    return RateLimiter(
+        requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=LLM_TOKENS_PER_MINUTE,
+        max_concurrency=LLM_MAX_CONCURRENCY,
+        min_concurrency=LLM_MIN_CONCURRENCY,
+        max_retries=LLM_MAX_RETRIES,
+        throttle_retries=LLM_THROTTLE_RETRIES,
+        base_delay=LLM_RETRY_BASE_DELAY,
+        max_delay=LLM_RETRY_MAX_DELAY,
+    )
@@ -0,0 +1,81 @@
+# agent/review_rules.py
+"""Deterministic pre-review of drafts against the reviewer's hard rejection rules.
+
+Drafts that break one of these rules would be rejected by the LLM reviewer
+anyway, so they are rejected immediately with structured feedback instead.
+Rules marked ``partial`` only look for forbidden content and can also be
+applied to a draft that is still being generated.
+"""
+import re
+from typing import List, NamedTuple
+
+from agent.config import PRE_REVIEW_MIN_WORDS
+
+
+class Violation(NamedTuple):
+    """A hard rule a draft breaks, with the feedback given for it."""
+
+    rule: str
+    message: str
+
+
+# Only promises of money back count: "we will issue a new API key", "I can process your credit
+# card payment" or "we will not refund" are fine
+PROMISE_RE = re.compile(
+    r"\b(?:we|i)(?:'ll|'ve| will| have| are going to| am going to| can)\s+(?:(?!(?:not|never|no)\b)\w+\s+)?"
+    r"(?:(?:refund|credit|reimburs|waiv)(?:e|es|ed|ing|s)?\b(?!\s+card)"
+    r"|(?:issu|process|appl|grant|giv|gave|sen[dt]|provid)\w*\s+(?:[\w$.,%-]+\s+){0,3}?"
+    r"(?:refund|credit|reimbursement|waiver)s?\b(?!\s+card))"
+    r"|\byou(?:'ll| will)\s+(?:receive|get|be given)\s+(?:a\s+)?(?:full\s+|partial\s+)?(?:refund|credit|reimbursement)"
+    r"\b(?!\s+card)"
+    r"|\b(?:refund|credit|reimbursement)\s+(?:has been|will be|is being)\s+(?:issued|processed|applied|credited)",
+    re.IGNORECASE,
+)
+INTERNAL_PATH_RE = re.compile(
+    r"(?:^|[\s\"'(`])/(?:logs|var|etc|opt|usr|srv|internal|home|root)/[\w./-]*"
+    r"|\b[\w-]+\.log\b",
+    re.IGNORECASE,
+)
+GENERIC_RE = re.compile(
+    r"\b(?:we(?:'re| are) here to help|let us know if you (?:need|have)|thank you for (?:contacting|reaching out)"
+    r"|sorry to hear|feel free to reach out|we appreciate your patience)",
+    re.IGNORECASE,
+)
+ACTIONABLE_RE = re.compile(
+    r"\b(?:step|go to|navigate|click|select|open|settings|update|clear|reinstall|enable|disable|reset"
+    r"|verify|download|log out|sign out|try|check)\b|>|^\s*\d+[.)]",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def _forbidden_content(draft) -> List[Violation]:
+    violations = []
+    if PROMISE_RE.search(draft):
+        violations.append(Violation("overpromise", "Promises a refund, credit or waiver without supervisor approval."))
+    if INTERNAL_PATH_RE.search(draft):
+        violations.append(Violation("internal_path", "Discloses an internal system path or log file."))
+    return violations
+
+
+def check_partial_draft(draft) -> List[Violation]:
+    """Apply only the rules that stay valid while the draft is still being written."""
+    return _forbidden_content(draft)
+
+
+def check_draft(draft, min_words=PRE_REVIEW_MIN_WORDS) -> List[Violation]:
+    """Check a complete draft against every hard rule."""
+    violations = []
+    words = len(draft.split())
+    if words < min_words:
+        violations.append(Violation("too_short", f"Response has {words} words; at least {min_words} are required."))
+    if GENERIC_RE.search(draft) and not ACTIONABLE_RE.search(draft):
+        violations.append(Violation("generic", "Generic acknowledgment without specific, actionable help."))
+    violations.extend(_forbidden_content(draft))
+    return violations
+
+
+def format_feedback(violations) -> str:
+    """Render violations in the reviewer's REJECTED feedback format."""
+    lines = ["REJECTED", "Automatic pre-review found hard rule violations:"]
+    lines.extend(f"- [{v.rule}] {v.message}" for v in violations)
+    return "\n".join(lines)
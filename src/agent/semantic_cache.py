@@ -0,0 +1,146 @@
+# agent/semantic_cache.py
+"""Semantic cache of approved responses for near-duplicate tickets.
+
+Entries pair the embedding of an approved ticket with its ``final_response``.
+A new ticket whose embedding is at least ``threshold`` cosine-similar to an
+entry reuses that response. Entries expire after ``ttl`` seconds, the oldest
+are evicted beyond ``maxsize``, and everything is dropped when the knowledge
+base version changes. The cache is backed by an append-only JSONL file that
+is compacted on load.
+"""
+import base64
+import threading
+import time
+from functools import cache
+
+import numpy as np
+
+from agent.cache import JsonlLog
+from agent.config import (
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+)
+
+
+def _encode(vector):
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def _decode(data):
+    return np.frombuffer(base64.b64decode(data), dtype=np.float32)
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class SemanticCache:
+    """Approved responses keyed by ticket embedding, matched by cosine similarity.
+
+    Entries expire ``ttl`` seconds after being added and are dropped when the
+    knowledge base version changes. With a ``path`` they are persisted to an
+    append-only JSONL file and reloaded on start.
+    """
+
+    def __init__(self, path=None, threshold=0.95, maxsize=10000, ttl=86400.0, clock=time.time):
+        """Create a cache matching at cosine similarity ``threshold`` or above, loading ``path`` if given."""
+        self.log = JsonlLog(path) if path else None
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._clock = clock
+        self._entries = []
+        self._matrix = None
+        self._kb_version = None
+        self._lock = threading.Lock()
+        if self.log is not None:
+            self._load()
+
+    def lookup(self, vector, kb_version):
+        """Return the most similar live entry at or above the threshold, or None."""
+        query = _normalize(vector)
+        with self._lock:
+            self._sync_version(kb_version)
+            self._evict_expired()
+            if self._entries:
+                if self._matrix is None:
+                    self._matrix = np.vstack([entry["vector"] for entry in self._entries])
+                scores = self._matrix @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    return {**self._entries[best], "similarity": float(scores[best])}
+            self.misses += 1
+            return None
+
+    def add(self, vector, response, kb_version, **fields):
+        """Remember an approved response for the ticket embedded as ``vector``."""
+        entry = {**fields, "response": response, "kb_version": kb_version,
+                 "created_at": self._clock(), "vector": _normalize(vector)}
+        with self._lock:
+            self._sync_version(kb_version)
+            self._entries.append(entry)
+            self._matrix = None
+            if len(self._entries) > self.maxsize:
+                del self._entries[:len(self._entries) - self.maxsize]
+            if self.log is not None:
+                self.log.append(self._serialize(entry))
+
+    def clear(self):
+        """Drop every entry, also from the file."""
+        with self._lock:
+            self._entries = []
+            self._matrix = None
+            if self.log is not None:
+                self._rewrite()
+
+    def __len__(self):
+        """Return the number of entries, including expired ones not yet evicted."""
+        return len(self._entries)
+
+    def stats(self):
+        """Return the hit and miss counts and the current and maximum size."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def _sync_version(self, kb_version):
+        # The knowledge base changed: cached answers may now be wrong
+        if kb_version != self._kb_version:
+            if self._entries:
+                self._entries = [e for e in self._entries if e["kb_version"] == kb_version]
+                self._matrix = None
+                if self.log is not None:
+                    self._rewrite()
+            self._kb_version = kb_version
+
+    def _evict_expired(self):
+        cutoff = self._clock() - self.ttl
+        if self._entries and self._entries[0]["created_at"] < cutoff:
+            self._entries = [e for e in self._entries if e["created_at"] >= cutoff]
+            self._matrix = None
+
+    @staticmethod
+    def _serialize(entry):
+        return {**entry, "vector": _encode(entry["vector"])}
+
+    def _load(self):
+        entries = self.log.read(lambda record: {**record, "vector": _decode(record["vector"])})
+        if entries is None:
+            return
+        cutoff = self._clock() - self.ttl
+        entries = [e for e in entries if e["created_at"] >= cutoff]
+        self._entries = entries[-self.maxsize:] if self.maxsize else []
+        self._rewrite()
+
+    def _rewrite(self):
+        self.log.rewrite(self._serialize(entry) for entry in self._entries)
+
+
+@cache
+def get_semantic_cache():
+    """Return the process-wide semantic cache, loading its backing file on first use."""
+    return SemanticCache(SEMANTIC_CACHE_PATH, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL)
@@ -0,0 +1,43 @@
+# agent/tokens.py
+"""Token counting with tiktoken.
+
+tiktoken downloads its BPE files on first use; when that isn't possible
+(offline hosts) counts fall back to an estimate of four characters per token.
+"""
+from functools import cache
+
+from agent.config import TOKEN_ENCODING
+
+CHARS_PER_TOKEN = 4
+
+
+@cache
+def get_encoding():
+    """Return the tiktoken encoding, or None when it can't be loaded."""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TOKEN_ENCODING)
+    except Exception:  # Missing BPE file and no network to fetch it
+        return None
+
+
+def count_tokens(text):
+    """Count the tokens of ``text``, estimating from its length when tiktoken is unavailable."""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut ``text`` down to at most ``max_tokens`` tokens."""
+    if not text or max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
@@ -0,0 +1,342 @@
+# agent/vectorstore.py
+"""Persisted FAISS index artifacts for the knowledge base.
+
+All categories share one index whose documents carry their category in the
+metadata. It is built once, written to ``INDEX_DIR`` together with its docstore
+and a manifest holding a content hash of the source documents, and
+memory-mapped on load. Documents are keyed by a hash of their content, so
+when the knowledge base changes :func:`update_index` embeds only the added
+or edited documents and deletes removed ones from the index in place; a full
+rebuild only happens when the embedding model or the index type change.
+
+Vectors are stored exactly (``flat``) or compressed to cut the memory of every
+worker: ``fp16`` and ``int8`` scalar quantization keep 2 and 1 bytes per
+dimension, ``pq`` product quantization keeps ``m`` codes per vector.
+``benchmarks/bench_index.py`` reports the recall each one gives up.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from agent.config import (
+    EMBEDDING_MODEL,
+    INDEX_DIR,
+    INDEX_PQ_M,
+    INDEX_PQ_NBITS,
+    INDEX_TYPE,
+    KNOWLEDGE_BASE_DIR,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.json"
+ARTIFACT_VERSION = 3
+INDEX_TYPES = ("flat", "fp16", "int8", "pq")
+
+logger = logging.getLogger(__name__)
+
+
+def documents_hash(category_docs: Dict[str, List[Document]], model_name: str) -> str:
+    """Return a stable hash of the knowledge base documents and embedding model."""
+    payload = {
+        "artifact_version": ARTIFACT_VERSION,
+        "embedding_model": model_name,
+        "docs": {
+            cat: [[doc.page_content, doc.metadata] for doc in docs]
+            for cat, docs in sorted(category_docs.items())
+        },
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def read_manifest(index_dir: Path = INDEX_DIR) -> dict | None:
+    """Return the manifest of the artifact in ``index_dir``, if there is one."""
+    try:
+        with open(Path(index_dir) / MANIFEST_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def tag_documents(category_docs: Dict[str, List[Document]]) -> List[Document]:
+    """Flatten the per-category documents into one list tagged with their category."""
+    return [
+        Document(page_content=doc.page_content, metadata={**doc.metadata, "category": cat})
+        for cat, docs in category_docs.items()
+        for doc in docs
+    ]
+
+
+def document_id(doc: Document) -> str:
+    """Content hash of a tagged document, used as its docstore id."""
+    encoded = json.dumps([doc.page_content, doc.metadata], sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+
+def identified_documents(category_docs: Dict[str, List[Document]]) -> Dict[str, Document]:
+    """Tagged documents by content id, in knowledge base order; exact duplicates collapse into one."""
+    documents = {}
+    for doc in tag_documents(category_docs):
+        documents.setdefault(document_id(doc), doc)
+    if not documents:
+        raise ValueError("The knowledge base has no documents")
+    return documents
+
+
+def pq_subquantizers(dim: int, m: int = 0) -> int:
+    """Return the number of PQ sub-vectors: ``m`` if given, else the largest divisor of ``dim`` up to dim / 16."""
+    if m:
+        if dim % m:
+            raise ValueError(f"INDEX_PQ_M={m} does not divide the embedding dimension {dim}")
+        return m
+    return max(d for d in range(1, max(1, dim // 16) + 1) if dim % d == 0)
+
+
+def make_index(vectors, index_type: str = "flat", pq_m: int = 0, pq_nbits: int = 8):
+    """Build an L2 FAISS index over ``vectors`` with the given storage precision."""
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_L2)
+    elif index_type == "int8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_L2)
+    elif index_type == "pq":
+        # k-means needs at least 2**nbits points, so small knowledge bases get smaller codebooks
+        nbits = max(1, min(pq_nbits, int(np.log2(max(count, 2)))))
+        index = faiss.IndexPQ(dim, pq_subquantizers(dim, pq_m), nbits, faiss.METRIC_L2)
+        index.pq.cp.min_points_per_centroid = 1
+    else:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {', '.join(INDEX_TYPES)}")
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+
+def build_index(category_docs, embedding, index_dir: Path = INDEX_DIR,
+                model_name: str = EMBEDDING_MODEL, index_type: str = INDEX_TYPE) -> FAISS:
+    """Embed the knowledge base, write the artifact to ``index_dir`` and return the store."""
+    documents = identified_documents(category_docs)
+    store = FAISS.from_documents(list(documents.values()), embedding, ids=list(documents))
+    if index_type != "flat":
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+        store.index = make_index(vectors, index_type, INDEX_PQ_M, INDEX_PQ_NBITS)
+    _write_artifact(store, category_docs, index_dir, model_name, index_type,
+                    {"added": len(documents), "removed": 0, "rebuilt": True})
+    return store
+
+
+def update_index(category_docs, embedding, index_dir: Path = INDEX_DIR,
+                 model_name: str = EMBEDDING_MODEL, index_type: str = INDEX_TYPE) -> FAISS:
+    """Bring the artifact up to date with the documents, embedding only the added or changed ones.
+
+    Documents that are gone are removed from the index in place and new ones are
+    appended (compressed indexes reuse their trained codebooks). Without a compatible
+    artifact this is a full :func:`build_index`.
+    """
+    manifest = read_manifest(index_dir)
+    if not _compatible(manifest, model_name, index_type):
+        return build_index(category_docs, embedding, index_dir, model_name, index_type)
+    try:
+        current = load_index(embedding, index_dir, mmap=False)
+    except (OSError, ValueError, RuntimeError, KeyError):
+        return build_index(category_docs, embedding, index_dir, model_name, index_type)
+
+    documents = identified_documents(category_docs)
+    order = [current.index_to_docstore_id[i] for i in range(current.index.ntotal)]
+    removed = [position for position, doc_id in enumerate(order) if doc_id not in documents]
+    existing = set(order)
+    added = [doc_id for doc_id in documents if doc_id not in existing]
+
+    index = current.index
+    if removed:
+        # Positions after a removed vector shift down, keeping their order
+        index.remove_ids(np.asarray(removed, dtype=np.int64))
+        order = [doc_id for doc_id in order if doc_id in documents]
+    if added:
+        vectors = embedding.embed_documents([documents[doc_id].page_content for doc_id in added])
+        index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+        order += added
+    store = FAISS(embedding, index, InMemoryDocstore({doc_id: documents[doc_id] for doc_id in order}),
+                  dict(enumerate(order)))
+    _write_artifact(store, category_docs, index_dir, model_name, index_type,
+                    {"added": len(added), "removed": len(removed), "rebuilt": False})
+    logger.info("Updated index in %s: %d documents added, %d removed", index_dir, len(added), len(removed))
+    return store
+
+
+def _compatible(manifest, model_name, index_type) -> bool:
+    """Whether an artifact can be updated in place rather than rebuilt."""
+    return bool(manifest and manifest.get("artifact_version") == ARTIFACT_VERSION
+                and manifest.get("embedding_model") == model_name
+                and manifest.get("index_type", "flat") == index_type)
+
+
+def _write_artifact(store, category_docs, index_dir, model_name, index_type, changes) -> None:
+    """Write ``store`` to a staging directory and swap it in as ``index_dir``."""
+    index_dir = Path(index_dir)
+    index_dir.parent.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f".{index_dir.name}-", dir=index_dir.parent))
+
+    try:
+        faiss.write_index(store.index, str(staging / INDEX_FILE))
+        entries = [
+            {
+                "id": doc_id,
+                "page_content": store.docstore.search(doc_id).page_content,
+                "metadata": store.docstore.search(doc_id).metadata,
+            }
+            for _, doc_id in sorted(store.index_to_docstore_id.items())
+        ]
+        with open(staging / DOCSTORE_FILE, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False)
+
+        manifest = {
+            "artifact_version": ARTIFACT_VERSION,
+            "embedding_model": model_name,
+            "content_hash": documents_hash(category_docs, model_name),
+            "categories": {cat: len(docs) for cat, docs in category_docs.items()},
+            "count": store.index.ntotal,
+            "dim": store.index.d,
+            "index_type": index_type,
+            "index_bytes": (staging / INDEX_FILE).stat().st_size,
+            "last_update": changes,
+            "built_at": time.time(),
+        }
+        # The manifest is written last so a half-written artifact never looks valid.
+        with open(staging / MANIFEST_FILE, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        _swap_directory(staging, index_dir)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def _swap_directory(staging: Path, index_dir: Path) -> None:
+    """Replace ``index_dir`` with ``staging`` so readers never see a partial artifact."""
+    retired = None
+    if index_dir.exists():
+        retired = index_dir.with_name(f".{index_dir.name}-old-{os.getpid()}-{time.time_ns()}")
+        os.replace(index_dir, retired)
+    os.replace(staging, index_dir)
+    if retired is not None:
+        # Stores still reading the old files keep their mappings until they are released
+        shutil.rmtree(retired, ignore_errors=True)
+
+
+@contextmanager
+def _artifact_lock(index_dir: Path):
+    """Serialize artifact updates across processes sharing ``index_dir``."""
+    index_dir = Path(index_dir)
+    index_dir.parent.mkdir(parents=True, exist_ok=True)
+    with open(index_dir.with_name(f".{index_dir.name}.lock"), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+def _read_index(path: Path, mmap: bool = True):
+    """Memory-map a FAISS index, falling back to a regular read if mmap is unsupported."""
+    if not mmap:
+        return faiss.read_index(str(path))
+    flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+    try:
+        return faiss.read_index(str(path), flags)
+    except RuntimeError:
+        return faiss.read_index(str(path))
+
+
+def load_index(embedding, index_dir: Path = INDEX_DIR, mmap: bool = True) -> FAISS:
+    """Load the store from ``index_dir``, memory-mapping the vectors unless it is to be modified."""
+    index_dir = Path(index_dir)
+    if read_manifest(index_dir) is None:
+        raise FileNotFoundError(f"No index manifest found in {index_dir}")
+
+    index = _read_index(index_dir / INDEX_FILE, mmap)
+    with open(index_dir / DOCSTORE_FILE, encoding="utf-8") as f:
+        entries = json.load(f)
+    docstore = InMemoryDocstore({
+        entry["id"]: Document(page_content=entry["page_content"], metadata=entry["metadata"])
+        for entry in entries
+    })
+    index_to_docstore_id = {i: entry["id"] for i, entry in enumerate(entries)}
+    return FAISS(embedding, index, docstore, index_to_docstore_id)
+
+
+def _load_current(category_docs, embedding, index_dir, model_name, index_type):
+    """Return the artifact's store if it matches the documents, model and index type, else None."""
+    manifest = read_manifest(index_dir)
+    if (manifest and manifest.get("content_hash") == documents_hash(category_docs, model_name)
+            and manifest.get("index_type", "flat") == index_type):
+        try:
+            return load_index(embedding, index_dir)
+        except (OSError, ValueError, RuntimeError, KeyError):
+            pass  # Corrupt or partial artifact: update or rebuild it.
+    return None
+
+
+def load_or_build_index(category_docs, embedding, index_dir: Path = INDEX_DIR,
+                        model_name: str = EMBEDDING_MODEL, index_type: str = INDEX_TYPE) -> FAISS:
+    """Load the artifact if it matches the documents, model and index type, otherwise update it."""
+    store = _load_current(category_docs, embedding, index_dir, model_name, index_type)
+    if store is not None:
+        return store
+    with _artifact_lock(index_dir):
+        # Another process may have brought it up to date while we waited for the lock
+        store = _load_current(category_docs, embedding, index_dir, model_name, index_type)
+        if store is not None:
+            return store
+        update_index(category_docs, embedding, index_dir, model_name, index_type)
+    # Serve from the memory-mapped artifact like any other worker would
+    return load_index(embedding, index_dir)
+
+
+def main(argv=None) -> None:
+    """Build or incrementally update the knowledge base index artifact ahead of deployment."""
+    parser = argparse.ArgumentParser(description="Build the persisted FAISS index artifact.")
+    parser.add_argument("--index-dir", type=Path, default=INDEX_DIR)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE)
+    parser.add_argument("--kb-dir", type=Path, default=KNOWLEDGE_BASE_DIR, help="knowledge base articles")
+    parser.add_argument("--force", action="store_true", help="rebuild from scratch even if the artifact is current")
+    args = parser.parse_args(argv)
+
+    from agent.embeddings import get_embedding
+    from agent.knowledge_base import load_knowledge_base
+
+    category_docs = load_knowledge_base(args.kb_dir)
+    if args.force:
+        build_index(category_docs, get_embedding(), args.index_dir, index_type=args.index_type)
+    else:
+        load_or_build_index(category_docs, get_embedding(), args.index_dir, index_type=args.index_type)
+    manifest = read_manifest(args.index_dir)
+    changes = manifest.get("last_update", {})
+    print(f"Index artifact at {args.index_dir}: {manifest['content_hash'][:12]} "  # noqa: T201
+          f"({manifest['embedding_model']}, {manifest['index_type']}, {manifest['count']} documents, "
+          f"{manifest['index_bytes']} bytes; last update +{changes.get('added', 0)} -{changes.get('removed', 0)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,3 +4,34 @@ import pytest
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+
+@pytest.fixture(autouse=True)
+def reset_retrieval_caches():
+    # Tests swap in different fake embeddings; never share cached vectors between them.
+    from agent.nodes import retriever
+
+    retriever._embedding_cache.clear()
+    retriever._context_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def reset_prompt_cache(tmp_path, monkeypatch):
+    # Tests count LLM calls; start each one with an empty prompt cache outside the repo's data/.
+    from agent import prompt_cache
+
+    monkeypatch.setattr(prompt_cache, "PROMPT_CACHE_PATH", tmp_path / "prompt_cache.jsonl")
+    prompt_cache.get_prompt_cache.cache_clear()
+    yield
+    prompt_cache.get_prompt_cache.cache_clear()
+
+
+@pytest.fixture(autouse=True, scope="session")
+def escalation_log(tmp_path_factory):
+    # Keep escalations from test runs out of the repo's data/escalation_log.csv.
+    from agent import escalation_sink
+
+    escalation_sink.get_escalation_sink.cache_clear()
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(escalation_sink, "ESCALATION_FILE", tmp_path_factory.mktemp("escalations") / "escalation_log.csv")
+        yield
@@ -0,0 +1,28 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from agent.nodes import classifier, drafter, retriever, reviewer
+from agent.vectorstore import build_index
+
+
+@pytest.fixture
+def offline_agent(tmp_path, monkeypatch):
+    """Run retrieval on a throwaway index and, optionally, the LLM nodes on fake models.
+
+    Call it with the embedding to index the knowledge base with and ``llm(role)``
+    returning each node's model; it returns the index. The embedding fast path
+    of the classifier is off, so every ticket goes through the classifier's LLM.
+    """
+
+    def setup(embedding=None, llm=None, model_name="fake"):
+        embedding = embedding or DeterministicFakeEmbedding(size=16)
+        store = build_index(retriever.get_category_docs(), embedding, tmp_path / "index", model_name=model_name)
+        monkeypatch.setattr(retriever, "get_embedding", lambda: embedding)
+        monkeypatch.setattr(retriever, "_vector_store", store)
+        monkeypatch.setattr(classifier, "FAST_CLASSIFIER_ENABLED", False)
+        if llm is not None:
+            for module in (classifier, drafter, reviewer):
+                monkeypatch.setattr(module, "get_llm", lambda role, tier="fast": llm(role))
+        return store
+
+    return setup
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.language_models.chat_models import SimpleChatModel
+
+from agent import aprocess_tickets, build_support_agent, process_tickets
+from agent.batch import (
+    InvalidTicketError,
+    completed_indices,
+    process_file,
+    read_tickets,
+    recorded_runs,
+)
+from agent.checkpoint import SqliteCheckpointer
+from agent.nodes import classifier, drafter, retriever, reviewer
+
+LATENCY = 0.05
+DRAFT = (
+    "You can update your payment method under Account Settings > Billing. Open the Billing tab, choose "
+    "Payment Methods, remove the outdated card and add the new one. Changes take effect immediately for "
+    "future charges. If a payment already failed, it will retry automatically after 3 days, so no further "
+    "action is needed once the new card is saved and verified."
+)
+
+
+class ScriptedChatModel(SimpleChatModel):
+    """Answers each node's prompt with a canned reply after a fixed delay."""
+
+    def _reply(self, messages):
+        prompt = messages[-1].content
+        if prompt.rstrip().endswith("Category:"):
+            return "billing"
+        if "## YOUR REVIEW:" in prompt:
+            return "APPROVED\nSpecific and actionable."
+        return DRAFT
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(LATENCY)
+        return self._reply(messages)
+
+    async def _acall(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(LATENCY)
+        return self._reply(messages)
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+
+class CountingChatModel(ScriptedChatModel):
+    """Scripted replies that count calls; optionally fails the first one or rejects every draft."""
+
+    calls: int = 0
+    fail_first: bool = False
+    reject: bool = False
+
+    def _reply(self, messages):
+        self.calls += 1
+        if self.fail_first and self.calls == 1:
+            raise ConnectionError("worker restarted")
+        if self.reject:
+            return "REJECTED\nNot specific enough."
+        return super()._reply(messages)
+
+
+@pytest.fixture
+def offline_graph(offline_agent):
+    llm = ScriptedChatModel()
+    offline_agent(llm=lambda role: llm)
+
+
+TICKETS = [{"subject": f"Charged twice #{i}", "description": "I was billed twice"} for i in range(8)]
+
+
+@pytest.mark.anyio
+async def test_aprocess_tickets_keeps_tickets_in_flight(offline_graph) -> None:
+    start = time.perf_counter()
+    results = {index: result async for index, result in aprocess_tickets(TICKETS, max_concurrency=8)}
+    elapsed = time.perf_counter() - start
+
+    assert sorted(results) == list(range(len(TICKETS)))
+    assert all(result["final_response"].startswith("You can update") for result in results.values())
+    # Three sequential LLM hops per ticket; serialized this would take 8x longer.
+    assert elapsed < 3 * LATENCY * len(TICKETS) / 2
+
+
+def test_process_tickets_yields_every_ticket(offline_graph) -> None:
+    results = dict(process_tickets(TICKETS[:3], max_concurrency=3))
+    assert sorted(results) == [0, 1, 2]
+    assert all(result["review_result"] == "approved" for result in results.values())
+
+
+@pytest.mark.anyio
+async def test_invalid_tickets_fail_alone_in_library_batches(offline_graph) -> None:
+    tickets = [TICKETS[0], {"subject": "No description"}, TICKETS[1]]
+    for results in (dict(process_tickets(tickets)),
+                    {index: result async for index, result in aprocess_tickets(tickets)}):
+        assert isinstance(results[1], InvalidTicketError)
+        assert results[0]["review_result"] == results[2]["review_result"] == "approved"
+
+
+@pytest.mark.anyio
+async def test_library_batches_leave_no_checkpoints(offline_graph, tmp_path) -> None:
+    checkpointer = SqliteCheckpointer.from_path(tmp_path / "checkpoints.sqlite")
+    graph = build_support_agent(checkpointer=checkpointer)
+
+    assert len(dict(process_tickets(TICKETS[:2], graph=graph))) == 2
+    assert len({index: result async for index, result in aprocess_tickets(TICKETS[:2], graph=graph)}) == 2
+    assert list(checkpointer.list(None)) == []
+
+
+@pytest.mark.anyio
+async def test_speculative_retrieval_overlaps_classification(offline_graph, monkeypatch) -> None:
+    ticket = {"subject": "Charged twice", "description": "I was billed twice for my plan"}
+    sequential = await build_support_agent(speculative_retrieval=False).ainvoke(ticket)
+
+    classified, searched = [], []
+    classification = classifier._classification
+    rank_documents = retriever.rank_documents
+
+    def record_classification(*args):
+        classified.append(time.perf_counter())
+        return classification(*args)
+
+    def record_search(query, *args, **kwargs):
+        searched.append(time.perf_counter())
+        return rank_documents(query, *args, **kwargs)
+
+    monkeypatch.setattr(classifier, "_classification", record_classification)
+    monkeypatch.setattr(retriever, "rank_documents", record_search)
+    retriever._context_cache.clear()
+    speculative = await build_support_agent(speculative_retrieval=True).ainvoke(ticket)
+
+    assert speculative["context"] == sequential["context"]
+    # The search ran once, while the classifier was still waiting on its LLM call
+    assert len(searched) == 1 and searched[0] < classified[0]
+
+
+@pytest.mark.anyio
+async def test_process_file_resumes_from_its_output(offline_graph, tmp_path) -> None:
+    tickets = tmp_path / "tickets.jsonl"
+    tickets.write_text("".join(json.dumps({"id": f"T{i}", **ticket}) + "\n" for i, ticket in enumerate(TICKETS[:4])))
+    output = tmp_path / "results.jsonl"
+    # A previous run finished ticket 1, failed ticket 2 and crashed mid-write
+    output.write_text(json.dumps({"index": 1, "id": "T1", "final_response": "earlier"}) + "\n"
+                      + json.dumps({"index": 2, "id": "T2", "error": "TimeoutError"}) + "\n"
+                      + '{"index": 3, "id": "T3", "final_')
+
+    counts = await process_file(tickets, output, resume=True, checkpoint_every=2)
+
+    assert counts["processed"] == 3
+    records = [json.loads(line) for line in output.read_text().splitlines()[3:]]
+    assert sorted(record["index"] for record in records) == [0, 2, 3]
+    assert all(record["final_response"].startswith("You can update") for record in records)
+    assert completed_indices(output) == {0, 1, 2, 3}
+
+
+@pytest.mark.anyio
+async def test_invalid_records_fail_alone(offline_graph, tmp_path) -> None:
+    tickets = tmp_path / "tickets.jsonl"
+    tickets.write_text(json.dumps(TICKETS[0]) + "\n" + '{"subject": "Refund", "descr\n'
+                       + json.dumps({"id": "T2", "subject": "Login"}) + "\n" + json.dumps(TICKETS[1]) + "\n")
+    output = tmp_path / "results.jsonl"
+
+    for resume in (False, True):
+        counts = await process_file(tickets, output, resume=resume)
+        assert (counts["processed"], counts["failed"]) == ((4, 2) if not resume else (2, 2))
+
+    records = {record["index"]: record for record in map(json.loads, output.read_text().splitlines())}
+    assert records[1]["error"].startswith("InvalidTicketError: line 2:")
+    assert records[2] == {"index": 2, "id": "T2", "error": "InvalidTicketError: missing description"}
+    assert completed_indices(output) == {0, 3}
+
+
+def test_rejected_drafts_are_retried_then_escalated(offline_graph, monkeypatch) -> None:
+    llm = CountingChatModel()
+    monkeypatch.setattr(drafter, "get_llm", lambda role, tier="fast": llm)
+    monkeypatch.setattr(reviewer, "get_llm", lambda role, tier="fast": CountingChatModel(reject=True))
+
+    result = build_support_agent(semantic_cache=False).invoke(TICKETS[0])
+
+    assert llm.calls == 2  # The first draft and one retry
+    assert result["escalated"] and "Max attempts (2)" in result["final_response"]
+
+
+@pytest.mark.anyio
+async def test_interrupted_tickets_resume_from_their_last_node(offline_graph, tmp_path, monkeypatch) -> None:
+    drafts, reviews = CountingChatModel(), CountingChatModel(fail_first=True)
+    monkeypatch.setattr(drafter, "get_llm", lambda role, tier="fast": drafts)
+    monkeypatch.setattr(reviewer, "get_llm", lambda role, tier="fast": reviews)
+    checkpointer = SqliteCheckpointer.from_path(tmp_path / "checkpoints.sqlite")
+    graph = build_support_agent(checkpointer=checkpointer)
+    tickets = tmp_path / "tickets.jsonl"
+    tickets.write_text(json.dumps(TICKETS[0]) + "\n")
+    output = tmp_path / "results.jsonl"
+
+    assert (await process_file(tickets, output, graph=graph))["failed"] == 1
+    counts = await process_file(tickets, output, resume=True, graph=graph)
+
+    assert (counts["processed"], counts["failed"]) == (1, 0)
+    assert (drafts.calls, reviews.calls) == (1, 2)  # Only the review that failed ran again
+    assert list(checkpointer.list(None)) == []  # Dropped once the result was written
+
+
+@pytest.mark.anyio
+async def test_threads_only_resume_the_same_ticket_of_the_same_output(offline_graph, tmp_path, monkeypatch) -> None:
+    drafts, reviews = CountingChatModel(), CountingChatModel(fail_first=True)
+    monkeypatch.setattr(drafter, "get_llm", lambda role, tier="fast": drafts)
+    monkeypatch.setattr(reviewer, "get_llm", lambda role, tier="fast": reviews)
+    graph = build_support_agent(checkpointer=SqliteCheckpointer.from_path(tmp_path / "checkpoints.sqlite"))
+    tickets = tmp_path / "tickets.jsonl"
+    output = tmp_path / "results.jsonl"
+    tickets.write_text(json.dumps(TICKETS[0]) + "\n")
+    assert (await process_file(tickets, output, graph=graph))["failed"] == 1  # Its thread is kept for --resume
+
+    # Another ticket at the same index doesn't continue the failed ticket's thread
+    tickets.write_text(json.dumps({"subject": "App crashes", "description": "It closes on startup"}) + "\n")
+    assert (await process_file(tickets, output, resume=True, graph=graph))["failed"] == 0
+    assert drafts.calls == 2
+
+    # Nor does a fresh run of the same ticket to a new output
+    tickets.write_text(json.dumps(TICKETS[0]) + "\n")
+    output.unlink()
+    assert (await process_file(tickets, output, graph=graph))["failed"] == 0
+    assert drafts.calls == 3
+    assert len(recorded_runs(output)) == 1
+
+
+def test_read_tickets_streams_csv_with_any_header_case(tmp_path) -> None:
+    path = tmp_path / "tickets.csv"
+    path.write_text("Subject,Description\nRefund,Charged twice\nLogin,\"Fails, again\"\n")
+    assert list(read_tickets(path)) == [
+        (0, {"subject": "Refund", "description": "Charged twice"}),
+        (1, {"subject": "Login", "description": "Fails, again"}),
+    ]
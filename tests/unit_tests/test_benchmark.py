@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def test_benchmark_reports_throughput_and_node_latency(tmp_path) -> None:
+    output = tmp_path / "bench.json"
+    subprocess.run(
+        [sys.executable, "-W", "ignore", "-m", "benchmarks.bench_graph", "--tickets", "8", "--concurrency", "4",
+         "--latency", "0", "--output", str(output)],
+        cwd=ROOT, capture_output=True, check=True, env={**os.environ, "METRICS_ENABLED": "true"},
+    )
+    report = json.loads(output.read_text())
+
+    assert report["tickets_per_second"] > 0
+    assert {"classify", "retrieve", "draft", "review"} <= set(report["nodes"])
+    assert report["nodes"]["draft"]["p99_ms"] >= report["nodes"]["draft"]["p50_ms"]
+    assert sum(report["outcomes"].values()) == 8
+    # One run per ticket, even with the node bodies wrapped for metrics
+    assert report["nodes"]["classify"]["count"] == report["nodes"]["retrieve"]["count"] == 8
+    assert report["retries"]["draft_calls"] == report["retries"]["review_calls"]
+    assert report["startup_seconds"]["import"] > 0
+    assert report["peak_rss_mb"] > 0
@@ -0,0 +1,43 @@
+import pytest
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import FakeListChatModel
+
+from agent.nodes import classifier
+
+KEYWORDS = [("bill", "charge", "payment", "refund"), ("crash", "app", "error"), ("password", "login", "2fa"), ("hours", "contact", "profile")]
+
+
+class KeywordEmbedding(Embeddings):
+    """One dimension per category keyword group, so similarity tracks the category."""
+
+    def _embed(self, text):
+        text = text.lower()
+        return [sum(text.count(word) for word in words) + 0.1 for words in KEYWORDS]
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+@pytest.fixture
+def local_classifier(offline_agent, monkeypatch):
+    embedding = KeywordEmbedding()
+    llm = FakeListChatModel(responses=["general"])
+    offline_agent(embedding, llm=lambda role: llm, model_name="keywords")
+    monkeypatch.setattr(classifier, "get_embedding", lambda: embedding)
+    monkeypatch.setattr(classifier, "FAST_CLASSIFIER_ENABLED", True)
+
+
+def test_confident_tickets_skip_the_llm(local_classifier) -> None:
+    result = classifier.classify_ticket({"subject": "Refund", "description": "I was charged twice, the payment shows up on my bill"})
+    assert result["category"] == "billing"
+    assert result["classification_path"] == "local"
+
+
+def test_ambiguous_tickets_fall_back_to_the_llm(local_classifier) -> None:
+    result = classifier.classify_ticket({"subject": "App login", "description": "Something is wrong"})
+    assert result["category"] == "general"
+    assert result["classification_path"] == "llm"
+    assert result["classification_margin"] < classifier.FAST_CLASSIFIER_MARGIN
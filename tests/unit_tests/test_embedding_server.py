@@ -0,0 +1,54 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from numpy.testing import assert_allclose
+
+from agent.embedding_server import EmbeddingClient, EmbeddingServer
+from agent.embeddings import HashingEmbeddings
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+@pytest.fixture
+def server(tmp_path):
+    embedding = CountingEmbeddings()
+    server = EmbeddingServer(tmp_path / "embeddings.sock", embedding, model="hashing", max_batch=8, max_wait=1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server, embedding
+    server.shutdown()
+    server.server_close()
+
+
+def test_concurrent_queries_share_one_forward_pass(server) -> None:
+    server, embedding = server
+    client = EmbeddingClient(server.path, fallback=HashingEmbeddings, model="hashing")
+    queries = [f"Login fails on device {n}" for n in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        vectors = list(pool.map(client.embed_query, queries))
+
+    assert embedding.calls == 1  # Eight requests, one batch of eight
+    expected = HashingEmbeddings().embed_documents(queries)
+    assert_allclose(vectors, expected, rtol=1e-6)
+    assert_allclose(client.embed_documents(queries[:2]), expected[:2], rtol=1e-6)
+
+
+def test_client_falls_back_in_process(server, tmp_path) -> None:
+    server, embedding = server
+    local = CountingEmbeddings()
+    missing = EmbeddingClient(tmp_path / "missing.sock", fallback=lambda: local, model="hashing")
+    assert missing.embed_query("refund") == HashingEmbeddings().embed_query("refund")
+    assert local.calls == 0  # embed_query of the fallback, not a batch
+
+    # A server with another model would produce vectors that don't match the index
+    mismatched = EmbeddingClient(server.path, fallback=lambda: local, model="thenlper/gte-large")
+    assert mismatched.embed_documents(["refund"]) == HashingEmbeddings().embed_documents(["refund"])
+    assert (local.calls, embedding.calls) == (1, 0)
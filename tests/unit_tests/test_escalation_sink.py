@@ -0,0 +1,50 @@
+import csv
+import multiprocessing
+
+from agent.escalation_sink import HEADER, EscalationSink
+
+
+def _write_rows(path, worker, count):
+    sink = EscalationSink(path, batch_size=7, flush_interval=0.05)
+    for i in range(count):
+        sink.write([f"subject {worker}-{i}", "description", "draft", "feedback", "reason"])
+    sink.close()
+
+
+def test_rows_are_batched_in_the_background(tmp_path) -> None:
+    path = tmp_path / "escalations.csv"
+    sink = EscalationSink(path, batch_size=100, flush_interval=60)
+    sink.write(["s", "d", "draft", "feedback", "reason"])
+    assert not path.exists()
+
+    assert sink.flush(timeout=5)
+    with open(path, newline="") as f:
+        assert list(csv.reader(f)) == [HEADER, ["s", "d", "draft", "feedback", "reason"]]
+    sink.close()
+
+
+def test_processes_can_share_one_file(tmp_path) -> None:
+    path = tmp_path / "escalations.csv"
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_write_rows, args=(path, worker, 50)) for worker in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == HEADER
+    assert sorted(row[0] for row in rows[1:]) == sorted(f"subject {w}-{i}" for w in range(3) for i in range(50))
+
+
+def test_log_is_rotated_by_size(tmp_path) -> None:
+    path = tmp_path / "escalations.csv"
+    sink = EscalationSink(path, batch_size=1, flush_interval=0.01, max_bytes=200, backup_count=2)
+    for i in range(20):
+        sink.write([f"subject {i}", "x" * 50, "draft", "feedback", "reason"])
+    sink.close()
+
+    assert (tmp_path / "escalations.csv.1").exists()
+    assert (tmp_path / "escalations.csv.2").exists()
+    assert not (tmp_path / "escalations.csv.3").exists()
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+# Seconds `import agent` may take in a fresh interpreter; override on slow CI hosts.
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "2.0"))
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import agent
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("sentence_transformers", "torch", "openai") if m in sys.modules]
+from agent.nodes import retriever
+kb_read = retriever._category_docs is not None
+kb_docs = sum(map(len, retriever.get_category_docs().values()))
+print(json.dumps({"elapsed": elapsed, "heavy": heavy, "kb_read": kb_read, "kb_docs": kb_docs}))
+"""
+
+
+def test_import_agent_is_within_budget(tmp_path) -> None:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", SCRIPT],
+        cwd=tmp_path, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert result["heavy"] == []
+    # The knowledge base is read on first use, from the project rather than the working directory
+    assert not result["kb_read"]
+    assert result["kb_docs"] > 0
+    assert result["elapsed"] < IMPORT_TIME_BUDGET
+    assert not (tmp_path / "data").exists()
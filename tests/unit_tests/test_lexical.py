@@ -0,0 +1,28 @@
+from langchain_core.documents import Document
+
+from agent.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    Document(page_content="Clear the app cache or reinstall the application."),
+    Document(page_content="Version 2.1.0 fixed most known bugs from 2.0."),
+    Document(page_content="Check the log file at /logs/error.log for error messages."),
+    Document(page_content="SSO supports SAML 2.0, OAuth 2.0 and LDAP."),
+]
+
+
+def test_tokenize_keeps_compound_tokens_and_their_parts() -> None:
+    assert tokenize("Crash in v2.1.0, see error.log") == [
+        "crash", "in", "v2.1.0", "v2", "1", "0", "see", "error.log", "error", "log"]
+
+
+def test_exact_tokens_rank_their_document_first() -> None:
+    index = BM25Index(DOCS)
+    assert index.rank("Still crashing after updating to 2.1.0")[0] == 1
+    assert index.rank("what does error.log say")[0] == 2
+    assert index.rank("saml login broken") == [3]
+    assert index.rank("nothing in common") == []
+    assert index.rank("nothing in common", matched_only=False) == [0, 1, 2, 3]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement() -> None:
+    assert reciprocal_rank_fusion([["a", "b", "c"], ["b", "c"]]) == ["b", "c", "a"]
@@ -0,0 +1,68 @@
+import time
+
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from agent import llm
+from agent.local_llm import LocalChatModel
+from agent.nodes import drafter
+
+
+@pytest.fixture
+def openrouter(monkeypatch):
+    monkeypatch.setattr(llm, "OPENROUTER_API_KEY", "test-key")
+    monkeypatch.setattr(llm, "LLM_BACKEND", "openrouter")
+    yield
+    llm._sync_llm.cache_clear()
+    llm._sync_client.cache_clear()
+
+
+def test_clients_are_shared_per_role(openrouter, monkeypatch) -> None:
+    monkeypatch.setitem(llm.LLM_ROLES, "reviewer", {**llm.LLM_ROLES["reviewer"], "model": "openai/gpt-4o-mini"})
+
+    classifier = llm.get_llm("classifier")
+    assert llm.get_llm("classifier") is classifier
+    assert llm.get_llm("reviewer") is not classifier
+    assert llm.get_llm("reviewer").model_name == "openai/gpt-4o-mini"
+    assert classifier.client is llm._sync_client("classifier", "fast").chat.completions
+
+
+@pytest.mark.anyio
+async def test_async_callers_get_a_loop_bound_client(openrouter) -> None:
+    drafter = llm.get_llm("drafter")
+    assert drafter is llm.get_llm("drafter")
+    assert drafter is not llm._sync_llm("drafter", "fast")
+
+
+def test_local_backend_needs_no_network(monkeypatch) -> None:
+    monkeypatch.setattr(llm, "LLM_BACKEND", "local")
+    classifier = llm.get_llm("classifier")
+    assert isinstance(classifier, LocalChatModel)
+    assert classifier.invoke("Subject: Double charged\nDescription: refund my invoice\n\nCategory:").content == "billing"
+
+
+def test_strong_tier_only_while_the_ticket_has_budget(openrouter, monkeypatch) -> None:
+    monkeypatch.setitem(llm.LLM_ROLES, "drafter", {**llm.LLM_ROLES["drafter"], "strong_model": "openai/gpt-4o"})
+    assert llm.get_llm("drafter", "strong").model_name == "openai/gpt-4o"
+    assert llm.get_llm("drafter", "strong") is not llm.get_llm("drafter")
+
+    assert llm.model_tier({}, escalate=False) == "fast"
+    assert llm.model_tier({}, escalate=True) == "strong"
+    assert llm.model_tier({"deadline": time.time() + 60}, escalate=True) == "strong"
+    assert llm.model_tier({"deadline": time.time() - 1}, escalate=True) == "fast"
+    monkeypatch.setattr(llm, "MODEL_CASCADE_ENABLED", False)
+    assert llm.model_tier({}, escalate=True) == "fast"
+
+
+def test_retry_drafts_escalate_to_the_strong_tier(monkeypatch) -> None:
+    tiers = []
+
+    def fake_get_llm(role, tier="fast"):
+        tiers.append(tier)
+        return FakeListChatModel(responses=[f"{tier} draft"])
+
+    monkeypatch.setattr(drafter, "get_llm", fake_get_llm)
+    state = {"subject": "Charged twice", "description": "Billed twice", "category": "billing", "context": []}
+    assert drafter.generate_draft({**state, "attempt": 1})["draft"] == "fast draft"
+    assert drafter.generate_draft({**state, "attempt": 2, "review_feedback": "Too vague"})["draft"] == "strong draft"
+    assert tiers == ["fast", "strong"]
@@ -0,0 +1,76 @@
+import json
+import urllib.request
+
+import pytest
+
+from agent.graph import build_support_agent
+from agent.local_llm import LocalChatModel
+from agent.metrics import (
+    MetricsRegistry,
+    TokenUsageHandler,
+    registry,
+    start_metrics_server,
+)
+
+
+def test_openmetrics_text_has_cumulative_buckets() -> None:
+    metrics = MetricsRegistry()
+    metrics.observe("support_node_duration_seconds", 0.003, node="draft")
+    metrics.observe("support_node_duration_seconds", 0.2, node="draft")
+    metrics.inc("support_ticket_routes", route="finalize")
+
+    text = metrics.to_openmetrics()
+    assert "# TYPE support_node_duration_seconds histogram" in text
+    assert 'support_node_duration_seconds_bucket{node="draft",le="0.001"} 0' in text
+    assert 'support_node_duration_seconds_bucket{node="draft",le="0.005"} 1' in text
+    assert 'support_node_duration_seconds_bucket{node="draft",le="+Inf"} 2' in text
+    assert 'support_node_duration_seconds_count{node="draft"} 2' in text
+    assert 'support_ticket_routes_total{route="finalize"} 1' in text
+    assert text.endswith("# EOF\n")
+
+    [histogram] = metrics.snapshot()["histograms"]["support_node_duration_seconds"]
+    assert histogram["count"] == 2 and histogram["buckets"]["0.25"] == 2
+
+
+@pytest.fixture
+def local_graph(offline_agent):
+    llms = {role: LocalChatModel(role=role, callbacks=[TokenUsageHandler(role)])
+            for role in ("classifier", "drafter", "reviewer")}
+    offline_agent(llm=llms.__getitem__)
+    registry.reset()
+    return build_support_agent(semantic_cache=False, instrument=True, speculative_retrieval=True)
+
+
+def _counter(snapshot, name, **labels):
+    return sum(sample["value"] for sample in snapshot["counters"].get(name, [])
+               if labels.items() <= sample["labels"].items())
+
+
+def test_graph_nodes_record_latency_tokens_and_route(local_graph) -> None:
+    local_graph.invoke({"subject": "Double charged", "description": "My invoice shows two payments."})
+
+    snapshot = registry.snapshot()
+    nodes = {sample["labels"]["node"] for sample in snapshot["histograms"]["support_node_duration_seconds"]}
+    assert nodes == {"classify", "prefetch", "retrieve", "draft", "review", "finalize"}
+    for node, role in (("classify", "classifier"), ("draft", "drafter"), ("review", "reviewer")):
+        assert _counter(snapshot, "support_llm_calls_total", node=node, role=role) == 1
+        assert _counter(snapshot, "support_llm_prompt_tokens_total", node=node) > 0
+        assert _counter(snapshot, "support_llm_completion_tokens_total", node=node) > 0
+    assert _counter(snapshot, "support_ticket_routes_total", route="finalize") == 1
+    assert _counter(snapshot, "support_classifications_total", path="llm") == 1
+    assert _counter(snapshot, "support_cache_requests_total", cache="context", result="miss") >= 1
+
+
+def test_metrics_server_serves_text_and_json(local_graph) -> None:
+    local_graph.invoke({"subject": "Double charged", "description": "My invoice shows two payments."})
+    server = start_metrics_server(0)
+    try:
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.headers["Content-Type"].startswith("application/openmetrics-text")
+            assert 'support_node_runs_total{node="review",status="ok"} 1' in response.read().decode()
+        with urllib.request.urlopen(f"{base}/metrics.json") as response:
+            assert "support_node_duration_seconds" in json.load(response)["histograms"]
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from agent import config, prompt_cache
+from agent.prompt_cache import PromptCache, apredict, predict
+
+
+class SlowLLM:
+    """Counts calls; each call blocks until ``release`` is set so callers overlap."""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def predict(self, prompt):
+        self.calls += 1
+        self.release.wait(5)
+        return f"answer to {prompt}"
+
+    async def apredict(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return f"answer to {prompt}"
+
+
+def test_prompt_cache_is_bounded_and_persistent(tmp_path) -> None:
+    now = [0.0]
+    path = tmp_path / "prompt_cache.jsonl"
+    cache = PromptCache(path, maxsize=2, ttl=100, clock=lambda: now[0])
+    cache.set("a", "billing")
+    cache.set("b", "technical")
+    assert cache.get("a") == "billing"
+    cache.set("c", "security")  # Evicts "b", the least recently used
+    assert cache.get("b") is None
+
+    now[0] = 50
+    cache.set("a", "general")
+
+    reloaded = PromptCache(path, maxsize=2, ttl=100, clock=lambda: now[0])
+    assert (reloaded.get("a"), reloaded.get("c")) == ("general", "security")
+    assert len(path.read_text().splitlines()) == 2  # Compacted on load
+
+    now[0] = 120
+    expired = PromptCache(path, maxsize=2, ttl=100, clock=lambda: now[0])
+    assert (expired.get("a"), expired.get("c")) == ("general", None)
+
+
+def test_prompt_cache_works_outside_the_project(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    assert config.PROMPT_CACHE_PATH.is_absolute()
+
+    cache = PromptCache(Path("state") / "prompt_cache.jsonl")
+    cache.set("a", "billing")  # Its directory didn't exist yet
+    assert (tmp_path / "state" / "prompt_cache.jsonl").read_text().count("billing") == 1
+
+
+def test_concurrent_identical_prompts_share_one_call() -> None:
+    llm = SlowLLM()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(predict, llm, "Subject: refund", "classifier") for _ in range(4)]
+        while not prompt_cache._flights._pending:
+            pass
+        llm.release.set()
+        results = {future.result() for future in futures}
+
+    assert results == {"answer to Subject: refund"}
+    assert llm.calls == 1
+    # Later calls are answered from the cache
+    assert predict(llm, "Subject: refund", "classifier") == "answer to Subject: refund"
+    assert llm.calls == 1
+
+
+@pytest.mark.anyio
+async def test_drafts_coalesce_but_are_not_cached() -> None:
+    llm = SlowLLM()
+    results = await asyncio.gather(*(apredict(llm, "Write a reply", "drafter") for _ in range(3)))
+    assert len(set(results)) == 1
+    assert llm.calls == 1
+
+    await apredict(llm, "Write a reply", "drafter")
+    assert llm.calls == 2
+    assert len(prompt_cache.get_prompt_cache()) == 0
@@ -0,0 +1,48 @@
+import os
+
+from agent.local_llm import LocalChatModel
+from agent.nodes import drafter, reviewer
+from agent.prompts import TRUNCATED, clip, format_context, pack_passages
+from agent.tokens import count_tokens
+
+PASSAGES = [
+    "Refunds are processed within 5-7 business days to the original payment method.",
+    "refunds are processed within 5-7   business days to the original payment method.",
+    "Refunds are processed within 5-7 business days",
+    "Invoices can be downloaded from the Billing tab of the account dashboard. " * 20,
+    "Update your card under Account Settings > Billing.",
+]
+
+TICKET = {"subject": "Charged twice", "description": "I was billed twice for March.", "category": "billing"}
+
+
+def test_passages_are_deduplicated_and_packed_into_the_budget() -> None:
+    packed = pack_passages(PASSAGES, max_tokens=60)
+    assert packed[0] == PASSAGES[0]
+    assert len(packed) == 2  # Duplicates dropped, the long passage cut and nothing after it
+    assert packed[1].endswith(TRUNCATED)
+    assert sum(count_tokens(p) for p in packed) <= 60
+
+    assert len(pack_passages(PASSAGES, max_tokens=10_000)) == 3
+    assert format_context([], 100) == "(no matching knowledge base articles)"
+    assert format_context(PASSAGES[:1], 100) == f"[1] {PASSAGES[0]}"
+    assert clip("word " * 1000, 10).endswith(TRUNCATED)
+
+
+def test_prompts_share_a_static_prefix_across_tickets_and_attempts() -> None:
+    first = drafter.build_prompt({**TICKET, "context": PASSAGES, "attempt": 1})
+    retry = drafter.build_prompt({**TICKET, "context": PASSAGES, "attempt": 2, "review_feedback": "Too vague"})
+    other = drafter.build_prompt({**TICKET, "subject": "Locked out", "context": PASSAGES[4:], "attempt": 1})
+    assert os.path.commonprefix([first, retry, other]).startswith(drafter.INSTRUCTIONS)
+    assert "Too vague" in retry and "Too vague" not in first
+
+    review = reviewer.build_prompt({**TICKET, "draft": "Here is what to do."})
+    assert review.startswith(reviewer.RUBRIC)
+    assert review.rstrip().endswith("## YOUR REVIEW:")
+
+
+def test_local_drafter_reads_the_packed_context() -> None:
+    prompt = drafter.build_prompt({**TICKET, "context": PASSAGES[4:], "attempt": 1})
+    draft = LocalChatModel(role="drafter").invoke(prompt).content
+    assert "Update your card under Account Settings > Billing." in draft
+    assert '"Charged twice"' in draft
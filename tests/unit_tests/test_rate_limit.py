@@ -0,0 +1,142 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import openai
+import pytest
+
+from agent.rate_limit import (
+    AdaptiveConcurrency,
+    AsyncRateLimitedTransport,
+    RateLimitedTransport,
+    RateLimiter,
+    TokenBucket,
+)
+
+COMPLETION = {
+    "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "fake",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "billing"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6},
+}
+
+
+class FakeProvider(ThreadingHTTPServer):
+    """Chat completions endpoint answering 429 for its first requests or beyond ``capacity`` in flight."""
+
+    daemon_threads = True
+
+    def __init__(self, throttle_first=0, capacity=None, retry_after=None, latency=0.0):
+        super().__init__(("127.0.0.1", 0), FakeProviderHandler)
+        self.throttle_first = throttle_first
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self.latency = latency
+        self.requests = self.throttled = self.in_flight = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            throttle = server.requests <= server.throttle_first or (
+                server.capacity is not None and server.in_flight > server.capacity)
+            server.throttled += throttle
+        try:
+            if throttle:
+                self.send_response(429)
+                if server.retry_after is not None:
+                    self.send_header("Retry-After", str(server.retry_after))
+                body = b'{"error": {"message": "rate limited"}}'
+            else:
+                time.sleep(server.latency)
+                self.send_response(200)
+                body = json.dumps(COMPLETION).encode()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def provider(request):
+    server = FakeProvider(**getattr(request, "param", {}))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket_reserves_against_future_refill() -> None:
+    now = [0.0]
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=lambda: now[0])
+    assert bucket.reserve(1) == 0 and bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+    now[0] = 1.0
+    assert bucket.reserve(1) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("provider", [{"throttle_first": 2, "retry_after": 0.1}], indirect=True)
+def test_retry_after_is_honoured_and_shrinks_concurrency(provider) -> None:
+    limiter = RateLimiter(max_concurrency=8, base_delay=0.01)
+    client = openai.OpenAI(api_key="test", base_url=provider.url, max_retries=0,
+                           http_client=httpx.Client(transport=RateLimitedTransport(httpx.HTTPTransport(), limiter)))
+
+    start = time.perf_counter()
+    completion = client.chat.completions.create(model="fake", messages=[{"role": "user", "content": "Refund?"}])
+
+    assert completion.choices[0].message.content == "billing"
+    assert provider.requests == 3
+    assert time.perf_counter() - start >= 0.2
+    # Two 429s within the cooldown count as one congestion signal
+    assert limiter.concurrency.limit == pytest.approx(4 + 1 / 4)
+    assert limiter.concurrency.in_flight == 0
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("provider", [{"capacity": 3, "latency": 0.02}], indirect=True)
+async def test_adaptive_concurrency_settles_under_provider_capacity(provider) -> None:
+    limiter = RateLimiter(max_concurrency=16, throttle_retries=50, base_delay=0.01, max_delay=0.1)
+    transport = AsyncRateLimitedTransport(httpx.AsyncHTTPTransport(), limiter)
+    client = openai.AsyncOpenAI(api_key="test", base_url=provider.url, max_retries=0,
+                                http_client=httpx.AsyncClient(transport=transport))
+
+    completions = await asyncio.gather(*(
+        client.chat.completions.create(model="fake", messages=[{"role": "user", "content": f"Ticket {i}"}])
+        for i in range(40)))
+
+    assert all(c.choices[0].message.content == "billing" for c in completions)
+    assert provider.throttled > 0
+    assert limiter.concurrency.limit < 16
+    assert limiter.concurrency.in_flight == 0
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_does_not_take_the_next_slot() -> None:
+    concurrency = AdaptiveConcurrency(1, maximum=1)
+    await concurrency.aacquire()
+    cancelled = asyncio.ensure_future(concurrency.aacquire())
+    live = asyncio.ensure_future(concurrency.aacquire())
+    await asyncio.sleep(0)
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+
+    concurrency.release()
+    await asyncio.wait_for(live, 1)
+    assert concurrency.in_flight == 1
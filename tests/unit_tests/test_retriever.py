@@ -0,0 +1,154 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from agent.knowledge_base import KnowledgeBaseWatcher
+from agent.nodes import retriever
+from agent.vectorstore import load_or_build_index
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    queries: int = 0
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+def test_retrieve_context_embeds_query_once(offline_agent, monkeypatch) -> None:
+    embedding = CountingEmbedding(size=16)
+    offline_agent(embedding)
+
+    state = {"subject": "Double charged", "description": "I was billed twice", "category": "billing"}
+    context = retriever.retrieve_context(state)["context"]
+
+    assert embedding.queries == 1
+    billing = {doc.page_content for doc in retriever.get_category_docs()["billing"]}
+    general = {doc.page_content for doc in retriever.get_category_docs()["general"]}
+    assert len(context) == 4
+    assert all(doc in billing for doc in context[:3])
+    assert context[3] in general
+
+
+def test_repeated_tickets_hit_the_cache_until_reload(offline_agent, monkeypatch) -> None:
+    embedding = CountingEmbedding(size=16)
+    store = offline_agent(embedding)
+    monkeypatch.setattr(retriever, "load_or_build_index", lambda docs, emb: store)
+    retriever.reload_vector_store()
+
+    ticket = {"subject": "Can't log in", "description": "Login fails", "category": "security"}
+    hits = retriever.retrieval_cache_stats()["context"]["hits"]
+    first = retriever.retrieve_context(ticket)["context"]
+    again = retriever.retrieve_context({**ticket, "subject": "  CAN'T log   in"})["context"]
+
+    assert again == first
+    assert embedding.queries == 1
+    assert retriever.retrieval_cache_stats()["context"]["hits"] == hits + 1
+
+    retriever.reload_vector_store()
+    retriever.retrieve_context(ticket)
+    assert embedding.queries == 2
+
+
+def test_hybrid_retrieval_surfaces_exact_matches(offline_agent, monkeypatch) -> None:
+    embedding = CountingEmbedding(size=16)
+    store = offline_agent(embedding)
+
+    query = "Does SSO work with SAML for our Azure AD tenant?"
+    ticket = {"subject": "SAML setup", "description": query, "category": "technical"}
+    context = retriever.retrieve_context(ticket)["context"]
+    assert any("SAML" in doc for doc in context)
+
+    ranked = retriever.rank_documents(query, mode="lexical")
+    assert "SAML" in ranked[0][1]
+    assert len(ranked) == min(retriever.RETRIEVAL_FETCH_K, store.index.ntotal)
+    assert embedding.queries == 1  # Only the hybrid ranking embedded the query
+
+
+def test_retrieval_loads_a_bounded_number_of_documents(offline_agent, monkeypatch) -> None:
+    embedding = CountingEmbedding(size=16)
+    store = offline_agent(embedding)
+    monkeypatch.setattr(retriever, "rank_documents", partial(retriever.rank_documents, mode="dense", fetch_k=4))
+    retriever.category_positions(store)
+    loaded = []
+    search = store.docstore.search
+    monkeypatch.setattr(store.docstore, "search", lambda doc_id: loaded.append(doc_id) or search(doc_id))
+
+    ticket = {"subject": "Double charged", "description": "I was billed twice"}
+    candidates = retriever.prefetch_context(ticket)["candidate_context"]
+    assert len(loaded) == 4
+    assert all(len(texts) <= retriever.CONTEXT_K for texts in candidates.values())
+
+    # Four hits can't hold three billing and one general document; the gaps are searched by category
+    context = retriever.retrieve_context({**ticket, "category": "billing", "candidate_context": candidates})["context"]
+    billing = {doc.page_content for doc in retriever.get_category_docs()["billing"]}
+    general = {doc.page_content for doc in retriever.get_category_docs()["general"]}
+    assert len(context) == 4
+    assert all(doc in billing for doc in context[:3]) and context[3] in general
+    assert len(loaded) < store.index.ntotal
+
+
+def test_concurrent_identical_queries_share_one_embedding(monkeypatch) -> None:
+    class SlowEmbedding(CountingEmbedding):
+        def embed_query(self, text):
+            time.sleep(0.05)
+            return super().embed_query(text)
+
+    embedding = SlowEmbedding(size=16)
+    monkeypatch.setattr(retriever, "get_embedding", lambda: embedding)
+    with ThreadPoolExecutor(4) as pool:
+        vectors = list(pool.map(retriever.embed_query, ["Login fails"] * 4))
+
+    assert embedding.queries == 1
+    assert all(vector == vectors[0] for vector in vectors)
+
+
+def test_knowledge_base_edits_are_hot_swapped(tmp_path, monkeypatch) -> None:
+    kb = tmp_path / "kb"
+    (kb / "billing").mkdir(parents=True)
+    (kb / "general").mkdir()
+    (kb / "billing" / "refunds.md").write_text(
+        "# Refunds\n\nRefunds take 5 business days.\n\nCredits are applied\nto the next invoice.\n")
+    (kb / "general" / "hours.md").write_text("Support is open on weekdays.\n")
+
+    embedding = CountingEmbedding(size=16)
+    monkeypatch.setattr(retriever, "get_embedding", lambda: embedding)
+    monkeypatch.setattr(retriever, "load_or_build_index",
+                        lambda docs, emb: load_or_build_index(docs, emb, tmp_path / "index", model_name="fake"))
+    monkeypatch.setattr(retriever, "_category_docs", retriever.get_category_docs())
+    monkeypatch.setattr(retriever, "_vector_store", None)
+    monkeypatch.setattr(retriever, "_lexical_index", None)
+    monkeypatch.setattr(retriever, "_kb_version", None)
+
+    old = retriever.reload_knowledge_base(kb)
+    assert [doc.page_content for doc in retriever.get_category_docs()["billing"]] == [
+        "Refunds take 5 business days.", "Credits are applied to the next invoice."]
+    assert retriever.get_category_docs()["billing"][0].metadata == {"source": "billing/refunds.md", "title": "Refunds"}
+    ticket = {"subject": "Refund", "description": "How long do refunds take?", "category": "billing"}
+    assert "Refunds take 5 business days." in retriever.retrieve_context(ticket)["context"]
+
+    watcher = KnowledgeBaseWatcher(kb, interval=3600, on_change=lambda: retriever.reload_knowledge_base(kb))
+    try:
+        assert not watcher.check()
+        (kb / "billing" / "refunds.md").write_text("# Refunds\n\nRefunds take 10 business days.\n")
+        assert watcher.check()
+    finally:
+        watcher.stop()
+
+    assert retriever.get_vector_store() is not old
+    assert retriever.get_vector_store().index.ntotal == 2
+    assert "Refunds take 10 business days." in retriever.retrieve_context(ticket)["context"]
+    # A retrieval still holding the old store keeps working after the swap
+    [hit] = old.similarity_search("Credits are applied to the next invoice.", k=1)
+    assert hit.page_content == "Credits are applied to the next invoice."
+
+
+def test_missing_knowledge_base_is_a_configuration_error(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(retriever, "KNOWLEDGE_BASE_DIR", tmp_path / "missing")
+    monkeypatch.setattr(retriever, "_category_docs", None)
+    monkeypatch.setattr(retriever, "_vector_store", None)
+    with pytest.raises(ValueError, match="KNOWLEDGE_BASE_DIR"):
+        retriever.get_vector_store()  # What warmup() loads first
@@ -0,0 +1,94 @@
+import pytest
+from langchain_core.language_models import FakeListChatModel
+
+from agent import build_support_agent
+from agent.embeddings import HashingEmbeddings
+from agent.local_llm import LocalChatModel
+from agent.metrics import registry
+from agent.nodes import drafter, reviewer
+from agent.review_rules import check_draft
+
+GOOD = (
+    "I'm sorry about the duplicate charge. Please open Account Settings > Billing and download the two "
+    "statements for this month so we can compare the transaction IDs. If both charges show the same ID, "
+    "reply with them and our billing team will review the duplicate, since refunds require supervisor "
+    "approval. Meanwhile, check that only one payment method is active to avoid further duplicate charges."
+)
+
+
+def test_hard_rules_are_checked() -> None:
+    drafts = [
+        GOOD,
+        "Thank you for contacting support. We're here to help with any issues you may have.",
+        GOOD + " We will issue a full refund today.",
+        GOOD + " Please send us the contents of /logs/error.log.",
+    ]
+    rules = [[v.rule for v in check_draft(draft)] for draft in drafts]
+    assert rules == [[], ["too_short", "generic"], ["overpromise"], ["internal_path"]]
+
+
+@pytest.mark.parametrize("sentence", [
+    "I have an issue reproducing this on my side.",
+    "We will issue you a new API key once the old one is revoked.",
+    "We have processed your request to update the billing email.",
+    "I can process the plan change as soon as you confirm it.",
+    "I can process your credit card payment today.",
+    "We can apply credit card changes immediately.",
+    "We will not refund annual plans after the first 30 days.",
+])
+def test_routine_actions_are_not_overpromises(sentence) -> None:
+    assert check_draft(GOOD + " " + sentence) == []
+
+
+def test_failing_drafts_are_rejected_without_the_llm(monkeypatch) -> None:
+    llm = FakeListChatModel(responses=["APPROVED\nLooks good.", "REJECTED\nUnused."])
+    monkeypatch.setattr(reviewer, "get_llm", lambda role: llm)
+    state = {"subject": "Charged twice", "description": "Billed twice", "category": "billing", "attempt": 1}
+
+    rejected = reviewer.review_draft({**state, "draft": "Please check your payment method."})
+    assert rejected["review_result"] == "rejected"
+    assert rejected["review_violations"] == ["too_short"]
+    assert rejected["attempt"] == 2
+    assert llm.i == 0
+
+    approved = reviewer.review_draft({**state, "draft": GOOD})
+    assert approved["review_result"] == "approved"
+    assert llm.i == 1
+
+
+def test_streamed_draft_stops_at_the_first_violation(monkeypatch) -> None:
+    llm = LocalChatModel(role="drafter")
+    monkeypatch.setattr(drafter, "DRAFT_STREAMING", True)
+    monkeypatch.setattr(drafter, "get_llm", lambda role, tier="fast": llm)
+    monkeypatch.setattr(reviewer, "get_llm", lambda role: pytest.fail("the LLM reviewer was called"))
+    state = {"subject": "Charged twice", "description": "Billed twice", "category": "billing", "attempt": 1,
+             "context": ["We will issue a full refund to your card within 5 days."]}
+    registry.reset()
+
+    drafted = drafter.generate_draft(state)
+    assert drafted["draft_aborted"]
+    assert "issue a full refund" in drafted["draft"]
+    assert not drafted["draft"].rstrip().endswith("quickly for you.")  # The tail was never generated
+    aborts = registry.snapshot()["counters"]["support_draft_aborts_total"]
+    assert aborts == [{"labels": {"rule": "overpromise"}, "value": 1}]
+
+    # Only the rule that stopped it counts against the cut-off draft, not its length
+    rejected = reviewer.review_draft(drafted)
+    assert (rejected["review_result"], rejected["review_violations"], rejected["attempt"]) == (
+        "rejected", ["overpromise"], 2)
+
+
+@pytest.mark.anyio
+async def test_draft_tokens_reach_the_graph_stream(offline_agent, monkeypatch) -> None:
+    offline_agent(HashingEmbeddings(), llm=lambda role: LocalChatModel(role=role), model_name="hashing")
+    monkeypatch.setattr(drafter, "DRAFT_STREAMING", True)
+
+    ticket = {"subject": "Update my card", "description": "How do I change the card for my subscription?"}
+    tokens = []
+    async for message, metadata in build_support_agent(semantic_cache=False).astream(ticket, stream_mode="messages"):
+        if metadata["langgraph_node"] == "draft":
+            tokens.append(message.content)
+
+    assert len(tokens) > 20
+    final = await build_support_agent(semantic_cache=False).ainvoke(ticket)
+    assert "".join(tokens) == final["draft"] and not final["draft_aborted"]
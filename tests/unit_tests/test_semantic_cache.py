@@ -0,0 +1,58 @@
+from pathlib import Path
+
+from agent import config, llm
+from agent.graph import build_support_agent
+from agent.nodes import response_cache
+from agent.semantic_cache import SemanticCache
+
+
+class Clock:
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lookup_respects_threshold_ttl_and_kb_version(tmp_path) -> None:
+    clock = Clock()
+    cache = SemanticCache(tmp_path / "cache.jsonl", threshold=0.9, ttl=60, clock=clock)
+    cache.add([1.0, 0.0], "Reset it under Settings.", "kb1", category="security")
+
+    assert cache.lookup([0.99, 0.05], "kb1")["response"] == "Reset it under Settings."
+    assert cache.lookup([0.0, 1.0], "kb1") is None
+
+    reloaded = SemanticCache(tmp_path / "cache.jsonl", threshold=0.9, ttl=60, clock=clock)
+    assert reloaded.lookup([1.0, 0.0], "kb1")["category"] == "security"
+    assert reloaded.lookup([1.0, 0.0], "kb2") is None
+    assert len(reloaded) == 0
+
+    cache.add([1.0, 0.0], "Reset it under Settings.", "kb2")
+    clock.now += 61
+    assert cache.lookup([1.0, 0.0], "kb2") is None
+
+
+def test_cache_file_is_created_outside_the_project(tmp_path, monkeypatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    assert config.SEMANTIC_CACHE_PATH.is_absolute()
+
+    cache = SemanticCache(Path("state") / "semantic_cache.jsonl")
+    cache.add([1.0, 0.0], "Reset it under Settings.", "kb1")  # Its directory didn't exist yet
+    assert len(SemanticCache(tmp_path / "state" / "semantic_cache.jsonl")) == 1
+
+
+def test_near_duplicate_tickets_are_answered_from_cache(offline_agent, tmp_path, monkeypatch) -> None:
+    offline_agent()
+    monkeypatch.setattr(llm, "LLM_BACKEND", "local")
+    cache = SemanticCache(tmp_path / "cache.jsonl")
+    monkeypatch.setattr(response_cache, "get_semantic_cache", lambda: cache)
+    graph = build_support_agent(semantic_cache=True)
+
+    ticket = {"subject": "Charged twice", "description": "My invoice shows two payments"}
+    first = graph.invoke(ticket)
+    second = graph.invoke({"subject": "charged  twice", "description": "My invoice shows two payments"})
+
+    assert first["cache_hit"] is False
+    assert second["cache_hit"] is True
+    assert second["final_response"] == first["final_response"]
+    assert "draft" not in second
+    assert cache.stats()["hits"] == 1
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from agent.vectorstore import (
+    build_index,
+    load_or_build_index,
+    make_index,
+    pq_subquantizers,
+    read_manifest,
+)
+
+DOCS = {
+    "billing": [Document(page_content="Invoices are sent monthly."), Document(page_content="We accept PayPal.")],
+    "general": [Document(page_content="Support is available 24/7.")],
+}
+
+
+class CountingEmbedding(DeterministicFakeEmbedding):
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+
+def test_artifact_is_reused_until_documents_change(tmp_path) -> None:
+    embedding = CountingEmbedding(size=8)
+    index_dir = tmp_path / "index"
+
+    build_index(DOCS, embedding, index_dir, model_name="fake")
+    assert embedding.calls == 1
+    assert read_manifest(index_dir)["categories"] == {"billing": 2, "general": 1}
+
+    store = load_or_build_index(DOCS, embedding, index_dir, model_name="fake")
+    assert embedding.calls == 1
+    [hit] = store.similarity_search("Support is available 24/7.", k=1)
+    assert hit.page_content == "Support is available 24/7."
+    assert hit.metadata["category"] == "general"
+
+    changed = {**DOCS, "general": [Document(page_content="Support is available on weekdays.")]}
+    load_or_build_index(changed, embedding, index_dir, model_name="fake")
+    assert embedding.calls == 2
+
+    load_or_build_index(changed, embedding, index_dir, model_name="other-model")
+    assert embedding.calls == 3
+
+
+@pytest.mark.parametrize("index_type", ["fp16", "int8", "pq"])
+def test_compressed_index_types_round_trip(tmp_path, index_type) -> None:
+    embedding = CountingEmbedding(size=32)
+    index_dir = tmp_path / "index"
+
+    load_or_build_index(DOCS, embedding, index_dir, model_name="fake")
+    build_index(DOCS, embedding, index_dir, model_name="fake", index_type=index_type)
+    assert embedding.calls == 2
+    assert read_manifest(index_dir)["index_type"] == index_type
+
+    store = load_or_build_index(DOCS, embedding, index_dir, model_name="fake", index_type=index_type)
+    assert embedding.calls == 2
+    [hit] = store.similarity_search("We accept PayPal.", k=1)
+    assert hit.page_content == "We accept PayPal."
+
+    # Switching back to exact storage rebuilds the artifact
+    load_or_build_index(DOCS, embedding, index_dir, model_name="fake")
+    assert embedding.calls == 3
+    assert read_manifest(index_dir)["index_type"] == "flat"
+
+
+def test_make_index_rejects_unknown_types() -> None:
+    with pytest.raises(ValueError, match="Unknown index type"):
+        make_index(np.zeros((2, 4), dtype=np.float32), "hnsw")
+    assert pq_subquantizers(1024) == 64
+    assert pq_subquantizers(384) == 24
+
+
+class RecordingEmbedding(DeterministicFakeEmbedding):
+    texts: list = []
+
+    def embed_documents(self, texts):
+        self.texts = self.texts + list(texts)
+        return super().embed_documents(texts)
+
+
+@pytest.mark.parametrize("index_type", ["flat", "int8"])
+def test_update_embeds_only_changed_documents(tmp_path, index_type) -> None:
+    embedding = RecordingEmbedding(size=16)
+    index_dir = tmp_path / "index"
+    load_or_build_index(DOCS, embedding, index_dir, model_name="fake", index_type=index_type)
+    assert len(embedding.texts) == 3
+
+    changed = {
+        "billing": [DOCS["billing"][0], Document(page_content="We accept PayPal and Apple Pay.")],
+        "general": DOCS["general"],
+    }
+    embedding.texts = []
+    store = load_or_build_index(changed, embedding, index_dir, model_name="fake", index_type=index_type)
+    assert embedding.texts == ["We accept PayPal and Apple Pay."]
+    assert read_manifest(index_dir)["last_update"] == {"added": 1, "removed": 1, "rebuilt": False}
+
+    assert store.index.ntotal == 3
+    for doc in (*changed["billing"], *changed["general"]):
+        [hit] = store.similarity_search(doc.page_content, k=1)
+        assert hit.page_content == doc.page_content